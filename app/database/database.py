@@ -1,8 +1,12 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import text
 from typing import AsyncGenerator
 import os
+import time
 import logging
 
 logger = logging.getLogger("amnezia-wg-management")
@@ -10,8 +14,79 @@ logger = logging.getLogger("amnezia-wg-management")
 # Получаем URL подключения из переменной окружения или используем значение по умолчанию
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+asyncpg://user:password@db:5432/dbname")
 
+# Пул соединений каждого воркера: постоянные соединения + временные сверх них
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Сколько секунд ждать свободное соединение, прежде чем вернуть ошибку
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Пересоздавать соединения старше N секунд (обрывы со стороны Postgres/NAT)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+# Кэш подготовленных выражений asyncpg; за pgbouncer в режиме transaction нужно ставить 0
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# Для проверки лимита соединений при старте: число воркеров uvicorn и запас под прочих клиентов
+DB_APP_WORKERS = int(os.getenv("WEB_CONCURRENCY", "4"))
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "10"))
+# Соединения воркера вне пула (LISTEN для рассылки цен)
+DB_DEDICATED_CONNECTIONS = int(os.getenv("DB_DEDICATED_CONNECTIONS", "1"))
+# error - не запускаться при превышении max_connections, warn - только предупредить, off - не проверять
+DB_POOL_GUARD = os.getenv("DB_POOL_GUARD", "error").lower()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул, считающий ожидание свободного соединения (в т.ч. тайм-ауты при исчерпании)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        # Необязательный обработчик (waited, timed_out) для экспорта ожиданий в метрики
+        self.wait_observer = None
+
+    def _do_get(self):
+        started = time.monotonic()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            timed_out = True
+            raise
+        finally:
+            waited = time.monotonic() - started
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if self.wait_observer is not None:
+                self.wait_observer(waited, timed_out)
+
+    def recreate(self):
+        # При пересоздании пула (dispose) счётчики не сбрасываем
+        pool = super().recreate()
+        pool.checkouts, pool.timeouts = self.checkouts, self.timeouts
+        pool.wait_total, pool.wait_max = self.wait_total, self.wait_max
+        pool.wait_observer = self.wait_observer
+        return pool
+
+
 # Создаем асинхронный движок для PostgreSQL
-engine = create_async_engine(DATABASE_URL, echo=False)
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=InstrumentedPool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={
+        # statement_cache_size - кэш самого asyncpg, prepared_statement_cache_size - адаптера SQLAlchemy
+        "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+    },
+)
 
 # Настраиваем асинхронную сессию
 async_session = sessionmaker(
@@ -25,6 +100,175 @@ async_session = sessionmaker(
 # Создаем базовый класс для моделей
 Base = declarative_base()
 
+# Выполняются до create_all: таблицы, которые create_all должен создать заново в новом виде
+SCHEMA_PRE_PATCHES = [
+    # audit_logs стала секционированной: старую обычную таблицу убираем с дороги,
+    # её строки переносятся в новую в SCHEMA_PATCHES
+    """
+    DO $$
+    BEGIN
+        IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('audit_logs')) = 'r' THEN
+            ALTER TABLE audit_logs RENAME TO audit_logs_unpartitioned;
+            ALTER TABLE audit_logs_unpartitioned RENAME CONSTRAINT audit_logs_pkey TO audit_logs_unpartitioned_pkey;
+            ALTER SEQUENCE IF EXISTS audit_logs_id_seq RENAME TO audit_logs_unpartitioned_id_seq;
+        END IF;
+    END
+    $$
+    """,
+]
+# create_all не меняет уже существующие таблицы: колонки и индексы, добавленные в модели
+# позже, докатываются этими идемпотентными выражениями
+SCHEMA_PATCHES = [
+    "ALTER TABLE ssh_server_configs ADD COLUMN IF NOT EXISTS location VARCHAR",
+    "ALTER TABLE user_subscription_keys ADD COLUMN IF NOT EXISTS server_id INTEGER",
+    "ALTER TABLE user_subscription_keys ADD COLUMN IF NOT EXISTS public_key VARCHAR",
+    "ALTER TABLE user_subscription_keys ADD COLUMN IF NOT EXISTS revoked_at TIMESTAMP WITHOUT TIME ZONE",
+    "CREATE INDEX IF NOT EXISTS ix_user_subscription_key_public_key ON user_subscription_keys (public_key)",
+    "ALTER TABLE ip_allocations ADD COLUMN IF NOT EXISTS releasing_at TIMESTAMP WITHOUT TIME ZONE",
+    # Любое изменение тарифов - NOTIFY, по нему перечитываются цены для SubscribeToPrices
+    """
+    CREATE OR REPLACE FUNCTION notify_subscription_plans_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('subscription_plans_changed', TG_OP);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS subscription_plans_changed ON subscription_plans",
+    """
+    CREATE TRIGGER subscription_plans_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON subscription_plans
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_subscription_plans_changed()
+    """,
+    # Изменение ключей или подписок пользователей - NOTIFY со списком их telegram_user_id через запятую,
+    # по нему воркеры сбрасывают закэшированные наборы ключей (KeyBundleCache). Триггеры уровня
+    # оператора с таблицами переходов: пакетный UPDATE на 10 тысяч строк - один вызов триггера
+    # и несколько NOTIFY (до 500 пользователей в каждом, payload NOTIFY ограничен 8000 байт)
+    """
+    CREATE OR REPLACE FUNCTION notify_user_keys_changed() RETURNS trigger AS $$
+    DECLARE
+        subscription_ids INTEGER[];
+        user_ids INTEGER[];
+        telegram_ids TEXT[];
+        payload TEXT;
+    BEGIN
+        IF TG_TABLE_NAME = 'users' THEN
+            IF TG_OP = 'DELETE' THEN
+                SELECT array_agg(telegram_user_id) INTO telegram_ids FROM old_rows;
+            ELSE
+                SELECT array_agg(o.telegram_user_id) INTO telegram_ids
+                FROM old_rows o JOIN new_rows n ON n.id = o.id
+                WHERE n.telegram_user_id IS DISTINCT FROM o.telegram_user_id;
+            END IF;
+        ELSE
+            IF TG_TABLE_NAME = 'user_subscriptions' THEN
+                IF TG_OP = 'INSERT' THEN
+                    SELECT array_agg(DISTINCT user_id) INTO user_ids FROM new_rows;
+                ELSIF TG_OP = 'DELETE' THEN
+                    SELECT array_agg(DISTINCT user_id) INTO user_ids FROM old_rows;
+                ELSE
+                    SELECT array_agg(DISTINCT changed.user_id) INTO user_ids
+                    FROM old_rows o JOIN new_rows n ON n.id = o.id,
+                         LATERAL (VALUES (o.user_id), (n.user_id)) AS changed(user_id)
+                    WHERE (n.status, n.end_date, n.user_id) IS DISTINCT FROM (o.status, o.end_date, o.user_id);
+                END IF;
+            ELSE
+                IF TG_OP = 'INSERT' THEN
+                    SELECT array_agg(DISTINCT subscription_id) INTO subscription_ids FROM new_rows;
+                ELSIF TG_OP = 'DELETE' THEN
+                    SELECT array_agg(DISTINCT subscription_id) INTO subscription_ids FROM old_rows;
+                ELSE
+                    SELECT array_agg(DISTINCT changed.subscription_id) INTO subscription_ids
+                    FROM old_rows o JOIN new_rows n ON n.id = o.id,
+                         LATERAL (VALUES (o.subscription_id), (n.subscription_id)) AS changed(subscription_id)
+                    WHERE (n.key, n.revoked_at, n.subscription_id, n.server_id)
+                          IS DISTINCT FROM (o.key, o.revoked_at, o.subscription_id, o.server_id);
+                END IF;
+                SELECT array_agg(DISTINCT user_id) INTO user_ids FROM user_subscriptions WHERE id = ANY(subscription_ids);
+            END IF;
+            SELECT array_agg(telegram_user_id) INTO telegram_ids FROM users WHERE id = ANY(user_ids);
+        END IF;
+        FOR payload IN
+            SELECT string_agg(telegram_id, ',')
+            FROM (SELECT telegram_id, (row_number() OVER () - 1) / 500 AS chunk FROM unnest(telegram_ids) AS telegram_id) ids
+            GROUP BY chunk
+        LOOP
+            PERFORM pg_notify('user_keys_changed', payload);
+        END LOOP;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # Прежние построчные триггеры
+    "DROP TRIGGER IF EXISTS user_keys_changed ON user_subscription_keys",
+    "DROP TRIGGER IF EXISTS user_keys_changed ON user_subscriptions",
+    "DROP TRIGGER IF EXISTS user_keys_changed ON users",
+    "DROP TRIGGER IF EXISTS user_keys_changed_insert ON user_subscription_keys",
+    """
+    CREATE TRIGGER user_keys_changed_insert AFTER INSERT ON user_subscription_keys
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_keys_changed()
+    """,
+    "DROP TRIGGER IF EXISTS user_keys_changed_update ON user_subscription_keys",
+    """
+    CREATE TRIGGER user_keys_changed_update AFTER UPDATE ON user_subscription_keys
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_keys_changed()
+    """,
+    "DROP TRIGGER IF EXISTS user_keys_changed_delete ON user_subscription_keys",
+    """
+    CREATE TRIGGER user_keys_changed_delete AFTER DELETE ON user_subscription_keys
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_keys_changed()
+    """,
+    "DROP TRIGGER IF EXISTS user_keys_changed_insert ON user_subscriptions",
+    """
+    CREATE TRIGGER user_keys_changed_insert AFTER INSERT ON user_subscriptions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_keys_changed()
+    """,
+    "DROP TRIGGER IF EXISTS user_keys_changed_update ON user_subscriptions",
+    """
+    CREATE TRIGGER user_keys_changed_update AFTER UPDATE ON user_subscriptions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_keys_changed()
+    """,
+    "DROP TRIGGER IF EXISTS user_keys_changed_delete ON user_subscriptions",
+    """
+    CREATE TRIGGER user_keys_changed_delete AFTER DELETE ON user_subscriptions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_keys_changed()
+    """,
+    "DROP TRIGGER IF EXISTS user_keys_changed_update ON users",
+    """
+    CREATE TRIGGER user_keys_changed_update AFTER UPDATE ON users
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_keys_changed()
+    """,
+    "DROP TRIGGER IF EXISTS user_keys_changed_delete ON users",
+    """
+    CREATE TRIGGER user_keys_changed_delete AFTER DELETE ON users
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_keys_changed()
+    """,
+    # Строки вне месячных секций (см. AuditPartitionMaintainer)
+    "CREATE TABLE IF NOT EXISTS audit_logs_default PARTITION OF audit_logs DEFAULT",
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('audit_logs_unpartitioned') IS NOT NULL THEN
+            INSERT INTO audit_logs (id, entity_type, entity_id, action, timestamp, details)
+            SELECT id, entity_type, entity_id, action, timestamp, details FROM audit_logs_unpartitioned;
+            PERFORM setval('audit_logs_id_seq', GREATEST((SELECT max(id) FROM audit_logs), 1));
+            DROP TABLE audit_logs_unpartitioned;
+        END IF;
+    END
+    $$
+    """,
+]
+# Ключ advisory-блокировки: воркеры стартуют одновременно, схему создаёт один из них
+SCHEMA_LOCK_KEY = 7301000
+
 async def init_db():
     try:
         from models.server_models import Base as ServerBase
@@ -33,9 +277,14 @@ async def init_db():
         logger.info(f"Инициализация базы данных по URL: {DATABASE_URL.replace(DATABASE_URL.split('@')[0], '***')}")
         
         async with engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            for statement in SCHEMA_PRE_PATCHES:
+                await conn.execute(text(statement))
             # Создаем таблицы из всех моделей
             await conn.run_sync(ServerBase.metadata.create_all)
             await conn.run_sync(UserBase.metadata.create_all)
+            for statement in SCHEMA_PATCHES:
+                await conn.execute(text(statement))
         
         logger.info("Таблицы успешно созданы")
     except Exception as e:
@@ -44,6 +293,45 @@ async def init_db():
         logger.error(traceback.format_exc())
         raise
 
+def pool_stats() -> dict:
+    """Состояние пула соединений текущего воркера"""
+    pool = engine.sync_engine.pool
+    return {
+        "pid": os.getpid(),
+        "size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(0, pool.overflow()),
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "wait_avg_ms": round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else None,
+        "wait_max_ms": round(pool.wait_max * 1000, 3),
+    }
+
+async def check_connection_budget():
+    """
+    Проверяет, что пулы всех воркеров вместе с запасом помещаются в max_connections Postgres.
+    Иначе при пиковой нагрузке воркеры получат "too many clients" вместо ожидания в пуле.
+    """
+    if DB_POOL_GUARD == "off":
+        return
+    async with engine.connect() as conn:
+        max_connections = int((await conn.execute(text("SHOW max_connections"))).scalar())
+    required = DB_APP_WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_DEDICATED_CONNECTIONS) + DB_RESERVED_CONNECTIONS
+    if required <= max_connections:
+        logger.info(f"Лимит соединений БД: нужно до {required} из max_connections={max_connections}")
+        return
+    message = (
+        f"Пулы соединений не помещаются в max_connections={max_connections}: "
+        f"{DB_APP_WORKERS} воркеров x ({DB_POOL_SIZE} + {DB_MAX_OVERFLOW} + {DB_DEDICATED_CONNECTIONS}) + {DB_RESERVED_CONNECTIONS} запаса = {required}. "
+        f"Уменьшите DB_POOL_SIZE/DB_MAX_OVERFLOW или увеличьте max_connections"
+    )
+    if DB_POOL_GUARD == "warn":
+        logger.warning(message)
+        return
+    raise RuntimeError(message)
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
         try:
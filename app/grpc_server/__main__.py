@@ -0,0 +1,38 @@
+# Запуск gRPC-сервера отдельным процессом, без REST API: `python -m grpc_server` из каталога app
+import asyncio
+import logging
+
+from database.database import check_connection_budget, engine, init_db
+from grpc_server.server import bot_grpc_server
+from service.audit_log import audit_log
+from service.key_bundle_cache import key_bundle_cache
+from service.pg_listener import pg_listener
+from service.price_cache import price_cache
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+)
+
+
+async def main():
+    await init_db()
+    await check_connection_budget()
+    audit_log.start()
+    price_cache.start()
+    key_bundle_cache.start()
+    pg_listener.start()
+    await bot_grpc_server.start()
+    try:
+        await bot_grpc_server.wait_for_termination()
+    finally:
+        await bot_grpc_server.close()
+        await pg_listener.close()
+        await price_cache.close()
+        await key_bundle_cache.close()
+        await audit_log.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+# Нагрузочный клиент TelegramBotService: `python -m grpc_server.loadtest --target localhost:50051 --duration 30`
+# Каждый канал - отдельное TCP-соединение, SO_REUSEPORT закрепляет его за одним воркером,
+# поэтому для проверки распределения между воркерами число каналов должно быть больше числа воркеров.
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+import grpc
+
+from pb import telegram_bot_service_pb2 as pb2
+from pb import telegram_bot_service_pb2_grpc as pb2_grpc
+
+METHODS = {
+    "CheckUserExists": lambda stub, tid: stub.CheckUserExists(pb2.UserExistenceRequest(telegram_id=tid)),
+    "GetSubscriptionStatus": lambda stub, tid: stub.GetSubscriptionStatus(pb2.SubscriptionStatusRequest(telegram_id=tid)),
+    "GetConfigurationKeys": lambda stub, tid: stub.GetConfigurationKeys(pb2.ConfigurationKeysRequest(telegram_id=tid, vpn_app="amneziawg")),
+    "GetPrices": lambda stub, tid: stub.GetPrices(pb2.Empty()),
+}
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def worker(stub, method, args, deadline, latencies, pids, errors):
+    call_method = METHODS[method]
+    while time.monotonic() < deadline:
+        telegram_id = random.randint(args.min_telegram_id, args.max_telegram_id)
+        started = time.perf_counter()
+        call = call_method(stub, telegram_id)
+        try:
+            await call
+        except grpc.aio.AioRpcError as e:
+            errors[e.code().name] += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+        for key, value in await call.trailing_metadata() or ():
+            if key == "x-worker-pid":
+                pids[value] += 1
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест gRPC TelegramBotService")
+    parser.add_argument("--target", default="localhost:50051")
+    parser.add_argument("--method", default="GetSubscriptionStatus", choices=sorted(METHODS))
+    parser.add_argument("--channels", type=int, default=8, help="число TCP-соединений")
+    parser.add_argument("--concurrency", type=int, default=64, help="одновременных запросов на все каналы")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунд")
+    parser.add_argument("--min-telegram-id", type=int, default=1)
+    parser.add_argument("--max-telegram-id", type=int, default=10000)
+    args = parser.parse_args()
+
+    # Отдельная опция на канал, иначе grpc переиспользует одно соединение для всех
+    channels = [
+        grpc.aio.insecure_channel(args.target, options=[("grpc.channel_id", i)])
+        for i in range(args.channels)
+    ]
+    stubs = [pb2_grpc.TelegramBotServiceStub(channel) for channel in channels]
+    latencies, pids, errors = [], Counter(), Counter()
+    started = time.monotonic()
+    deadline = started + args.duration
+    await asyncio.gather(*(
+        worker(stubs[i % len(stubs)], args.method, args, deadline, latencies, pids, errors)
+        for i in range(args.concurrency)
+    ))
+    elapsed = time.monotonic() - started
+    for channel in channels:
+        await channel.close()
+
+    print(f"{args.method}: {len(latencies)} ок, {sum(errors.values())} ошибок за {elapsed:.1f} с")
+    print(f"RPS всего: {len(latencies) / elapsed:.0f}")
+    for pid, count in sorted(pids.items()):
+        print(f"  воркер pid={pid}: {count / elapsed:.0f} RPS")
+    if latencies:
+        print(
+            "Задержка, мс: "
+            f"p50={percentile(latencies, 0.50) * 1000:.2f} "
+            f"p95={percentile(latencies, 0.95) * 1000:.2f} "
+            f"p99={percentile(latencies, 0.99) * 1000:.2f}"
+        )
+    for code, count in errors.most_common():
+        print(f"  {code}: {count}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
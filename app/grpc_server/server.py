@@ -0,0 +1,80 @@
+import logging
+import os
+from typing import Optional
+
+import grpc
+
+from grpc_server.servicer import TelegramBotServicer
+from pb import telegram_bot_service_pb2 as pb2
+from pb import telegram_bot_service_pb2_grpc as pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+GRPC_ENABLED = os.getenv("GRPC_ENABLED", "0").lower() in ("1", "true", "yes")
+GRPC_BIND = os.getenv("GRPC_BIND", "0.0.0.0")
+GRPC_PORT = int(os.getenv("GRPC_PORT", "50051"))
+# Ограничение одновременно обрабатываемых RPC на воркер (0 - без ограничения)
+GRPC_MAX_CONCURRENT_RPCS = int(os.getenv("GRPC_MAX_CONCURRENT_RPCS", "0"))
+# Максимальный размер входящего сообщения: пакетные RPC принимают сотни тысяч telegram_id
+GRPC_MAX_RECEIVE_MESSAGE_MB = int(os.getenv("GRPC_MAX_RECEIVE_MESSAGE_MB", "16"))
+# Сколько секунд даём текущим RPC завершиться при остановке
+GRPC_SHUTDOWN_GRACE = float(os.getenv("GRPC_SHUTDOWN_GRACE", "5"))
+
+
+class BotGrpcServer:
+    """
+    gRPC-сервер TelegramBotService внутри процесса приложения. Каждый воркер uvicorn
+    слушает один и тот же порт с SO_REUSEPORT, ядро распределяет соединения между ними.
+    """
+
+    def __init__(self):
+        self._server: Optional[grpc.aio.Server] = None
+
+    async def start(self):
+        if self._server is not None:
+            return
+        server = grpc.aio.server(
+            options=[
+                ("grpc.so_reuseport", 1),
+                ("grpc.max_receive_message_length", GRPC_MAX_RECEIVE_MESSAGE_MB * 1024 * 1024),
+            ],
+            maximum_concurrent_rpcs=GRPC_MAX_CONCURRENT_RPCS or None,
+        )
+        servicer = TelegramBotServicer()
+        pb2_grpc.add_TelegramBotServiceServicer_to_server(servicer, server)
+        # Цены и ключи отдаются готовыми байтами из PriceCache/PriceBroadcaster/KeyBundleCache:
+        # без сериализатора ответа, чтобы одно и то же не сериализовалось заново на каждый запрос
+        server.add_registered_method_handlers("api.v1.TelegramBotService", {
+            "GetConfigurationKeys": grpc.unary_unary_rpc_method_handler(
+                servicer.GetConfigurationKeys,
+                request_deserializer=pb2.ConfigurationKeysRequest.FromString,
+                response_serializer=None,
+            ),
+            "GetPrices": grpc.unary_unary_rpc_method_handler(
+                servicer.GetPrices,
+                request_deserializer=pb2.Empty.FromString,
+                response_serializer=None,
+            ),
+            "SubscribeToPrices": grpc.unary_stream_rpc_method_handler(
+                servicer.SubscribeToPrices,
+                request_deserializer=pb2.Empty.FromString,
+                response_serializer=None,
+            ),
+        })
+        address = f"{GRPC_BIND}:{GRPC_PORT}"
+        server.add_insecure_port(address)
+        await server.start()
+        self._server = server
+        logger.info(f"gRPC-сервер TelegramBotService слушает {address} (pid {os.getpid()})")
+
+    async def wait_for_termination(self):
+        if self._server is not None:
+            await self._server.wait_for_termination()
+
+    async def close(self):
+        if self._server is not None:
+            await self._server.stop(GRPC_SHUTDOWN_GRACE)
+            self._server = None
+
+
+bot_grpc_server = BotGrpcServer()
@@ -0,0 +1,108 @@
+import logging
+import os
+
+from database.database import async_session
+# Стабы сгенерированы из telegram_bot_service.proto в корне репозитория:
+#   mkdir -p /tmp/gen/pb && cp telegram_bot_service.proto /tmp/gen/pb/
+#   python -m grpc_tools.protoc -I/tmp/gen --python_out=app --pyi_out=app --grpc_python_out=app /tmp/gen/pb/telegram_bot_service.proto
+from pb import telegram_bot_service_pb2 as pb2
+from pb import telegram_bot_service_pb2_grpc as pb2_grpc
+from service.key_bundle_cache import key_bundle_cache
+from service.payment_processor import payment_processor
+from service.price_broadcaster import price_broadcaster
+from service.price_cache import price_cache
+from service.subscription_service import (
+    PAYMENT_INVALID_DURATION,
+    PAYMENT_SUCCESS,
+    PAYMENT_USER_NOT_FOUND,
+    SubscriptionService,
+)
+
+logger = logging.getLogger(__name__)
+
+# PID воркера в trailing metadata: нагрузочный клиент по нему считает RPS на воркер
+WORKER_METADATA = (("x-worker-pid", str(os.getpid())),)
+
+# Пользователей в одном запросе к базе и в одном сообщении потока ответа
+BATCH_RPC_CHUNK_SIZE = int(os.getenv("BATCH_RPC_CHUNK_SIZE", "5000"))
+
+PAYMENT_RESULTS = {
+    PAYMENT_SUCCESS: pb2.SubscriptionUpdateResponse.SUCCESS,
+    PAYMENT_USER_NOT_FOUND: pb2.SubscriptionUpdateResponse.USER_NOT_FOUND,
+    PAYMENT_INVALID_DURATION: pb2.SubscriptionUpdateResponse.INVALID_DURATION,
+}
+
+
+def _chunks(telegram_ids):
+    # Повторы убираем, порядок запроса сохраняем
+    unique = list(dict.fromkeys(telegram_ids))
+    for i in range(0, len(unique), BATCH_RPC_CHUNK_SIZE):
+        yield unique[i:i + BATCH_RPC_CHUNK_SIZE]
+
+
+def _status_message(status: dict) -> pb2.SubscriptionStatusResponse:
+    return pb2.SubscriptionStatusResponse(**status)
+
+
+class TelegramBotServicer(pb2_grpc.TelegramBotServiceServicer):
+    """Реализация TelegramBotService поверх тех же async-репозиториев и пула соединений, что и REST API"""
+
+    async def CheckUserExists(self, request, context):
+        context.set_trailing_metadata(WORKER_METADATA)
+        async with async_session() as session:
+            exists = await SubscriptionService(session).user_exists(request.telegram_id)
+        return pb2.UserExistsResponse(exists=exists)
+
+    async def GetSubscriptionStatus(self, request, context):
+        context.set_trailing_metadata(WORKER_METADATA)
+        async with async_session() as session:
+            status = await SubscriptionService(session).get_status(request.telegram_id)
+        return _status_message(status)
+
+    async def BatchCheckUsersExist(self, request, context):
+        context.set_trailing_metadata(WORKER_METADATA)
+        async with async_session() as session:
+            service = SubscriptionService(session)
+            for chunk in _chunks(request.telegram_ids):
+                users = await service.batch_user_exists(chunk)
+                yield pb2.BatchUserExistsResponse(users=[
+                    pb2.BatchUserExistsResponse.Entry(telegram_id=telegram_id, exists=exists)
+                    for telegram_id, exists in users
+                ])
+
+    async def BatchGetSubscriptionStatus(self, request, context):
+        context.set_trailing_metadata(WORKER_METADATA)
+        async with async_session() as session:
+            service = SubscriptionService(session)
+            for chunk in _chunks(request.telegram_ids):
+                statuses = await service.batch_get_status(chunk)
+                yield pb2.BatchSubscriptionStatusResponse(statuses=[
+                    pb2.BatchSubscriptionStatusResponse.Entry(telegram_id=telegram_id, status=_status_message(status))
+                    for telegram_id, status in statuses
+                ])
+
+    async def GetConfigurationKeys(self, request, context):
+        # Готовый сериализованный ConfigurationKeysResponse из кэша наборов ключей
+        context.set_trailing_metadata(WORKER_METADATA)
+        return await key_bundle_cache.get(request.telegram_id, request.vpn_app)
+
+    async def ProcessSubscriptionPayment(self, request, context):
+        context.set_trailing_metadata(WORKER_METADATA)
+        result, status = await payment_processor.process(request.telegram_id, request.duration_days, request.payment_id)
+        if result == PAYMENT_SUCCESS:
+            # NOTIFY от триггера дойдёт чуть позже, а бот может сразу запросить ключи
+            key_bundle_cache.invalidate([request.telegram_id])
+        return pb2.SubscriptionUpdateResponse(result=PAYMENT_RESULTS[result], new_status=_status_message(status))
+
+    async def GetPrices(self, request, context):
+        # Готовый сериализованный PriceList из кэша: без запроса к базе и без сериализации
+        context.set_trailing_metadata(WORKER_METADATA)
+        return (await price_cache.get()).proto
+
+    async def SubscribeToPrices(self, request, context):
+        # Снимок цен сразу после подписки, дальше - только изменения. В очереди уже
+        # сериализованный PriceList
+        await price_cache.get()
+        async with price_broadcaster.subscribe() as subscription:
+            while True:
+                await context.write(await subscription.get())
@@ -14,7 +14,27 @@ from contextlib import asynccontextmanager
 
 # Импортируем роутеры
 from routes.admin import router as admin_router
-from database.database import init_db
+from routes.prices import router as prices_router
+from routes.metrics import router as metrics_router
+from database.database import engine, init_db, check_connection_budget
+from service.ssh_pool import ssh_pool
+from service.peer_pool import peer_pool_replenisher
+from service.subscription_expiry import subscription_expiry_sweeper, SUBSCRIPTION_EXPIRY_ENABLED
+from service.server_service import PEER_POOL_DEPTH, PEER_POOL_DEPTH_OVERRIDES
+from service.wg_keys import verify_known_vectors
+from service.vpn_encoder import vpn_encoder
+from service.keypair_generator import keypair_generator
+from grpc_server.server import bot_grpc_server, GRPC_ENABLED
+from service.price_cache import price_cache
+from service.key_bundle_cache import key_bundle_cache
+from service.pg_listener import pg_listener
+from service.audit_log import audit_log
+from service.audit_partitions import audit_partition_maintainer, AUDIT_PARTITION_MAINTENANCE_ENABLED
+from service.metrics import PrometheusMiddleware, instrument_engine, mark_worker_dead
+from service.ssh_admission import AdmissionRejected
+from service.peer_install_batcher import peer_install_batcher
+from service.server_load import server_load_monitor, SERVER_PLACEMENT_ENABLED
+from service.peer_reconciler import peer_reconciler, PEER_RECONCILE_MODE
 
 # Настройка логирования
 logging.basicConfig(
@@ -25,19 +45,66 @@ logger = logging.getLogger("amnezia-wg-management")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Проверяем локальную генерацию ключей WireGuard на контрольных векторах RFC 7748
+    verify_known_vectors()
+
     # Код, выполняемый при запуске приложения
     logger.info("Инициализация базы данных...")
     try:
         await init_db()
         logger.info("База данных успешно инициализирована")
+        await check_connection_budget()
     except Exception as e:
         logger.error(f"Ошибка при инициализации базы данных: {e}")
         raise
+
+    # Фоновая запись аудита пачками и обслуживание месячных секций audit_logs
+    audit_log.start()
+    if AUDIT_PARTITION_MAINTENANCE_ENABLED:
+        audit_partition_maintainer.start()
+    # Фоновое обслуживание пула SSH-соединений (health-check и закрытие простаивающих)
+    ssh_pool.start()
+    # Пополнение пула готовых пиров (только если пул включён)
+    if PEER_POOL_DEPTH > 0 or PEER_POOL_DEPTH_OVERRIDES:
+        peer_pool_replenisher.start()
+    # Истечение подписок пачками и удаление пиров истёкших подписок
+    if SUBSCRIPTION_EXPIRY_ENABLED:
+        subscription_expiry_sweeper.start()
+    # Кэши цен (REST /prices, GetPrices, SubscribeToPrices) и наборов ключей (GetConfigurationKeys),
+    # сбрасываемые по NOTIFY из базы через одно соединение LISTEN
+    price_cache.start()
+    key_bundle_cache.start()
+    pg_listener.start()
+    # Опрос нагрузки серверов для выбора сервера под новый ключ (/admin/placement)
+    if SERVER_PLACEMENT_ENABLED:
+        server_load_monitor.start()
+    # Периодическая сверка пиров серверов с базой (по умолчанию только отчёт, без исправления)
+    if PEER_RECONCILE_MODE != "off":
+        peer_reconciler.start()
+    # gRPC-сервер для бота в том же процессе (общий пул соединений с БД)
+    if GRPC_ENABLED:
+        await bot_grpc_server.start()
     
     yield  # Здесь приложение работает
     
     # Код, выполняемый при остановке приложения
     logger.info("Приложение завершает работу")
+    await bot_grpc_server.close()
+    await pg_listener.close()
+    await price_cache.close()
+    await key_bundle_cache.close()
+    await peer_pool_replenisher.close()
+    await subscription_expiry_sweeper.close()
+    await peer_install_batcher.close()
+    await server_load_monitor.close()
+    await peer_reconciler.close()
+    await audit_partition_maintainer.close()
+    await ssh_pool.close()
+    await vpn_encoder.close()
+    await keypair_generator.close()
+    # Последним: остальные компоненты при остановке ещё могут писать аудит
+    await audit_log.close()
+    mark_worker_dead()
 
 # Конфигурация приложения
 app = FastAPI(
@@ -71,6 +138,11 @@ app.add_middleware(TrustedHostMiddleware, allowed_hosts=["localhost", "127.0.0.1
 if os.getenv("FORCE_HTTPS", "0") == "1":
     app.add_middleware(HTTPSRedirectMiddleware)
 
+# Гистограммы времени запросов для /metrics; добавляется последним, чтобы учитывать и работу остальных middleware
+app.add_middleware(PrometheusMiddleware)
+# Тайминги SQL-запросов и состояние пула соединений
+instrument_engine(engine)
+
 # Session middleware (если нужны сессии)
 # app.add_middleware(SessionMiddleware, secret_key=os.getenv("SESSION_SECRET", "supersecret"))
 
@@ -81,6 +153,17 @@ async def health():
 
 # Интеграция роутеров
 app.include_router(admin_router)
+app.include_router(prices_router)
+app.include_router(metrics_router)
+
+# Сервер перегружен удалёнными операциями: клиенту - повторить позже
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Сервер перегружен, повторите запрос позже"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # Глобальный обработчик ошибок
 @app.exception_handler(Exception)
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -17,6 +18,7 @@ class SSHServerConfig(Base):
     endpoint = Column(String, nullable=True)  # Публичный endpoint сервера (IP:PORT или домен:порт)
     server_public_key = Column(String, nullable=True)  # Публичный ключ WireGuard сервера
     is_active = Column(Boolean, default=True)  # Флаг активности сервера
+    location = Column(String, nullable=True)  # Местоположение (как SubscriptionPlan.location), для выбора сервера
 
     def __repr__(self):
         return f"<SSHServerConfig(id={self.id}, host='{self.host}', username='{self.username}', server_public_key='{self.server_public_key}')>"
@@ -33,5 +35,78 @@ class SSHServerConfig(Base):
             wg_config_file=schema.wg_config_file,
             endpoint=schema.endpoint,
             server_public_key=getattr(schema, 'server_public_key', None),
+            location=getattr(schema, 'location', None),
         )
 
+# Пул клиентских адресов сервера: подсеть и граница уже выданных адресов
+class ServerIpPool(Base):
+    __tablename__ = 'server_ip_pools'
+
+    server_id = Column(Integer, ForeignKey('ssh_server_configs.id', ondelete='CASCADE'), primary_key=True)  # ID сервера
+    subnet = Column(String, nullable=False)  # Подсеть клиентов, например 10.8.1.0/24
+    first_index = Column(Integer, nullable=False)  # Первый выдаваемый адрес (смещение от начала подсети)
+    last_index = Column(Integer, nullable=False)  # Последний выдаваемый адрес (включительно)
+    next_index = Column(Integer, nullable=False)  # Следующий ещё ни разу не выданный адрес
+
+    def __repr__(self):
+        return f"<ServerIpPool(server_id={self.server_id}, subnet='{self.subnet}', next_index={self.next_index})>"
+
+# Выданный клиенту адрес. Освобождённые строки остаются и служат free-list для повторной выдачи
+class IpAllocation(Base):
+    __tablename__ = 'ip_allocations'
+    __table_args__ = (
+        UniqueConstraint('server_id', 'host_index', name='uq_ip_allocation_server_host'),
+        Index('ix_ip_allocation_free', 'server_id', 'host_index', postgresql_where=text('NOT is_allocated')),
+        Index('ix_ip_allocation_public_key', 'server_id', 'public_key'),
+    )
+
+    id = Column(Integer, primary_key=True)  # Уникальный идентификатор записи
+    server_id = Column(Integer, ForeignKey('ssh_server_configs.id', ondelete='CASCADE'), nullable=False)  # ID сервера
+    host_index = Column(Integer, nullable=False)  # Смещение адреса от начала подсети
+    address = Column(String, nullable=False)  # Адрес клиента в виде 10.8.1.2/32
+    is_allocated = Column(Boolean, nullable=False, default=True)  # Занят ли адрес
+    public_key = Column(String, nullable=True)  # Публичный ключ клиента, которому выдан адрес
+    preshared_key = Column(String, nullable=True)  # PSK пира (нужен для повторной установки пира на сервер)
+    allocated_at = Column(DateTime, nullable=True, default=datetime.utcnow)  # Время выдачи
+    released_at = Column(DateTime, nullable=True)  # Время освобождения
+    releasing_at = Column(DateTime, nullable=True)  # Пир удаляется с сервера, адрес вот-вот освободится
+
+    def __repr__(self):
+        return f"<IpAllocation(server_id={self.server_id}, address='{self.address}', is_allocated={self.is_allocated})>"
+
+# Заранее выпущенный клиент сервера: ключи сгенерированы, адрес выдан, пир установлен.
+# При выдаче строка удаляется, дальше клиент учитывается только в ip_allocations
+class PooledPeer(Base):
+    __tablename__ = 'pooled_peers'
+    __table_args__ = (
+        Index('ix_pooled_peer_available', 'server_id', 'id', postgresql_where=text("status = 'available'")),
+        Index('ix_pooled_peer_created_at', 'created_at'),
+    )
+
+    id = Column(Integer, primary_key=True)  # Уникальный идентификатор записи
+    server_id = Column(Integer, ForeignKey('ssh_server_configs.id', ondelete='CASCADE'), nullable=False)  # ID сервера
+    public_key = Column(String, nullable=False)  # Публичный ключ клиента
+    address = Column(String, nullable=False)  # Адрес клиента
+    conf = Column(String, nullable=False)  # .conf-файл клиента (содержит приватный ключ)
+    amneziawg_key = Column(String, nullable=False)  # Готовый AmneziaWG-ключ (vpn://)
+    status = Column(String, nullable=False, default='available')  # 'available' или 'retiring' (удаляется сборщиком)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Время выпуска
+
+    def __repr__(self):
+        return f"<PooledPeer(id={self.id}, server_id={self.server_id}, address='{self.address}', status='{self.status}')>"
+
+# Последний опрос нагрузки сервера (service/server_load.py): сервера опрашивает один воркер,
+# остальные читают снимок отсюда
+class ServerLoad(Base):
+    __tablename__ = 'server_load'
+
+    server_id = Column(Integer, ForeignKey('ssh_server_configs.id', ondelete='CASCADE'), primary_key=True)  # ID сервера
+    peers = Column(Integer, nullable=False, default=0)  # Пиров на интерфейсе
+    recent_handshakes = Column(Integer, nullable=False, default=0)  # Активных клиентов (недавний handshake)
+    ssh_latency = Column(Float, nullable=True)  # Задержка `wg show dump` по SSH, секунды
+    reachable = Column(Boolean, nullable=False, default=False)  # Ответил ли сервер на опрос
+    overloaded = Column(Boolean, nullable=False, default=False)  # Опрос отклонён контролем допуска SSH
+    probed_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Время опроса (UTC)
+
+    def __repr__(self):
+        return f"<ServerLoad(server_id={self.server_id}, peers={self.peers}, reachable={self.reachable})>"
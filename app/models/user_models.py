@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import Enum as PyEnum
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, UniqueConstraint, Enum
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, ForeignKey, Index, UniqueConstraint, Enum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -58,7 +58,7 @@ class UserSubscription(Base):
     id = Column(Integer, primary_key=True)  # Уникальный идентификатор подписки
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # ID пользователя
     plan_id = Column(Integer, ForeignKey('subscription_plans.id'), nullable=False)  # ID тарифного плана
-    start_date = Column(DateTime, nullable=False, default=lambda: datetime.now(datetime.UTC))  # Дата начала подписки
+    start_date = Column(DateTime, nullable=False, default=datetime.utcnow)  # Дата начала подписки
     end_date = Column(DateTime, nullable=False)  # Дата окончания подписки
     status = Column(Enum(SubscriptionStatus, name="subscription_status"), nullable=False, default=SubscriptionStatus.ACTIVE)  # Статус подписки
     reminder_sent = Column(Boolean, default=False)  # Было ли отправлено напоминание о скором окончании
@@ -76,26 +76,55 @@ class UserSubscriptionKey(Base):
     __tablename__ = 'user_subscription_keys'
     __table_args__ = (
         Index('ix_user_subscription_key_subscription_id', 'subscription_id'),
+        Index('ix_user_subscription_key_public_key', 'public_key'),
     )
 
     id = Column(Integer, primary_key=True)  # Уникальный идентификатор ключа
     subscription_id = Column(Integer, ForeignKey('user_subscriptions.id'), nullable=False)  # ID подписки
     key = Column(String, nullable=False)  # Значение ключа
+    # Пир на сервере, которому соответствует ключ (ssh_server_configs.id, без FK - таблица в другой metadata)
+    server_id = Column(Integer, nullable=True)
+    public_key = Column(String, nullable=True)  # Публичный ключ пира
+    revoked_at = Column(DateTime, nullable=True)  # Когда пир удалён с сервера
 
     subscription = relationship("UserSubscription", back_populates="keys")  # Связь с подпиской
 
     def __repr__(self):
         return f"<UserSubscriptionKey(id={self.id}, subscription_id={self.subscription_id}, key={self.key})>"
 
-# Модель для аудита изменений подписок и ключей
+# Журнал обработанных оплат: по payment_id повтор вебхука не продлевает подписку второй раз
+class SubscriptionPayment(Base):
+    __tablename__ = 'subscription_payments'
+
+    id = Column(Integer, primary_key=True)  # Уникальный идентификатор записи
+    payment_id = Column(String, nullable=False, unique=True)  # Идентификатор оплаты у платёжной системы
+    telegram_user_id = Column(String, nullable=False)  # Telegram ID пользователя
+    duration_days = Column(Integer, nullable=False)  # Оплаченная длительность в днях
+    result = Column(String, nullable=True)  # Результат обработки (PAYMENT_* из subscription_service)
+    end_date = Column(DateTime, nullable=True)  # Дата окончания подписки после оплаты
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Когда оплата обработана
+
+    def __repr__(self):
+        return f"<SubscriptionPayment(payment_id='{self.payment_id}', telegram_user_id='{self.telegram_user_id}', result='{self.result}')>"
+
+# Модель для аудита изменений подписок и ключей.
+# Таблица секционирована по месяцам (RANGE по timestamp): секции создаёт и удаляет
+# AuditPartitionMaintainer, строки вне созданных секций попадают в audit_logs_default
 class AuditLog(Base):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        # BRIN по времени: записи идут в порядке timestamp, индекс на порядки меньше B-tree
+        Index('ix_audit_logs_timestamp_brin', 'timestamp', postgresql_using='brin'),
+        Index('ix_audit_logs_entity', 'entity_type', 'entity_id', 'timestamp'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
 
-    id = Column(Integer, primary_key=True)  # Уникальный идентификатор записи аудита
+    # Ключ секционирования обязан входить в первичный ключ
+    id = Column(BigInteger, primary_key=True, autoincrement=True)  # Уникальный идентификатор записи аудита
     entity_type = Column(String, nullable=False)  # Тип сущности: 'subscription' или 'key'
     entity_id = Column(Integer, nullable=False)  # ID сущности
-    action = Column(String, nullable=False)  # Действие: 'create', 'update', 'delete'
-    timestamp = Column(DateTime, nullable=False, default=lambda: datetime.now(datetime.UTC))  # Время действия
+    action = Column(String, nullable=False)  # Действие: 'create', 'update', 'delete', 'payment', 'expire', 'revoke'
+    timestamp = Column(DateTime, primary_key=True, nullable=False, default=datetime.utcnow)  # Время действия
     details = Column(String, nullable=True)  # Детали изменения (например, JSON или текст)
 
     def __repr__(self):
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: pb/telegram_bot_service.proto
+# Protobuf Python Version: 7.35.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'pb/telegram_bot_service.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1dpb/telegram_bot_service.proto\x12\x06\x61pi.v1\"+\n\x14UserExistenceRequest\x12\x13\n\x0btelegram_id\x18\x01 \x01(\x03\"$\n\x12UserExistsResponse\x12\x0e\n\x06\x65xists\x18\x01 \x01(\x08\"0\n\x19SubscriptionStatusRequest\x12\x13\n\x0btelegram_id\x18\x01 \x01(\x03\"g\n\x1aSubscriptionStatusResponse\x12\x11\n\tis_active\x18\x01 \x01(\x08\x12\x1d\n\x15\x64\x61ys_until_expiration\x18\x02 \x01(\x05\x12\x17\n\x0f\x65xpiration_date\x18\x03 \x01(\t\"1\n\x19\x42\x61tchUserExistenceRequest\x12\x14\n\x0ctelegram_ids\x18\x01 \x03(\x03\"}\n\x17\x42\x61tchUserExistsResponse\x12\x34\n\x05users\x18\x01 \x03(\x0b\x32%.api.v1.BatchUserExistsResponse.Entry\x1a,\n\x05\x45ntry\x12\x13\n\x0btelegram_id\x18\x01 \x01(\x03\x12\x0e\n\x06\x65xists\x18\x02 \x01(\x08\"6\n\x1e\x42\x61tchSubscriptionStatusRequest\x12\x14\n\x0ctelegram_ids\x18\x01 \x03(\x03\"\xb4\x01\n\x1f\x42\x61tchSubscriptionStatusResponse\x12?\n\x08statuses\x18\x01 \x03(\x0b\x32-.api.v1.BatchSubscriptionStatusResponse.Entry\x1aP\n\x05\x45ntry\x12\x13\n\x0btelegram_id\x18\x01 \x01(\x03\x12\x32\n\x06status\x18\x02 \x01(\x0b\x32\".api.v1.SubscriptionStatusResponse\"@\n\x18\x43onfigurationKeysRequest\x12\x13\n\x0btelegram_id\x18\x01 \x01(\x03\x12\x0f\n\x07vpn_app\x18\x02 \x01(\t\"\x95\x01\n\x19\x43onfigurationKeysResponse\x12<\n\x04keys\x18\x01 \x03(\x0b\x32..api.v1.ConfigurationKeysResponse.KeyValuePair\x1a:\n\x0cKeyValuePair\x12\x0e\n\x06server\x18\x01 \x01(\t\x12\x0b\n\x03key\x18\x02 \x01(\t\x12\r\n\x05value\x18\x03 \x01(\t\"\\\n\x1aSubscriptionPaymentRequest\x12\x13\n\x0btelegram_id\x18\x01 \x01(\x03\x12\x15\n\rduration_days\x18\x02 \x01(\x05\x12\x12\n\npayment_id\x18\x03 \x01(\t\"\xdc\x01\n\x1aSubscriptionUpdateResponse\x12?\n\x06result\x18\x01 \x01(\x0e\x32/.api.v1.SubscriptionUpdateResponse.UpdateResult\x12\x36\n\nnew_status\x18\x02 \x01(\x0b\x32\".api.v1.SubscriptionStatusResponse\"E\n\x0cUpdateResult\x12\x0b\n\x07SUCCESS\x10\x00\x12\x12\n\x0eUSER_NOT_FOUND\x10\x01\x12\x14\n\x10INVALID_DURATION\x10\x02\"\x07\n\x05\x45mpty\"4\n\tPriceList\x12\'\n\x05plans\x18\x01 \x03(\x0b\x32\x18.api.v1.SubscriptionPlan\"g\n\x10SubscriptionPlan\x12\x15\n\rduration_days\x18\x01 \x01(\x05\x12\x12\n\nbase_price\x18\x02 \x01(\x03\x12\x18\n\x0bpromo_price\x18\x03 \x01(\x03H\x00\x88\x01\x01\x42\x0e\n\x0c_promo_price\"2\n\x07Message\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\x0b\n\x03url\x18\x02 \x01(\t\x12\x0c\n\x04\x64\x61ta\x18\x03 \x01(\t\"4\n\x10\x42roadcastMessage\x12 \n\x07message\x18\x01 \x01(\x0b\x32\x0f.api.v1.Message\"H\n\x0fPersonalMessage\x12 \n\x07message\x18\x01 \x01(\x0b\x32\x0f.api.v1.Message\x12\x13\n\x0btelegram_id\x18\x02 \x01(\x03\x32\xcb\x05\n\x12TelegramBotService\x12M\n\x0f\x43heckUserExists\x12\x1c.api.v1.UserExistenceRequest\x1a\x1a.api.v1.UserExistsResponse\"\x00\x12`\n\x15GetSubscriptionStatus\x12!.api.v1.SubscriptionStatusRequest\x1a\".api.v1.SubscriptionStatusResponse\"\x00\x12]\n\x14GetConfigurationKeys\x12 .api.v1.ConfigurationKeysRequest\x1a!.api.v1.ConfigurationKeysResponse\"\x00\x12\x66\n\x1aProcessSubscriptionPayment\x12\".api.v1.SubscriptionPaymentRequest\x1a\".api.v1.SubscriptionUpdateResponse\"\x00\x12/\n\tGetPrices\x12\r.api.v1.Empty\x1a\x11.api.v1.PriceList\"\x00\x12\x39\n\x11SubscribeToPrices\x12\r.api.v1.Empty\x1a\x11.api.v1.PriceList\"\x00\x30\x01\x12^\n\x14\x42\x61tchCheckUsersExist\x12!.api.v1.BatchUserExistenceRequest\x1a\x1f.api.v1.BatchUserExistsResponse\"\x00\x30\x01\x12q\n\x1a\x42\x61tchGetSubscriptionStatus\x12&.api.v1.BatchSubscriptionStatusRequest\x1a\'.api.v1.BatchSubscriptionStatusResponse\"\x00\x30\x01\x42\x18Z\x16\x61pp/internal/pb/api/v1b\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'pb.telegram_bot_service_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  _globals['DESCRIPTOR']._loaded_options = None
+  _globals['DESCRIPTOR']._serialized_options = b'Z\026app/internal/pb/api/v1'
+  _globals['_USEREXISTENCEREQUEST']._serialized_start=41
+  _globals['_USEREXISTENCEREQUEST']._serialized_end=84
+  _globals['_USEREXISTSRESPONSE']._serialized_start=86
+  _globals['_USEREXISTSRESPONSE']._serialized_end=122
+  _globals['_SUBSCRIPTIONSTATUSREQUEST']._serialized_start=124
+  _globals['_SUBSCRIPTIONSTATUSREQUEST']._serialized_end=172
+  _globals['_SUBSCRIPTIONSTATUSRESPONSE']._serialized_start=174
+  _globals['_SUBSCRIPTIONSTATUSRESPONSE']._serialized_end=277
+  _globals['_BATCHUSEREXISTENCEREQUEST']._serialized_start=279
+  _globals['_BATCHUSEREXISTENCEREQUEST']._serialized_end=328
+  _globals['_BATCHUSEREXISTSRESPONSE']._serialized_start=330
+  _globals['_BATCHUSEREXISTSRESPONSE']._serialized_end=455
+  _globals['_BATCHUSEREXISTSRESPONSE_ENTRY']._serialized_start=411
+  _globals['_BATCHUSEREXISTSRESPONSE_ENTRY']._serialized_end=455
+  _globals['_BATCHSUBSCRIPTIONSTATUSREQUEST']._serialized_start=457
+  _globals['_BATCHSUBSCRIPTIONSTATUSREQUEST']._serialized_end=511
+  _globals['_BATCHSUBSCRIPTIONSTATUSRESPONSE']._serialized_start=514
+  _globals['_BATCHSUBSCRIPTIONSTATUSRESPONSE']._serialized_end=694
+  _globals['_BATCHSUBSCRIPTIONSTATUSRESPONSE_ENTRY']._serialized_start=614
+  _globals['_BATCHSUBSCRIPTIONSTATUSRESPONSE_ENTRY']._serialized_end=694
+  _globals['_CONFIGURATIONKEYSREQUEST']._serialized_start=696
+  _globals['_CONFIGURATIONKEYSREQUEST']._serialized_end=760
+  _globals['_CONFIGURATIONKEYSRESPONSE']._serialized_start=763
+  _globals['_CONFIGURATIONKEYSRESPONSE']._serialized_end=912
+  _globals['_CONFIGURATIONKEYSRESPONSE_KEYVALUEPAIR']._serialized_start=854
+  _globals['_CONFIGURATIONKEYSRESPONSE_KEYVALUEPAIR']._serialized_end=912
+  _globals['_SUBSCRIPTIONPAYMENTREQUEST']._serialized_start=914
+  _globals['_SUBSCRIPTIONPAYMENTREQUEST']._serialized_end=1006
+  _globals['_SUBSCRIPTIONUPDATERESPONSE']._serialized_start=1009
+  _globals['_SUBSCRIPTIONUPDATERESPONSE']._serialized_end=1229
+  _globals['_SUBSCRIPTIONUPDATERESPONSE_UPDATERESULT']._serialized_start=1160
+  _globals['_SUBSCRIPTIONUPDATERESPONSE_UPDATERESULT']._serialized_end=1229
+  _globals['_EMPTY']._serialized_start=1231
+  _globals['_EMPTY']._serialized_end=1238
+  _globals['_PRICELIST']._serialized_start=1240
+  _globals['_PRICELIST']._serialized_end=1292
+  _globals['_SUBSCRIPTIONPLAN']._serialized_start=1294
+  _globals['_SUBSCRIPTIONPLAN']._serialized_end=1397
+  _globals['_MESSAGE']._serialized_start=1399
+  _globals['_MESSAGE']._serialized_end=1449
+  _globals['_BROADCASTMESSAGE']._serialized_start=1451
+  _globals['_BROADCASTMESSAGE']._serialized_end=1503
+  _globals['_PERSONALMESSAGE']._serialized_start=1505
+  _globals['_PERSONALMESSAGE']._serialized_end=1577
+  _globals['_TELEGRAMBOTSERVICE']._serialized_start=1580
+  _globals['_TELEGRAMBOTSERVICE']._serialized_end=2295
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,167 @@
+from google.protobuf.internal import containers as _containers
+from google.protobuf.internal import enum_type_wrapper as _enum_type_wrapper
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import message as _message
+from collections.abc import Iterable as _Iterable, Mapping as _Mapping
+from typing import ClassVar as _ClassVar, Optional as _Optional, Union as _Union
+
+DESCRIPTOR: _descriptor.FileDescriptor
+
+class UserExistenceRequest(_message.Message):
+    __slots__ = ("telegram_id",)
+    TELEGRAM_ID_FIELD_NUMBER: _ClassVar[int]
+    telegram_id: int
+    def __init__(self, telegram_id: _Optional[int] = ...) -> None: ...
+
+class UserExistsResponse(_message.Message):
+    __slots__ = ("exists",)
+    EXISTS_FIELD_NUMBER: _ClassVar[int]
+    exists: bool
+    def __init__(self, exists: _Optional[bool] = ...) -> None: ...
+
+class SubscriptionStatusRequest(_message.Message):
+    __slots__ = ("telegram_id",)
+    TELEGRAM_ID_FIELD_NUMBER: _ClassVar[int]
+    telegram_id: int
+    def __init__(self, telegram_id: _Optional[int] = ...) -> None: ...
+
+class SubscriptionStatusResponse(_message.Message):
+    __slots__ = ("is_active", "days_until_expiration", "expiration_date")
+    IS_ACTIVE_FIELD_NUMBER: _ClassVar[int]
+    DAYS_UNTIL_EXPIRATION_FIELD_NUMBER: _ClassVar[int]
+    EXPIRATION_DATE_FIELD_NUMBER: _ClassVar[int]
+    is_active: bool
+    days_until_expiration: int
+    expiration_date: str
+    def __init__(self, is_active: _Optional[bool] = ..., days_until_expiration: _Optional[int] = ..., expiration_date: _Optional[str] = ...) -> None: ...
+
+class BatchUserExistenceRequest(_message.Message):
+    __slots__ = ("telegram_ids",)
+    TELEGRAM_IDS_FIELD_NUMBER: _ClassVar[int]
+    telegram_ids: _containers.RepeatedScalarFieldContainer[int]
+    def __init__(self, telegram_ids: _Optional[_Iterable[int]] = ...) -> None: ...
+
+class BatchUserExistsResponse(_message.Message):
+    __slots__ = ("users",)
+    class Entry(_message.Message):
+        __slots__ = ("telegram_id", "exists")
+        TELEGRAM_ID_FIELD_NUMBER: _ClassVar[int]
+        EXISTS_FIELD_NUMBER: _ClassVar[int]
+        telegram_id: int
+        exists: bool
+        def __init__(self, telegram_id: _Optional[int] = ..., exists: _Optional[bool] = ...) -> None: ...
+    USERS_FIELD_NUMBER: _ClassVar[int]
+    users: _containers.RepeatedCompositeFieldContainer[BatchUserExistsResponse.Entry]
+    def __init__(self, users: _Optional[_Iterable[_Union[BatchUserExistsResponse.Entry, _Mapping]]] = ...) -> None: ...
+
+class BatchSubscriptionStatusRequest(_message.Message):
+    __slots__ = ("telegram_ids",)
+    TELEGRAM_IDS_FIELD_NUMBER: _ClassVar[int]
+    telegram_ids: _containers.RepeatedScalarFieldContainer[int]
+    def __init__(self, telegram_ids: _Optional[_Iterable[int]] = ...) -> None: ...
+
+class BatchSubscriptionStatusResponse(_message.Message):
+    __slots__ = ("statuses",)
+    class Entry(_message.Message):
+        __slots__ = ("telegram_id", "status")
+        TELEGRAM_ID_FIELD_NUMBER: _ClassVar[int]
+        STATUS_FIELD_NUMBER: _ClassVar[int]
+        telegram_id: int
+        status: SubscriptionStatusResponse
+        def __init__(self, telegram_id: _Optional[int] = ..., status: _Optional[_Union[SubscriptionStatusResponse, _Mapping]] = ...) -> None: ...
+    STATUSES_FIELD_NUMBER: _ClassVar[int]
+    statuses: _containers.RepeatedCompositeFieldContainer[BatchSubscriptionStatusResponse.Entry]
+    def __init__(self, statuses: _Optional[_Iterable[_Union[BatchSubscriptionStatusResponse.Entry, _Mapping]]] = ...) -> None: ...
+
+class ConfigurationKeysRequest(_message.Message):
+    __slots__ = ("telegram_id", "vpn_app")
+    TELEGRAM_ID_FIELD_NUMBER: _ClassVar[int]
+    VPN_APP_FIELD_NUMBER: _ClassVar[int]
+    telegram_id: int
+    vpn_app: str
+    def __init__(self, telegram_id: _Optional[int] = ..., vpn_app: _Optional[str] = ...) -> None: ...
+
+class ConfigurationKeysResponse(_message.Message):
+    __slots__ = ("keys",)
+    class KeyValuePair(_message.Message):
+        __slots__ = ("server", "key", "value")
+        SERVER_FIELD_NUMBER: _ClassVar[int]
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        server: str
+        key: str
+        value: str
+        def __init__(self, server: _Optional[str] = ..., key: _Optional[str] = ..., value: _Optional[str] = ...) -> None: ...
+    KEYS_FIELD_NUMBER: _ClassVar[int]
+    keys: _containers.RepeatedCompositeFieldContainer[ConfigurationKeysResponse.KeyValuePair]
+    def __init__(self, keys: _Optional[_Iterable[_Union[ConfigurationKeysResponse.KeyValuePair, _Mapping]]] = ...) -> None: ...
+
+class SubscriptionPaymentRequest(_message.Message):
+    __slots__ = ("telegram_id", "duration_days", "payment_id")
+    TELEGRAM_ID_FIELD_NUMBER: _ClassVar[int]
+    DURATION_DAYS_FIELD_NUMBER: _ClassVar[int]
+    PAYMENT_ID_FIELD_NUMBER: _ClassVar[int]
+    telegram_id: int
+    duration_days: int
+    payment_id: str
+    def __init__(self, telegram_id: _Optional[int] = ..., duration_days: _Optional[int] = ..., payment_id: _Optional[str] = ...) -> None: ...
+
+class SubscriptionUpdateResponse(_message.Message):
+    __slots__ = ("result", "new_status")
+    class UpdateResult(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+        __slots__ = ()
+        SUCCESS: _ClassVar[SubscriptionUpdateResponse.UpdateResult]
+        USER_NOT_FOUND: _ClassVar[SubscriptionUpdateResponse.UpdateResult]
+        INVALID_DURATION: _ClassVar[SubscriptionUpdateResponse.UpdateResult]
+    SUCCESS: SubscriptionUpdateResponse.UpdateResult
+    USER_NOT_FOUND: SubscriptionUpdateResponse.UpdateResult
+    INVALID_DURATION: SubscriptionUpdateResponse.UpdateResult
+    RESULT_FIELD_NUMBER: _ClassVar[int]
+    NEW_STATUS_FIELD_NUMBER: _ClassVar[int]
+    result: SubscriptionUpdateResponse.UpdateResult
+    new_status: SubscriptionStatusResponse
+    def __init__(self, result: _Optional[_Union[SubscriptionUpdateResponse.UpdateResult, str]] = ..., new_status: _Optional[_Union[SubscriptionStatusResponse, _Mapping]] = ...) -> None: ...
+
+class Empty(_message.Message):
+    __slots__ = ()
+    def __init__(self) -> None: ...
+
+class PriceList(_message.Message):
+    __slots__ = ("plans",)
+    PLANS_FIELD_NUMBER: _ClassVar[int]
+    plans: _containers.RepeatedCompositeFieldContainer[SubscriptionPlan]
+    def __init__(self, plans: _Optional[_Iterable[_Union[SubscriptionPlan, _Mapping]]] = ...) -> None: ...
+
+class SubscriptionPlan(_message.Message):
+    __slots__ = ("duration_days", "base_price", "promo_price")
+    DURATION_DAYS_FIELD_NUMBER: _ClassVar[int]
+    BASE_PRICE_FIELD_NUMBER: _ClassVar[int]
+    PROMO_PRICE_FIELD_NUMBER: _ClassVar[int]
+    duration_days: int
+    base_price: int
+    promo_price: int
+    def __init__(self, duration_days: _Optional[int] = ..., base_price: _Optional[int] = ..., promo_price: _Optional[int] = ...) -> None: ...
+
+class Message(_message.Message):
+    __slots__ = ("text", "url", "data")
+    TEXT_FIELD_NUMBER: _ClassVar[int]
+    URL_FIELD_NUMBER: _ClassVar[int]
+    DATA_FIELD_NUMBER: _ClassVar[int]
+    text: str
+    url: str
+    data: str
+    def __init__(self, text: _Optional[str] = ..., url: _Optional[str] = ..., data: _Optional[str] = ...) -> None: ...
+
+class BroadcastMessage(_message.Message):
+    __slots__ = ("message",)
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    message: Message
+    def __init__(self, message: _Optional[_Union[Message, _Mapping]] = ...) -> None: ...
+
+class PersonalMessage(_message.Message):
+    __slots__ = ("message", "telegram_id")
+    MESSAGE_FIELD_NUMBER: _ClassVar[int]
+    TELEGRAM_ID_FIELD_NUMBER: _ClassVar[int]
+    message: Message
+    telegram_id: int
+    def __init__(self, message: _Optional[_Union[Message, _Mapping]] = ..., telegram_id: _Optional[int] = ...) -> None: ...
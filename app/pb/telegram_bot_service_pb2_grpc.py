@@ -0,0 +1,435 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+import warnings
+
+from pb import telegram_bot_service_pb2 as pb_dot_telegram__bot__service__pb2
+
+GRPC_GENERATED_VERSION = '1.84.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
+
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in pb/telegram_bot_service_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class TelegramBotServiceStub:
+    """TelegramBotService предоставляет методы для управления подписками и конфигурацией VPN
+    через Telegram бота.
+
+    Основные возможности:
+    - Проверка существования пользователя
+    - Управление подписками
+    - Получение конфигурационных ключей
+    - Обработка платежей
+    - Работа с ценами
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.CheckUserExists = channel.unary_unary(
+                '/api.v1.TelegramBotService/CheckUserExists',
+                request_serializer=pb_dot_telegram__bot__service__pb2.UserExistenceRequest.SerializeToString,
+                response_deserializer=pb_dot_telegram__bot__service__pb2.UserExistsResponse.FromString,
+                _registered_method=True)
+        self.GetSubscriptionStatus = channel.unary_unary(
+                '/api.v1.TelegramBotService/GetSubscriptionStatus',
+                request_serializer=pb_dot_telegram__bot__service__pb2.SubscriptionStatusRequest.SerializeToString,
+                response_deserializer=pb_dot_telegram__bot__service__pb2.SubscriptionStatusResponse.FromString,
+                _registered_method=True)
+        self.GetConfigurationKeys = channel.unary_unary(
+                '/api.v1.TelegramBotService/GetConfigurationKeys',
+                request_serializer=pb_dot_telegram__bot__service__pb2.ConfigurationKeysRequest.SerializeToString,
+                response_deserializer=pb_dot_telegram__bot__service__pb2.ConfigurationKeysResponse.FromString,
+                _registered_method=True)
+        self.ProcessSubscriptionPayment = channel.unary_unary(
+                '/api.v1.TelegramBotService/ProcessSubscriptionPayment',
+                request_serializer=pb_dot_telegram__bot__service__pb2.SubscriptionPaymentRequest.SerializeToString,
+                response_deserializer=pb_dot_telegram__bot__service__pb2.SubscriptionUpdateResponse.FromString,
+                _registered_method=True)
+        self.GetPrices = channel.unary_unary(
+                '/api.v1.TelegramBotService/GetPrices',
+                request_serializer=pb_dot_telegram__bot__service__pb2.Empty.SerializeToString,
+                response_deserializer=pb_dot_telegram__bot__service__pb2.PriceList.FromString,
+                _registered_method=True)
+        self.SubscribeToPrices = channel.unary_stream(
+                '/api.v1.TelegramBotService/SubscribeToPrices',
+                request_serializer=pb_dot_telegram__bot__service__pb2.Empty.SerializeToString,
+                response_deserializer=pb_dot_telegram__bot__service__pb2.PriceList.FromString,
+                _registered_method=True)
+        self.BatchCheckUsersExist = channel.unary_stream(
+                '/api.v1.TelegramBotService/BatchCheckUsersExist',
+                request_serializer=pb_dot_telegram__bot__service__pb2.BatchUserExistenceRequest.SerializeToString,
+                response_deserializer=pb_dot_telegram__bot__service__pb2.BatchUserExistsResponse.FromString,
+                _registered_method=True)
+        self.BatchGetSubscriptionStatus = channel.unary_stream(
+                '/api.v1.TelegramBotService/BatchGetSubscriptionStatus',
+                request_serializer=pb_dot_telegram__bot__service__pb2.BatchSubscriptionStatusRequest.SerializeToString,
+                response_deserializer=pb_dot_telegram__bot__service__pb2.BatchSubscriptionStatusResponse.FromString,
+                _registered_method=True)
+
+
+class TelegramBotServiceServicer:
+    """TelegramBotService предоставляет методы для управления подписками и конфигурацией VPN
+    через Telegram бота.
+
+    Основные возможности:
+    - Проверка существования пользователя
+    - Управление подписками
+    - Получение конфигурационных ключей
+    - Обработка платежей
+    - Работа с ценами
+    """
+
+    def CheckUserExists(self, request, context):
+        """CheckUserExists проверяет наличие пользователя в системе
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetSubscriptionStatus(self, request, context):
+        """GetSubscriptionStatus возвращает текущий статус подписки пользователя
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetConfigurationKeys(self, request, context):
+        """GetConfigurationKeys возвращает конфигурационные ключи для VPN-приложения
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcessSubscriptionPayment(self, request, context):
+        """ProcessSubscriptionPayment обрабатывает оплату подписки
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetPrices(self, request, context):
+        """GetPrices возвращает текущий список цен
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SubscribeToPrices(self, request, context):
+        """SubscribeToPrices подписывается на обновления цен в реальном времени
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchCheckUsersExist(self, request, context):
+        """BatchCheckUsersExist проверяет наличие пачки пользователей.
+        Ответ приходит потоком частей, не больше нескольких тысяч пользователей в каждой
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchGetSubscriptionStatus(self, request, context):
+        """BatchGetSubscriptionStatus возвращает статусы подписок пачки пользователей.
+        Ответ приходит потоком частей, не больше нескольких тысяч пользователей в каждой
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_TelegramBotServiceServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'CheckUserExists': grpc.unary_unary_rpc_method_handler(
+                    servicer.CheckUserExists,
+                    request_deserializer=pb_dot_telegram__bot__service__pb2.UserExistenceRequest.FromString,
+                    response_serializer=pb_dot_telegram__bot__service__pb2.UserExistsResponse.SerializeToString,
+            ),
+            'GetSubscriptionStatus': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetSubscriptionStatus,
+                    request_deserializer=pb_dot_telegram__bot__service__pb2.SubscriptionStatusRequest.FromString,
+                    response_serializer=pb_dot_telegram__bot__service__pb2.SubscriptionStatusResponse.SerializeToString,
+            ),
+            'GetConfigurationKeys': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetConfigurationKeys,
+                    request_deserializer=pb_dot_telegram__bot__service__pb2.ConfigurationKeysRequest.FromString,
+                    response_serializer=pb_dot_telegram__bot__service__pb2.ConfigurationKeysResponse.SerializeToString,
+            ),
+            'ProcessSubscriptionPayment': grpc.unary_unary_rpc_method_handler(
+                    servicer.ProcessSubscriptionPayment,
+                    request_deserializer=pb_dot_telegram__bot__service__pb2.SubscriptionPaymentRequest.FromString,
+                    response_serializer=pb_dot_telegram__bot__service__pb2.SubscriptionUpdateResponse.SerializeToString,
+            ),
+            'GetPrices': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetPrices,
+                    request_deserializer=pb_dot_telegram__bot__service__pb2.Empty.FromString,
+                    response_serializer=pb_dot_telegram__bot__service__pb2.PriceList.SerializeToString,
+            ),
+            'SubscribeToPrices': grpc.unary_stream_rpc_method_handler(
+                    servicer.SubscribeToPrices,
+                    request_deserializer=pb_dot_telegram__bot__service__pb2.Empty.FromString,
+                    response_serializer=pb_dot_telegram__bot__service__pb2.PriceList.SerializeToString,
+            ),
+            'BatchCheckUsersExist': grpc.unary_stream_rpc_method_handler(
+                    servicer.BatchCheckUsersExist,
+                    request_deserializer=pb_dot_telegram__bot__service__pb2.BatchUserExistenceRequest.FromString,
+                    response_serializer=pb_dot_telegram__bot__service__pb2.BatchUserExistsResponse.SerializeToString,
+            ),
+            'BatchGetSubscriptionStatus': grpc.unary_stream_rpc_method_handler(
+                    servicer.BatchGetSubscriptionStatus,
+                    request_deserializer=pb_dot_telegram__bot__service__pb2.BatchSubscriptionStatusRequest.FromString,
+                    response_serializer=pb_dot_telegram__bot__service__pb2.BatchSubscriptionStatusResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'api.v1.TelegramBotService', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('api.v1.TelegramBotService', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class TelegramBotService:
+    """TelegramBotService предоставляет методы для управления подписками и конфигурацией VPN
+    через Telegram бота.
+
+    Основные возможности:
+    - Проверка существования пользователя
+    - Управление подписками
+    - Получение конфигурационных ключей
+    - Обработка платежей
+    - Работа с ценами
+    """
+
+    @staticmethod
+    def CheckUserExists(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/api.v1.TelegramBotService/CheckUserExists',
+            pb_dot_telegram__bot__service__pb2.UserExistenceRequest.SerializeToString,
+            pb_dot_telegram__bot__service__pb2.UserExistsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetSubscriptionStatus(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/api.v1.TelegramBotService/GetSubscriptionStatus',
+            pb_dot_telegram__bot__service__pb2.SubscriptionStatusRequest.SerializeToString,
+            pb_dot_telegram__bot__service__pb2.SubscriptionStatusResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetConfigurationKeys(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/api.v1.TelegramBotService/GetConfigurationKeys',
+            pb_dot_telegram__bot__service__pb2.ConfigurationKeysRequest.SerializeToString,
+            pb_dot_telegram__bot__service__pb2.ConfigurationKeysResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ProcessSubscriptionPayment(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/api.v1.TelegramBotService/ProcessSubscriptionPayment',
+            pb_dot_telegram__bot__service__pb2.SubscriptionPaymentRequest.SerializeToString,
+            pb_dot_telegram__bot__service__pb2.SubscriptionUpdateResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetPrices(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/api.v1.TelegramBotService/GetPrices',
+            pb_dot_telegram__bot__service__pb2.Empty.SerializeToString,
+            pb_dot_telegram__bot__service__pb2.PriceList.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SubscribeToPrices(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/api.v1.TelegramBotService/SubscribeToPrices',
+            pb_dot_telegram__bot__service__pb2.Empty.SerializeToString,
+            pb_dot_telegram__bot__service__pb2.PriceList.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchCheckUsersExist(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/api.v1.TelegramBotService/BatchCheckUsersExist',
+            pb_dot_telegram__bot__service__pb2.BatchUserExistenceRequest.SerializeToString,
+            pb_dot_telegram__bot__service__pb2.BatchUserExistsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchGetSubscriptionStatus(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/api.v1.TelegramBotService/BatchGetSubscriptionStatus',
+            pb_dot_telegram__bot__service__pb2.BatchSubscriptionStatusRequest.SerializeToString,
+            pb_dot_telegram__bot__service__pb2.BatchSubscriptionStatusResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Integer, String, and_, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user_models import AuditLog
+
+# Запись аудита: (entity_type, entity_id, action, timestamp, details)
+AuditRow = Tuple[str, int, str, datetime, Optional[str]]
+
+# Окно по умолчанию для query(): без границ по времени запрос прошёл бы по всем секциям
+AUDIT_QUERY_DEFAULT_DAYS = 30
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # timestamp в базе - наивное UTC-время; границы с часовым поясом (since=...Z) приводим к нему
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class AuditLogRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def bulk_insert(self, rows: Iterable[AuditRow]) -> int:
+        """Пачка записей аудита одним INSERT ... SELECT FROM unnest"""
+        rows = list(rows)
+        if not rows:
+            return 0
+        values = select(
+            func.unnest(bindparam("entity_types", type_=ARRAY(String))),
+            func.unnest(bindparam("entity_ids", type_=ARRAY(Integer))),
+            func.unnest(bindparam("actions", type_=ARRAY(String))),
+            func.unnest(bindparam("timestamps", type_=ARRAY(DateTime))),
+            func.unnest(bindparam("details", type_=ARRAY(String))),
+        )
+        stmt = insert(AuditLog.__table__).from_select(
+            [AuditLog.entity_type, AuditLog.entity_id, AuditLog.action, AuditLog.timestamp, AuditLog.details],
+            values,
+        )
+        try:
+            await self.db.execute(stmt, {
+                "entity_types": [row[0] for row in rows],
+                "entity_ids": [row[1] for row in rows],
+                "actions": [row[2] for row in rows],
+                "timestamps": [row[3] for row in rows],
+                "details": [row[4] for row in rows],
+            })
+            await self.db.commit()
+            return len(rows)
+        except SQLAlchemyError:
+            await self.db.rollback()
+            raise
+
+    async def query(
+        self,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[int] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> List[AuditLog]:
+        """
+        Записи аудита в окне [since, until), новые первыми. Условие на timestamp всегда есть,
+        поэтому Postgres читает только секции этого окна. Без since - последние
+        AUDIT_QUERY_DEFAULT_DAYS дней до until.
+        """
+        until = _naive_utc(until) or datetime.utcnow()
+        since = _naive_utc(since) or until - timedelta(days=AUDIT_QUERY_DEFAULT_DAYS)
+        conditions = [AuditLog.timestamp >= since, AuditLog.timestamp < until]
+        if entity_type is not None:
+            conditions.append(AuditLog.entity_type == entity_type)
+        if entity_id is not None:
+            conditions.append(AuditLog.entity_id == entity_id)
+        if action is not None:
+            conditions.append(AuditLog.action == action)
+        result = await self.db.execute(
+            select(AuditLog)
+            .where(and_(*conditions))
+            .order_by(AuditLog.timestamp.desc(), AuditLog.id.desc())
+            .limit(limit)
+        )
+        return result.scalars().all()
@@ -0,0 +1,309 @@
+import ipaddress
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.server_models import IpAllocation, ServerIpPool
+
+# Подсеть клиентов по умолчанию и первый выдаваемый адрес (.0 - сеть, .1 - сам сервер)
+DEFAULT_CLIENT_SUBNET = os.getenv("WG_CLIENT_SUBNET", "10.8.1.0/24")
+DEFAULT_FIRST_HOST_INDEX = int(os.getenv("WG_CLIENT_FIRST_HOST_INDEX", "2"))
+INSERT_CHUNK_SIZE = 1000
+# Ключ advisory-блокировки Postgres (пара ключ, server_id): отметка пиров на удаление берёт её
+# разделяемой, сверка пиров (service/peer_reconciler.py) - исключительной на время применения
+PEER_CHANGES_LOCK_KEY = 7301006
+
+
+def address_for_index(subnet: str, host_index: int) -> str:
+    network = ipaddress.ip_network(subnet)
+    return f"{network.network_address + host_index}/{network.max_prefixlen}"
+
+
+def index_for_address(subnet: str, address: str) -> Optional[int]:
+    network = ipaddress.ip_network(subnet)
+    try:
+        ip = ipaddress.ip_interface(address).ip
+    except ValueError:
+        return None
+    if ip not in network:
+        return None
+    return int(ip) - int(network.network_address)
+
+
+class IpPoolRepository:
+    """
+    Аллокатор клиентских адресов сервера.
+    Выдача идёт сначала из free-list (освобождённые строки ip_allocations, частичный индекс
+    по NOT is_allocated), затем сдвигом границы next_index в server_ip_pools.
+    Оба шага идут под блокировкой строк (SKIP LOCKED для free-list, FOR UPDATE для границы),
+    поэтому безопасны для нескольких воркеров.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_pool(self, server_id: int) -> Optional[ServerIpPool]:
+        result = await self.db.execute(select(ServerIpPool).where(ServerIpPool.server_id == server_id))
+        return result.scalars().first()
+
+    async def ensure_pool(
+        self,
+        server_id: int,
+        subnet: Optional[str] = None,
+        existing: Iterable[Tuple[str, Optional[str]]] = (),
+    ) -> ServerIpPool:
+        """
+        Создаёт пул сервера, если его ещё нет. existing - уже занятые на сервере адреса
+        в виде (адрес, публичный ключ), они помечаются выданными, а пропуски между ними
+        попадают в free-list.
+        """
+        pool = await self.get_pool(server_id)
+        if pool:
+            return pool
+        subnet = str(ipaddress.ip_network(subnet or DEFAULT_CLIENT_SUBNET))
+        network = ipaddress.ip_network(subnet)
+        # Для IPv4 последний адрес подсети - широковещательный
+        last_index = network.num_addresses - (2 if network.version == 4 else 1)
+        first_index = DEFAULT_FIRST_HOST_INDEX
+        taken = {}
+        for address, public_key in existing:
+            index = index_for_address(subnet, address)
+            if index is not None and first_index <= index <= last_index:
+                taken[index] = public_key
+        next_index = max(taken) + 1 if taken else first_index
+
+        await self.db.execute(
+            insert(ServerIpPool)
+            .values(server_id=server_id, subnet=subnet, first_index=first_index, last_index=last_index, next_index=next_index)
+            .on_conflict_do_nothing(index_elements=[ServerIpPool.server_id])
+        )
+        rows = [
+            {
+                "server_id": server_id,
+                "host_index": index,
+                "address": address_for_index(subnet, index),
+                "is_allocated": index in taken,
+                "public_key": taken.get(index),
+                "allocated_at": datetime.utcnow() if index in taken else None,
+            }
+            for index in range(first_index, next_index)
+        ]
+        await self._insert_allocations(rows)
+        await self.db.commit()
+        return await self.get_pool(server_id)
+
+    async def _insert_allocations(self, rows: List[dict]):
+        # Пачками, чтобы не упереться в лимит параметров запроса asyncpg на пулах размера /16
+        for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+            await self.db.execute(
+                insert(IpAllocation)
+                .values(rows[i:i + INSERT_CHUNK_SIZE])
+                .on_conflict_do_nothing(constraint='uq_ip_allocation_server_host')
+            )
+
+    async def _take_free(self, server_id: int, public_keys: List[Tuple[str, Optional[str]]]) -> List[str]:
+        # Повторно выдаём освобождённые адреса. SKIP LOCKED - параллельные воркеры берут разные строки
+        free = (
+            await self.db.execute(
+                select(IpAllocation.id, IpAllocation.address)
+                .where(and_(IpAllocation.server_id == server_id, IpAllocation.is_allocated.is_(False)))
+                .order_by(IpAllocation.host_index)
+                .limit(len(public_keys))
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        if not free:
+            return []
+        now = datetime.utcnow()
+        # Обновление по первичному ключу одним executemany
+        await self.db.execute(
+            update(IpAllocation),
+            [
+                {
+                    "id": allocation_id,
+                    "is_allocated": True,
+                    "public_key": public_key,
+                    "preshared_key": preshared_key,
+                    "allocated_at": now,
+                    "released_at": None,
+                }
+                for (allocation_id, _), (public_key, preshared_key) in zip(free, public_keys)
+            ],
+        )
+        return [address for _, address in free]
+
+    async def _take_new(self, server_id: int, public_keys: List[Tuple[str, Optional[str]]]) -> List[str]:
+        # Блокируем строку пула и сдвигаем границу сразу на нужное число адресов
+        pool = (
+            await self.db.execute(
+                select(ServerIpPool).where(ServerIpPool.server_id == server_id).with_for_update()
+            )
+        ).scalars().first()
+        if pool is None:
+            return []
+        start = pool.next_index
+        taken = max(0, min(len(public_keys), pool.last_index + 1 - start))
+        if taken == 0:
+            return []
+        pool.next_index = start + taken
+        subnet = pool.subnet
+        rows = []
+        now = datetime.utcnow()
+        for offset, (public_key, preshared_key) in enumerate(public_keys[:taken]):
+            index = start + offset
+            rows.append({
+                "server_id": server_id,
+                "host_index": index,
+                "address": address_for_index(subnet, index),
+                "is_allocated": True,
+                "public_key": public_key,
+                "preshared_key": preshared_key,
+                "allocated_at": now,
+            })
+        await self._insert_allocations(rows)
+        return [r["address"] for r in rows]
+
+    async def reserve_many(self, server_id: int, peers: List[Tuple[str, Optional[str]]]) -> List[str]:
+        """Выдаёт адреса пирам (public_key, preshared_key). Адресов может оказаться меньше, если пул исчерпан"""
+        try:
+            addresses = await self._take_free(server_id, peers)
+            if len(addresses) < len(peers):
+                addresses += await self._take_new(server_id, peers[len(addresses):])
+            await self.db.commit()
+            return addresses
+        except Exception:
+            await self.db.rollback()
+            raise
+
+    async def reserve(self, server_id: int, public_key: str, preshared_key: Optional[str] = None) -> Optional[str]:
+        addresses = await self.reserve_many(server_id, [(public_key, preshared_key)])
+        return addresses[0] if addresses else None
+
+    async def release_many(self, server_id: int, public_keys: List[str]) -> List[str]:
+        """Возвращает адреса клиентов в free-list одним UPDATE. Возвращает освобождённые адреса"""
+        if not public_keys:
+            return []
+        result = await self.db.execute(
+            update(IpAllocation)
+            .where(and_(
+                IpAllocation.server_id == server_id,
+                IpAllocation.public_key.in_(public_keys),
+                IpAllocation.is_allocated.is_(True),
+            ))
+            .values(is_allocated=False, public_key=None, preshared_key=None, released_at=datetime.utcnow(), releasing_at=None)
+            .returning(IpAllocation.address)
+        )
+        addresses = list(result.scalars().all())
+        await self.db.commit()
+        return addresses
+
+    async def release(self, server_id: int, public_key: str) -> Optional[str]:
+        """Возвращает адрес клиента в free-list. Возвращает освобождённый адрес или None"""
+        addresses = await self.release_many(server_id, [public_key])
+        return addresses[0] if addresses else None
+
+    async def mark_releasing(self, server_id: int, public_keys: List[str]):
+        """
+        Отмечает адреса, пиры которых сейчас удаляются с сервера. Вызывается до удаления:
+        сверка не поставит такие пиры обратно, пока адрес ещё не освобождён
+        """
+        if not public_keys:
+            return
+        # Ждёт, пока на сервере идёт применение сверки: она перечитывает базу под этой же блокировкой
+        await self.db.execute(text("SELECT pg_advisory_xact_lock_shared(:key, :server_id)"), {"key": PEER_CHANGES_LOCK_KEY, "server_id": server_id})
+        await self.db.execute(
+            update(IpAllocation)
+            .where(and_(
+                IpAllocation.server_id == server_id,
+                IpAllocation.public_key.in_(public_keys),
+                IpAllocation.is_allocated.is_(True),
+            ))
+            .values(releasing_at=datetime.utcnow())
+        )
+        await self.db.commit()
+
+    async def clear_releasing(self, server_id: int, public_keys: List[str]):
+        """Снимает отметку mark_releasing, если удалить пиры с сервера не удалось"""
+        if not public_keys:
+            return
+        await self.db.execute(
+            update(IpAllocation)
+            .where(and_(IpAllocation.server_id == server_id, IpAllocation.public_key.in_(public_keys)))
+            .values(releasing_at=None)
+        )
+        await self.db.commit()
+
+    async def lock_peer_changes(self, server_id: int):
+        """Исключительная блокировка изменений пиров сервера до конца транзакции (см. PEER_CHANGES_LOCK_KEY)"""
+        await self.db.execute(text("SELECT pg_advisory_xact_lock(:key, :server_id)"), {"key": PEER_CHANGES_LOCK_KEY, "server_id": server_id})
+
+    async def get_allocated_peers(self, server_id: int) -> List[Tuple[str, Optional[str], str]]:
+        """Выданные адреса сервера с ключами, кроме удаляемых: (public_key, preshared_key, address)"""
+        result = await self.db.execute(
+            select(IpAllocation.public_key, IpAllocation.preshared_key, IpAllocation.address)
+            .where(and_(
+                IpAllocation.server_id == server_id,
+                IpAllocation.is_allocated.is_(True),
+                IpAllocation.public_key.is_not(None),
+                IpAllocation.releasing_at.is_(None),
+            ))
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def get_unsettled_keys(self, server_id: int, allocated_after: datetime) -> Set[str]:
+        """
+        Ключи, состояние которых на сервере сейчас меняется: пир удаляется (releasing_at)
+        или адрес выдан после allocated_after и установка может быть ещё в пути
+        """
+        result = await self.db.execute(
+            select(IpAllocation.public_key)
+            .where(and_(
+                IpAllocation.server_id == server_id,
+                IpAllocation.is_allocated.is_(True),
+                IpAllocation.public_key.is_not(None),
+                or_(IpAllocation.releasing_at.is_not(None), IpAllocation.allocated_at > allocated_after),
+            ))
+        )
+        return set(result.scalars().all())
+
+    async def get_usage(self, server_id: int) -> Optional[dict]:
+        pool = await self.get_pool(server_id)
+        if not pool:
+            return None
+        allocated = (
+            await self.db.execute(
+                select(func.count())
+                .select_from(IpAllocation)
+                .where(and_(IpAllocation.server_id == server_id, IpAllocation.is_allocated.is_(True)))
+            )
+        ).scalar_one()
+        capacity = pool.last_index - pool.first_index + 1
+        return {
+            "server_id": server_id,
+            "subnet": pool.subnet,
+            "capacity": capacity,
+            "allocated": allocated,
+            "free": capacity - allocated,
+        }
+
+    async def get_usage_all(self) -> Dict[int, dict]:
+        """Заполненность пулов всех серверов одним запросом: server_id -> capacity/allocated/free"""
+        allocated = (
+            select(IpAllocation.server_id, func.count().label("allocated"))
+            .where(IpAllocation.is_allocated.is_(True))
+            .group_by(IpAllocation.server_id)
+            .subquery()
+        )
+        result = await self.db.execute(
+            select(ServerIpPool, func.coalesce(allocated.c.allocated, 0))
+            .outerjoin(allocated, allocated.c.server_id == ServerIpPool.server_id)
+        )
+        usage = {}
+        for pool, allocated_count in result.all():
+            capacity = pool.last_index - pool.first_index + 1
+            usage[pool.server_id] = {"capacity": capacity, "allocated": allocated_count, "free": capacity - allocated_count}
+        return usage
@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user_models import SubscriptionPayment
+
+
+class PaymentRepository:
+    """
+    Журнал оплат subscription_payments. Методы не завершают транзакцию: запись в журнал
+    и продление подписки коммитятся вместе в SubscriptionService.process_payment.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def claim(self, payment_id: str, telegram_id, duration_days: int) -> bool:
+        """
+        Занимает payment_id в журнале. False - оплата уже обработана. Если ту же оплату
+        сейчас обрабатывает другая транзакция, INSERT ждёт её завершения на уникальном индексе.
+        """
+        result = await self.db.execute(
+            insert(SubscriptionPayment.__table__)
+            .values(
+                payment_id=payment_id,
+                telegram_user_id=str(telegram_id),
+                duration_days=duration_days,
+                created_at=datetime.utcnow(),
+            )
+            .on_conflict_do_nothing(index_elements=["payment_id"])
+            .returning(SubscriptionPayment.id)
+        )
+        return result.scalar() is not None
+
+    async def get(self, payment_id: str) -> Optional[SubscriptionPayment]:
+        result = await self.db.execute(select(SubscriptionPayment).where(SubscriptionPayment.payment_id == payment_id))
+        return result.scalars().first()
+
+    async def set_result(self, payment_id: str, result: str, end_date: Optional[datetime]):
+        await self.db.execute(
+            update(SubscriptionPayment)
+            .where(SubscriptionPayment.payment_id == payment_id)
+            .values(result=result, end_date=end_date)
+        )
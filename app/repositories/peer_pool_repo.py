@@ -0,0 +1,101 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.server_models import PooledPeer
+
+
+class PeerPoolRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def claim(self, server_id: int) -> Optional[PooledPeer]:
+        """
+        Забирает один готовый пир сервера. DELETE ... RETURNING по строке, выбранной
+        с SKIP LOCKED, - параллельные запросы никогда не получат один и тот же пир.
+        """
+        candidate = (
+            select(PooledPeer.id)
+            .where(and_(PooledPeer.server_id == server_id, PooledPeer.status == 'available'))
+            .order_by(PooledPeer.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        result = await self.db.execute(
+            delete(PooledPeer).where(PooledPeer.id == candidate).returning(PooledPeer)
+        )
+        peer = result.scalars().first()
+        await self.db.commit()
+        return peer
+
+    async def add_many(self, server_id: int, peers: List[dict]):
+        if not peers:
+            return
+        now = datetime.utcnow()
+        await self.db.execute(
+            insert(PooledPeer).values([
+                {
+                    "server_id": server_id,
+                    "public_key": peer["public_key"],
+                    "address": peer["address"],
+                    "conf": peer["conf"],
+                    "amneziawg_key": peer["amneziawg_key"],
+                    "status": "available",
+                    "created_at": now,
+                }
+                for peer in peers
+            ])
+        )
+        await self.db.commit()
+
+    async def count_available(self) -> Dict[int, int]:
+        """Число готовых пиров по серверам"""
+        result = await self.db.execute(
+            select(PooledPeer.server_id, func.count())
+            .where(PooledPeer.status == 'available')
+            .group_by(PooledPeer.server_id)
+        )
+        return {server_id: count for server_id, count in result.all()}
+
+    async def mark_retiring(self, server_id: int, created_before: datetime, limit: int) -> List[str]:
+        """
+        Снимает с выдачи невостребованные старые пиры (и подбирает ранее снятые, которые не
+        удалось удалить с сервера). Возвращает их публичные ключи.
+        """
+        candidates = (
+            select(PooledPeer.id)
+            .where(and_(
+                PooledPeer.server_id == server_id,
+                or_(
+                    PooledPeer.status == 'retiring',
+                    and_(PooledPeer.status == 'available', PooledPeer.created_at < created_before),
+                ),
+            ))
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.db.execute(
+            update(PooledPeer)
+            .where(PooledPeer.id.in_(candidates))
+            .values(status='retiring')
+            .returning(PooledPeer.public_key)
+        )
+        public_keys = list(result.scalars().all())
+        await self.db.commit()
+        return public_keys
+
+    async def delete_retired(self, server_id: int, public_keys: List[str]):
+        if not public_keys:
+            return
+        await self.db.execute(
+            delete(PooledPeer).where(and_(
+                PooledPeer.server_id == server_id,
+                PooledPeer.status == 'retiring',
+                PooledPeer.public_key.in_(public_keys),
+            ))
+        )
+        await self.db.commit()
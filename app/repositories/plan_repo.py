@@ -0,0 +1,30 @@
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user_models import SubscriptionPlan
+
+
+class SubscriptionPlanRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_active_plans(self) -> List[SubscriptionPlan]:
+        result = await self.db.execute(
+            select(SubscriptionPlan)
+            .where(SubscriptionPlan.is_active.is_(True))
+            .order_by(SubscriptionPlan.duration_days, SubscriptionPlan.id)
+        )
+        return result.scalars().all()
+
+    async def get_plan(self, plan_id: int) -> Optional[SubscriptionPlan]:
+        return await self.db.get(SubscriptionPlan, plan_id)
+
+    async def get_plan_for_duration(self, duration_days: int) -> Optional[SubscriptionPlan]:
+        """Активный план с такой длительностью, иначе - первый активный план"""
+        plans = await self.get_active_plans()
+        for plan in plans:
+            if plan.duration_days == duration_days:
+                return plan
+        return plans[0] if plans else None
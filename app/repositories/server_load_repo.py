@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.server_models import ServerLoad
+
+
+class ServerLoadRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_all(self) -> Dict[int, ServerLoad]:
+        result = await self.db.execute(select(ServerLoad))
+        return {row.server_id: row for row in result.scalars().all()}
+
+    async def save_many(self, rows: List[dict]):
+        """Результаты опроса одним INSERT ... ON CONFLICT: строка на сервер"""
+        if not rows:
+            return
+        now = datetime.utcnow()
+        statement = insert(ServerLoad).values([{**row, "probed_at": now} for row in rows])
+        await self.db.execute(statement.on_conflict_do_update(
+            index_elements=[ServerLoad.server_id],
+            set_={
+                "peers": statement.excluded.peers,
+                "recent_handshakes": statement.excluded.recent_handshakes,
+                "ssh_latency": statement.excluded.ssh_latency,
+                "reachable": statement.excluded.reachable,
+                "overloaded": statement.excluded.overloaded,
+                "probed_at": statement.excluded.probed_at,
+            },
+        ))
+        await self.db.commit()
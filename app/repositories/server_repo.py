@@ -21,6 +21,18 @@ class ServerRepository:
         result = await self.db.execute(select(SSHServerConfig))
         return result.scalars().all()
 
+    async def get_active_servers(self) -> List[SSHServerConfig]:
+        result = await self.db.execute(
+            select(SSHServerConfig).where(SSHServerConfig.is_active.is_(True)).order_by(SSHServerConfig.id)
+        )
+        return result.scalars().all()
+
+    async def get_servers_by_ids(self, server_ids: List[int]) -> List[SSHServerConfig]:
+        if not server_ids:
+            return []
+        result = await self.db.execute(select(SSHServerConfig).where(SSHServerConfig.id.in_(server_ids)))
+        return result.scalars().all()
+
     async def update_server(self, server_id: int, **kwargs) -> Optional[SSHServerConfig]:
         server = await self.get_server_by_id(server_id)
         if not server:
@@ -1,173 +1,448 @@
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Integer, String, and_, bindparam, delete, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user_models import SubscriptionStatus, User, UserSubscription, UserSubscriptionKey
+
+
+def _telegram_id(telegram_id) -> str:
+    # В таблице users Telegram ID хранится строкой
+    return str(telegram_id)
 
-from models.user_models import User, SubscriptionStatus
 
 class UserRepository:
-    def __init__(self, db_session: Session):
-        self.db = db_session
-    
+    """
+    Пользователи и подписки. Массовые операции выполняются одним SQL-выражением:
+    списки передаются массивами и разворачиваются через unnest, поэтому число
+    параметров запроса не зависит от размера пачки.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
     # Create
-    def create_user(self, telegram_id: int, is_promo: bool = False) -> Optional[User]:
+    async def create_user(self, telegram_id, email: str, phone: str) -> Optional[User]:
         try:
-            user = User(
-                telegram_id=telegram_id,
-                is_promo_user=is_promo,
-                subscription_status=SubscriptionStatus.NONE.value
-            )
+            user = User(telegram_user_id=_telegram_id(telegram_id), email=email, phone=phone)
             self.db.add(user)
-            self.db.commit()
-            self.db.refresh(user)
+            await self.db.commit()
+            await self.db.refresh(user)
             return user
         except SQLAlchemyError:
-            self.db.rollback()
+            await self.db.rollback()
             return None
-    
+
+    async def bulk_create_users(self, users: Iterable[Tuple[object, str, str]]) -> Dict[str, int]:
+        """
+        Создаёт пользователей (telegram_id, email, phone) одним INSERT ... SELECT FROM unnest.
+        Уже существующие пропускаются. Возвращает {telegram_user_id: id} созданных.
+        """
+        users = list(users)
+        if not users:
+            return {}
+        rows = (
+            select(
+                func.unnest(bindparam("telegram_ids", type_=ARRAY(String))),
+                func.unnest(bindparam("emails", type_=ARRAY(String))),
+                func.unnest(bindparam("phones", type_=ARRAY(String))),
+            )
+        )
+        # Через таблицу, а не ORM-класс: ORM принял бы параметры за строки bulk insert
+        stmt = (
+            insert(User.__table__)
+            .from_select([User.telegram_user_id, User.email, User.phone], rows)
+            .on_conflict_do_nothing()
+            .returning(User.telegram_user_id, User.id)
+        )
+        try:
+            result = await self.db.execute(stmt, {
+                "telegram_ids": [_telegram_id(telegram_id) for telegram_id, _, _ in users],
+                "emails": [email for _, email, _ in users],
+                "phones": [phone for _, _, phone in users],
+            })
+            created = {telegram_user_id: user_id for telegram_user_id, user_id in result.all()}
+            await self.db.commit()
+            return created
+        except SQLAlchemyError:
+            # Массовые операции не глотают ошибку: вызывающему важно знать, что пачка не прошла
+            await self.db.rollback()
+            raise
+
     # Read
-    def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
-        return self.db.query(User).filter(User.telegram_id == telegram_id).first()
-    
-    def get_all_users(self) -> List[User]:
-        return self.db.query(User).all()
-    
-    def get_active_subscribers(self) -> List[User]:
+    async def get_user_by_telegram_id(self, telegram_id) -> Optional[User]:
+        result = await self.db.execute(select(User).where(User.telegram_user_id == _telegram_id(telegram_id)))
+        return result.scalars().first()
+
+    async def get_user_ids_by_telegram_ids(self, telegram_ids: Iterable) -> Dict[str, int]:
+        telegram_ids = [_telegram_id(telegram_id) for telegram_id in telegram_ids]
+        if not telegram_ids:
+            return {}
+        result = await self.db.execute(
+            select(User.telegram_user_id, User.id).where(User.telegram_user_id.in_(telegram_ids))
+        )
+        return {telegram_user_id: user_id for telegram_user_id, user_id in result.all()}
+
+    async def get_existing_telegram_ids(self, telegram_ids: List[str]) -> set:
+        """Какие из telegram_ids есть в базе - один запрос telegram_user_id = ANY($1)"""
+        if not telegram_ids:
+            return set()
+        result = await self.db.execute(
+            select(User.telegram_user_id)
+            .where(User.telegram_user_id == func.any(bindparam("telegram_ids", type_=ARRAY(String)))),
+            {"telegram_ids": telegram_ids},
+        )
+        return set(result.scalars().all())
+
+    async def get_active_end_dates(self, telegram_ids: List[str]) -> Dict[str, datetime]:
+        """Самая поздняя дата окончания действующих подписок пачки пользователей - один запрос"""
+        if not telegram_ids:
+            return {}
+        result = await self.db.execute(
+            select(User.telegram_user_id, func.max(UserSubscription.end_date))
+            .join(UserSubscription, UserSubscription.user_id == User.id)
+            .where(and_(
+                User.telegram_user_id == func.any(bindparam("telegram_ids", type_=ARRAY(String))),
+                UserSubscription.status == SubscriptionStatus.ACTIVE,
+                UserSubscription.end_date > datetime.utcnow(),
+            ))
+            .group_by(User.telegram_user_id),
+            {"telegram_ids": telegram_ids},
+        )
+        return {telegram_user_id: end_date for telegram_user_id, end_date in result.all()}
+
+    async def get_all_users(self) -> List[User]:
+        result = await self.db.execute(select(User))
+        return result.scalars().all()
+
+    async def get_active_subscription(self, telegram_id) -> Optional[UserSubscription]:
+        """Действующая подписка пользователя с самой поздней датой окончания"""
+        result = await self.db.execute(
+            select(UserSubscription)
+            .join(User, User.id == UserSubscription.user_id)
+            .where(and_(
+                User.telegram_user_id == _telegram_id(telegram_id),
+                UserSubscription.status == SubscriptionStatus.ACTIVE,
+                UserSubscription.end_date > datetime.utcnow(),
+            ))
+            .order_by(UserSubscription.end_date.desc())
+            .limit(1)
+        )
+        return result.scalars().first()
+
+    async def get_latest_subscription(self, user_id: int) -> Optional[UserSubscription]:
+        """Подписка пользователя с самой поздней датой окончания, в любом статусе"""
+        result = await self.db.execute(
+            select(UserSubscription)
+            .where(UserSubscription.user_id == user_id)
+            .order_by(UserSubscription.end_date.desc())
+            .limit(1)
+        )
+        return result.scalars().first()
+
+    async def get_active_keys(self, telegram_id) -> List[Tuple[Optional[int], str, datetime]]:
+        """Ключи действующих подписок пользователя: (server_id, ключ, окончание подписки)"""
+        result = await self.db.execute(
+            select(UserSubscriptionKey.server_id, UserSubscriptionKey.key, UserSubscription.end_date)
+            .join(UserSubscription, UserSubscription.id == UserSubscriptionKey.subscription_id)
+            .join(User, User.id == UserSubscription.user_id)
+            .where(and_(
+                User.telegram_user_id == _telegram_id(telegram_id),
+                UserSubscription.status == SubscriptionStatus.ACTIVE,
+                UserSubscription.end_date > datetime.utcnow(),
+                UserSubscriptionKey.revoked_at.is_(None),
+            ))
+            .order_by(UserSubscriptionKey.id)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def get_subscriptions_ending_before(self, before: datetime, reminder_sent: Optional[bool] = None) -> List[UserSubscription]:
+        conditions = [UserSubscription.status == SubscriptionStatus.ACTIVE, UserSubscription.end_date <= before]
+        if reminder_sent is not None:
+            conditions.append(UserSubscription.reminder_sent.is_(reminder_sent))
+        result = await self.db.execute(select(UserSubscription).where(and_(*conditions)))
+        return result.scalars().all()
+
+    # Update
+    async def bulk_upsert_subscriptions(self, user_ids: Iterable[int], plan_id: int, days: int, commit: bool = True) -> Dict[int, datetime]:
+        """
+        Оформляет подписку на план пачке пользователей одним INSERT ... ON CONFLICT:
+        новым создаёт подписку на days дней, существующую продлевает от
+        max(текущее окончание, сейчас). Возвращает {user_id: новая дата окончания}.
+        С commit=False транзакцию завершает вызывающий.
+        """
+        # Повтор user_id в одной пачке ON CONFLICT DO UPDATE не допускает
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
         now = datetime.utcnow()
-        return (self.db.query(User)
-                .filter(User.subscription_status == SubscriptionStatus.ACTIVE.value)
-                .filter(User.subscription_expiry_date > now)
-                .all())
+        duration = timedelta(days=days)
+        rows = select(
+            func.unnest(bindparam("user_ids", type_=ARRAY(Integer))),
+            bindparam("plan_id", type_=Integer),
+            bindparam("start_date", now),
+            bindparam("end_date", now + duration),
+            bindparam("status", SubscriptionStatus.ACTIVE, type_=UserSubscription.status.type),
+            bindparam("reminder_sent", False),
+        )
+        stmt = insert(UserSubscription.__table__).from_select(
+            [
+                UserSubscription.user_id, UserSubscription.plan_id, UserSubscription.start_date,
+                UserSubscription.end_date, UserSubscription.status, UserSubscription.reminder_sent,
+            ],
+            rows,
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_user_plan",
+            set_={
+                "end_date": func.greatest(UserSubscription.end_date, now) + duration,
+                "status": SubscriptionStatus.ACTIVE,
+                "reminder_sent": False,
+            },
+        ).returning(UserSubscription.user_id, UserSubscription.end_date)
+        try:
+            result = await self.db.execute(stmt, {"user_ids": user_ids, "plan_id": plan_id})
+            end_dates = {user_id: end_date for user_id, end_date in result.all()}
+            if commit:
+                await self.db.commit()
+            return end_dates
+        except SQLAlchemyError:
+            await self.db.rollback()
+            raise
 
-    def get_expired_subscribers(self) -> List[User]:
+    async def extend_latest_subscription(self, user_id: int, days: int, commit: bool = True) -> Optional[Tuple[int, datetime]]:
+        """
+        Продлевает на days дней подписку пользователя с самой поздней датой окончания одним
+        UPDATE ... SET end_date = GREATEST(end_date, сейчас) + interval: параллельные продления
+        складываются на блокировке строки, а не перезаписывают друг друга.
+        Возвращает (id подписки, новая дата окончания) или None, если подписок нет.
+        С commit=False транзакцию завершает вызывающий.
+        """
         now = datetime.utcnow()
-        return (self.db.query(User)
-                .filter(User.subscription_status == SubscriptionStatus.ACTIVE.value)
-                .filter(User.subscription_expiry_date <= now)
-                .all())
-    
-    def get_promo_users(self) -> List[User]:
-        return self.db.query(User).filter(User.is_promo_user == True).all()
-    
-    # Update
-    def set_promo_status(self, telegram_id: int, is_promo: bool) -> Optional[User]:
+        latest = (
+            select(UserSubscription.id)
+            .where(UserSubscription.user_id == user_id)
+            .order_by(UserSubscription.end_date.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(UserSubscription)
+            .where(UserSubscription.id == latest)
+            .values(
+                end_date=func.greatest(UserSubscription.end_date, now) + timedelta(days=days),
+                status=SubscriptionStatus.ACTIVE,
+                reminder_sent=False,
+            )
+            .returning(UserSubscription.id, UserSubscription.end_date)
+        )
         try:
-            user = self.get_user_by_telegram_id(telegram_id)
-            if not user:
-                return None
-                
-            user.is_promo_user = is_promo
-            
-            self.db.commit()
-            self.db.refresh(user)
-            return user
+            extended = (await self.db.execute(stmt)).first()
+            if commit:
+                await self.db.commit()
+            return tuple(extended) if extended else None
         except SQLAlchemyError:
-            self.db.rollback()
-            return None
-    
-    def activate_subscription(
-        self, 
-        telegram_id: int, 
-        expiry_date: datetime,
-        payment_id: Optional[str] = None
-    ) -> Optional[User]:
+            await self.db.rollback()
+            raise
+
+    async def bulk_extend_subscriptions(self, extensions: Dict[int, int]) -> Dict[int, datetime]:
+        """
+        Продлевает подписки {subscription_id: дней} одним UPDATE ... FROM unnest.
+        Истёкшие продлеваются от текущего момента и снова становятся активными.
+        Возвращает {subscription_id: новая дата окончания}.
+        """
+        if not extensions:
+            return {}
+        now = datetime.utcnow()
+        ext = func.unnest(
+            bindparam("ids", type_=ARRAY(Integer)),
+            bindparam("days", type_=ARRAY(Integer)),
+        ).table_valued("id", "days").render_derived(name="ext")
+        stmt = (
+            update(UserSubscription)
+            .where(UserSubscription.id == ext.c.id)
+            .values(
+                end_date=func.greatest(UserSubscription.end_date, now) + func.make_interval(0, 0, 0, ext.c.days),
+                status=SubscriptionStatus.ACTIVE,
+                reminder_sent=False,
+            )
+            .returning(UserSubscription.id, UserSubscription.end_date)
+        )
         try:
-            user = self.get_user_by_telegram_id(telegram_id)
-            if not user:
-                return None
-                
-            user.subscription_status = SubscriptionStatus.ACTIVE.value
-            user.subscription_start_date = datetime.utcnow()
-            user.subscription_expiry_date = expiry_date
-            if payment_id:
-                user.payment_id = payment_id
-            
-            self.db.commit()
-            self.db.refresh(user)
-            return user
+            result = await self.db.execute(stmt, {"ids": list(extensions), "days": list(extensions.values())})
+            end_dates = {subscription_id: end_date for subscription_id, end_date in result.all()}
+            await self.db.commit()
+            return end_dates
         except SQLAlchemyError:
-            self.db.rollback()
-            return None
-    
-    def deactivate_subscription(self, telegram_id: int) -> Optional[User]:
+            await self.db.rollback()
+            raise
+
+    async def bulk_set_status(
+        self,
+        subscription_ids: Iterable[int],
+        status: SubscriptionStatus,
+        from_status: Optional[SubscriptionStatus] = None,
+    ) -> List[int]:
+        """
+        Переводит подписки в status одним UPDATE. from_status - переход только из этого
+        статуса (подписки в другом статусе не трогаются). Возвращает id изменённых.
+        """
+        subscription_ids = list(subscription_ids)
+        if not subscription_ids:
+            return []
+        conditions = [UserSubscription.id == func.any(bindparam("ids", type_=ARRAY(Integer)))]
+        if from_status is not None:
+            conditions.append(UserSubscription.status == from_status)
         try:
-            user = self.get_user_by_telegram_id(telegram_id)
-            if not user:
-                return None
-                
-            user.subscription_status = SubscriptionStatus.EXPIRED.value
-            
-            self.db.commit()
-            self.db.refresh(user)
-            return user
+            result = await self.db.execute(
+                update(UserSubscription).where(and_(*conditions)).values(status=status).returning(UserSubscription.id),
+                {"ids": subscription_ids},
+            )
+            changed = list(result.scalars().all())
+            await self.db.commit()
+            return changed
         except SQLAlchemyError:
-            self.db.rollback()
-            return None
-    
+            await self.db.rollback()
+            raise
+
+    async def expire_due_subscriptions(self, now: Optional[datetime] = None) -> List[int]:
+        """Помечает истёкшими все активные подписки с end_date <= now. Возвращает их id"""
+        try:
+            result = await self.db.execute(
+                update(UserSubscription)
+                .where(and_(
+                    UserSubscription.status == SubscriptionStatus.ACTIVE,
+                    UserSubscription.end_date <= (now or datetime.utcnow()),
+                ))
+                .values(status=SubscriptionStatus.EXPIRED)
+                .returning(UserSubscription.id)
+            )
+            expired = list(result.scalars().all())
+            await self.db.commit()
+            return expired
+        except SQLAlchemyError:
+            await self.db.rollback()
+            raise
+
+    async def expire_due_batch(self, limit: int, now: Optional[datetime] = None) -> List[dict]:
+        """
+        Помечает истёкшими до limit подписок с end_date <= now (в порядке end_date, по индексу
+        ix_user_subscription_end_date). Строки, которые держит другая транзакция, пропускаются.
+        Возвращает истёкшие подписки.
+        """
+        due = (
+            select(UserSubscription.id)
+            .where(and_(
+                UserSubscription.status == SubscriptionStatus.ACTIVE,
+                UserSubscription.end_date <= (now or datetime.utcnow()),
+            ))
+            .order_by(UserSubscription.end_date)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        try:
+            result = await self.db.execute(
+                update(UserSubscription)
+                .where(UserSubscription.id.in_(due))
+                .values(status=SubscriptionStatus.EXPIRED)
+                .returning(UserSubscription.id, UserSubscription.user_id, UserSubscription.plan_id, UserSubscription.end_date)
+            )
+            expired = [
+                {"subscription_id": subscription_id, "user_id": user_id, "plan_id": plan_id, "end_date": end_date}
+                for subscription_id, user_id, plan_id, end_date in result.all()
+            ]
+            await self.db.commit()
+            return expired
+        except SQLAlchemyError:
+            await self.db.rollback()
+            raise
+
+    async def get_keys_to_revoke(self, per_server_limit: int, exclude_servers: Iterable[int] = ()) -> List[Tuple[int, int, str]]:
+        """
+        Ключи истёкших подписок, пиры которых ещё не удалены с серверов: (id, server_id, public_key).
+        Не больше per_server_limit на сервер - сервер с большим хвостом не занимает всю выборку
+        """
+        conditions = [
+            UserSubscription.status == SubscriptionStatus.EXPIRED,
+            UserSubscriptionKey.revoked_at.is_(None),
+            UserSubscriptionKey.server_id.is_not(None),
+            UserSubscriptionKey.public_key.is_not(None),
+        ]
+        exclude_servers = list(exclude_servers)
+        if exclude_servers:
+            conditions.append(UserSubscriptionKey.server_id.not_in(exclude_servers))
+        ranked = (
+            select(
+                UserSubscriptionKey.id,
+                UserSubscriptionKey.server_id,
+                UserSubscriptionKey.public_key,
+                func.row_number().over(partition_by=UserSubscriptionKey.server_id, order_by=UserSubscriptionKey.id).label("rn"),
+            )
+            .join(UserSubscription, UserSubscription.id == UserSubscriptionKey.subscription_id)
+            .where(and_(*conditions))
+            .subquery()
+        )
+        result = await self.db.execute(
+            select(ranked.c.id, ranked.c.server_id, ranked.c.public_key)
+            .where(ranked.c.rn <= per_server_limit)
+            .order_by(ranked.c.server_id, ranked.c.id)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def mark_keys_revoked(self, key_ids: Iterable[int]):
+        key_ids = list(key_ids)
+        if not key_ids:
+            return
+        try:
+            await self.db.execute(
+                update(UserSubscriptionKey)
+                .where(UserSubscriptionKey.id == func.any(bindparam("ids", type_=ARRAY(Integer))))
+                .values(revoked_at=datetime.utcnow()),
+                {"ids": key_ids},
+            )
+            await self.db.commit()
+        except SQLAlchemyError:
+            await self.db.rollback()
+            raise
+
+    async def mark_reminders_sent(self, subscription_ids: Iterable[int]) -> int:
+        subscription_ids = list(subscription_ids)
+        if not subscription_ids:
+            return 0
+        try:
+            result = await self.db.execute(
+                update(UserSubscription)
+                .where(UserSubscription.id == func.any(bindparam("ids", type_=ARRAY(Integer))))
+                .values(reminder_sent=True),
+                {"ids": subscription_ids},
+            )
+            await self.db.commit()
+            return result.rowcount
+        except SQLAlchemyError:
+            await self.db.rollback()
+            raise
+
     # Delete
-    def delete_user(self, telegram_id: int) -> bool:
+    async def delete_user(self, telegram_id) -> bool:
         try:
-            user = self.get_user_by_telegram_id(telegram_id)
-            if not user:
-                return False
-                
-            self.db.delete(user)
-            self.db.commit()
-            return True
+            result = await self.db.execute(delete(User).where(User.telegram_user_id == _telegram_id(telegram_id)))
+            await self.db.commit()
+            return result.rowcount > 0
         except SQLAlchemyError:
-            self.db.rollback()
+            await self.db.rollback()
             return False
-    
+
     # Utility methods
-    def check_subscription_status(self, telegram_id: int) -> SubscriptionStatus:
-        user = self.get_user_by_telegram_id(telegram_id)
+    async def check_subscription_status(self, telegram_id) -> SubscriptionStatus:
+        user = await self.get_user_by_telegram_id(telegram_id)
         if not user:
             return SubscriptionStatus.NONE
-            
-        if user.subscription_status == SubscriptionStatus.ACTIVE.value:
-            if user.subscription_expiry_date and user.subscription_expiry_date <= datetime.utcnow():
-                # Auto-update expired subscriptions
-                user.subscription_status = SubscriptionStatus.EXPIRED.value
-                self.db.commit()
-                return SubscriptionStatus.EXPIRED
-                
+        if await self.get_active_subscription(telegram_id):
             return SubscriptionStatus.ACTIVE
-            
-        return SubscriptionStatus(user.subscription_status)
-    
-    def extend_subscription(
-        self, 
-        telegram_id: int, 
-        days: int,
-        payment_id: Optional[str] = None
-    ) -> Optional[User]:
-        try:
-            user = self.get_user_by_telegram_id(telegram_id)
-            if not user:
-                return None
-            
-            now = datetime.utcnow()
-            
-            # Если подписка активна, продлеваем от текущей даты окончания
-            if user.has_active_subscription:
-                new_expiry = user.subscription_expiry_date
-            else:
-                # Если подписка неактивна, начинаем с текущего момента
-                user.subscription_start_date = now
-                new_expiry = now
-            
-            # Добавляем дни
-            from datetime import timedelta
-            user.subscription_expiry_date = new_expiry + timedelta(days=days)
-            user.subscription_status = SubscriptionStatus.ACTIVE.value
-            
-            if payment_id:
-                user.payment_id = payment_id
-            
-            self.db.commit()
-            self.db.refresh(user)
-            return user
-        except SQLAlchemyError:
-            self.db.rollback()
-            return None
+        has_any = (
+            await self.db.execute(select(UserSubscription.id).where(UserSubscription.user_id == user.id).limit(1))
+        ).first()
+        return SubscriptionStatus.EXPIRED if has_any else SubscriptionStatus.NONE
@@ -1,21 +1,174 @@
-from fastapi import APIRouter, Depends, HTTPException, Path
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.database import get_session
+from database.database import get_session, async_session, pool_stats
+import json
+import os
+import time
 from service.server_service import ServerService
-from schemas.admin import GenerateKeyRequest, GenerateKeyResponse, AddServerRequest, AddServerResponse
+from service.ssh_pool import ssh_pool
+from service.dns_resolver import dns_resolver
+from service.vpn_encoder import vpn_encoder
+from service.keypair_generator import keypair_generator
+from service.peer_pool import peer_pool_replenisher
+from service.ssh_admission import AdmissionRejected, ssh_admission
+from service.peer_install_batcher import peer_install_batcher
+from service.server_load import server_load_monitor
+from service.fleet import FleetReport, fleet_executor
+from service.peer_reconciler import peer_reconciler
+from repositories.plan_repo import SubscriptionPlanRepository
+from service.subscription_expiry import subscription_expiry_sweeper
+from service.price_broadcaster import price_broadcaster
+from service.price_cache import price_cache
+from service.key_bundle_cache import key_bundle_cache
+from service.pg_listener import pg_listener
+from service.payment_processor import payment_processor
+from service.audit_log import audit_log
+from service.audit_partitions import audit_partition_maintainer
+from repositories.audit_repo import AuditLogRepository
+from repositories.peer_pool_repo import PeerPoolRepository
+from schemas.admin import (
+    GenerateKeyRequest, GenerateKeyResponse, AddServerRequest, AddServerResponse,
+    RevokeKeyRequest, RevokeKeyResponse, IpPoolUsageResponse,
+    GenerateKeysRequest, GenerateKeysResponse, GeneratedKey, AuditLogEntry,
+    PlacedKeyResponse, ServerPlacementResponse,
+)
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+# С какого размера партии отдавать результат потоком NDJSON и сколько ключей выпускать за один вызов на сервер
+GENERATE_KEYS_STREAM_THRESHOLD = int(os.getenv("GENERATE_KEYS_STREAM_THRESHOLD", "100"))
+GENERATE_KEYS_CHUNK_SIZE = int(os.getenv("GENERATE_KEYS_CHUNK_SIZE", "200"))
+# Сколько серверов попробовать при выдаче ключа с автоматическим выбором сервера
+PLACEMENT_ATTEMPTS = int(os.getenv("PLACEMENT_ATTEMPTS", "2"))
+
+async def _placement_location(session: AsyncSession, location: Optional[str], plan_id: Optional[int]) -> Optional[str]:
+    if location or plan_id is None:
+        return location
+    plan = await SubscriptionPlanRepository(session).get_plan(plan_id)
+    if not plan:
+        raise HTTPException(status_code=404, detail="Тариф не найден")
+    return plan.location
+
+@router.get("/placement", response_model=ServerPlacementResponse)
+async def placement(
+    location: Optional[str] = Query(None, description="Местоположение сервера"),
+    plan_id: Optional[int] = Query(None, description="Тариф, местоположение которого нужно (вместо location)"),
+    session: AsyncSession = Depends(get_session)
+):
+    # Только выбор сервера, без выдачи ключа; выбор учитывается в оценке до следующего опроса
+    location = await _placement_location(session, location, plan_id)
+    signals = await server_load_monitor.place(location)
+    if signals is None:
+        raise HTTPException(status_code=503, detail="Нет доступного сервера")
+    return ServerPlacementResponse(**signals.to_dict())
+
+@router.post("/placement/generate-key", response_model=PlacedKeyResponse)
+async def generate_placed_key(
+    location: Optional[str] = Query(None, description="Местоположение сервера"),
+    plan_id: Optional[int] = Query(None, description="Тариф, местоположение которого нужно (вместо location)"),
+    session: AsyncSession = Depends(get_session)
+):
+    """Выдаёт ключ на наименее загруженном сервере; при сбое или перегрузке пробует следующий"""
+    location = await _placement_location(session, location, plan_id)
+    service = ServerService(session)
+    tried = []
+    rejected = None
+    for _ in range(PLACEMENT_ATTEMPTS):
+        signals = await server_load_monitor.place(location, exclude=tried)
+        if signals is None:
+            break
+        tried.append(signals.server_id)
+        try:
+            amneziawg_key, conf, public_key = await service.generate_wg_key_for_server(signals.server_id)
+        except AdmissionRejected as e:
+            rejected = e
+            continue
+        if amneziawg_key and conf:
+            return PlacedKeyResponse(amneziawg_key=amneziawg_key, conf=conf, public_key=public_key, server_id=signals.server_id)
+    if rejected is not None:
+        # Все опробованные серверы перегружены - клиенту 429 с Retry-After
+        raise rejected
+    raise HTTPException(status_code=503, detail="Нет доступного сервера")
+
 @router.post("/server/{server_id}/generate-key", response_model=GenerateKeyResponse)
 async def generate_key(
     server_id: int = Path(..., description="ID сервера для генерации ключа"),
     session: AsyncSession = Depends(get_session)
 ):
     service = ServerService(session)
-    amneziawg_key, conf = await service.generate_wg_key_for_server(server_id)
+    amneziawg_key, conf, public_key = await service.generate_wg_key_for_server(server_id)
     if not amneziawg_key or not conf:
-        raise HTTPException(status_code=404, detail="Сервер не найден или не удалось получить ключ")
-    return GenerateKeyResponse(amneziawg_key=amneziawg_key, conf=conf)
+        raise HTTPException(status_code=404, detail="Сервер не найден, отключён или не удалось получить ключ")
+    return GenerateKeyResponse(amneziawg_key=amneziawg_key, conf=conf, public_key=public_key)
+
+GENERATED_KEY_FIELDS = ("amneziawg_key", "conf", "public_key", "address")
+
+async def _stream_generated_keys(server_id: int, count: int):
+    # Своя сессия: зависимость get_session может закрыться раньше, чем допишется поток
+    async with async_session() as session:
+        service = ServerService(session)
+        issued = 0
+        while issued < count:
+            chunk = min(GENERATE_KEYS_CHUNK_SIZE, count - issued)
+            try:
+                peers = await service.generate_wg_keys_for_server(server_id, chunk)
+            except AdmissionRejected as e:
+                # Ответ уже начат, статус 429 не отдать - сообщаем об отказе строкой потока
+                yield json.dumps({"error": "Сервер перегружен", "issued": issued, "retry_after": e.retry_after}, ensure_ascii=False) + "\n"
+                return
+            if not peers:
+                yield json.dumps({"error": "Не удалось выпустить ключи", "issued": issued}, ensure_ascii=False) + "\n"
+                return
+            for peer in peers:
+                yield json.dumps({field: peer[field] for field in GENERATED_KEY_FIELDS}) + "\n"
+            issued += len(peers)
+            if len(peers) < chunk:
+                yield json.dumps({"error": "Пул адресов сервера исчерпан", "issued": issued}, ensure_ascii=False) + "\n"
+                return
+
+@router.post("/server/{server_id}/generate-keys", response_model=GenerateKeysResponse)
+async def generate_keys(
+    request: GenerateKeysRequest,
+    server_id: int = Path(..., description="ID сервера для генерации ключей"),
+    session: AsyncSession = Depends(get_session)
+):
+    stream = request.stream if request.stream is not None else request.count >= GENERATE_KEYS_STREAM_THRESHOLD
+    if stream:
+        # Большие партии выпускаются частями и отдаются построчно по мере готовности
+        return StreamingResponse(_stream_generated_keys(server_id, request.count), media_type="application/x-ndjson")
+    service = ServerService(session)
+    peers = await service.generate_wg_keys_for_server(server_id, request.count)
+    if peers is None:
+        raise HTTPException(status_code=404, detail="Сервер не найден или отключён")
+    if not peers:
+        raise HTTPException(status_code=500, detail="Не удалось выпустить ключи")
+    return GenerateKeysResponse(keys=[GeneratedKey(**{field: peer[field] for field in GENERATED_KEY_FIELDS}) for peer in peers])
+
+@router.post("/server/{server_id}/revoke-key", response_model=RevokeKeyResponse)
+async def revoke_key(
+    request: RevokeKeyRequest,
+    server_id: int = Path(..., description="ID сервера, на котором выдан ключ"),
+    session: AsyncSession = Depends(get_session)
+):
+    service = ServerService(session)
+    released_ip = await service.revoke_peer(server_id, request.public_key)
+    if not released_ip:
+        raise HTTPException(status_code=404, detail="Ключ не найден среди выданных на сервере")
+    return RevokeKeyResponse(released_ip=released_ip)
+
+@router.get("/server/{server_id}/ip-pool", response_model=IpPoolUsageResponse)
+async def ip_pool_usage(
+    server_id: int = Path(..., description="ID сервера"),
+    session: AsyncSession = Depends(get_session)
+):
+    service = ServerService(session)
+    usage = await service.get_ip_pool_usage(server_id)
+    if not usage:
+        raise HTTPException(status_code=404, detail="Пул адресов сервера ещё не создан")
+    return IpPoolUsageResponse(**usage)
 
 @router.post("/server/add", response_model=AddServerResponse)
 async def add_server(
@@ -27,3 +180,148 @@ async def add_server(
     if not server:
         raise HTTPException(status_code=500, detail="Не удалось добавить сервер")
     return AddServerResponse(id=server.id, server_public_key=server.server_public_key)
+
+@router.get("/ssh-pool/stats")
+async def ssh_pool_stats():
+    # Статистика пула SSH-соединений текущего воркера
+    return ssh_pool.stats()
+
+@router.get("/subscription-expiry/stats")
+async def subscription_expiry_stats():
+    # Счётчики истечения подписок текущего воркера
+    return subscription_expiry_sweeper.stats()
+
+@router.get("/price-broadcaster/stats")
+async def price_broadcaster_stats():
+    # Подписчики потока цен и их отставание в текущем воркере
+    return price_broadcaster.stats()
+
+@router.get("/price-cache/stats")
+async def price_cache_stats():
+    # Попадания и перезагрузки кэша цен текущего воркера
+    return price_cache.stats()
+
+@router.get("/key-bundle-cache/stats")
+async def key_bundle_cache_stats():
+    # Попадания и сбросы кэша наборов ключей GetConfigurationKeys текущего воркера
+    return key_bundle_cache.stats()
+
+@router.get("/audit-logs", response_model=List[AuditLogEntry])
+async def audit_logs(
+    entity_type: Optional[str] = Query(None, description="Тип сущности"),
+    entity_id: Optional[int] = Query(None, description="ID сущности"),
+    action: Optional[str] = Query(None, description="Действие"),
+    since: Optional[datetime] = Query(None, description="Начало окна (UTC), по умолчанию - 30 дней до until"),
+    until: Optional[datetime] = Query(None, description="Конец окна (UTC, не включая), по умолчанию - сейчас"),
+    limit: int = Query(100, ge=1, le=1000, description="Сколько записей вернуть"),
+    session: AsyncSession = Depends(get_session)
+):
+    # Окно по времени обязательно попадает в запрос - читаются только его месячные секции
+    return await AuditLogRepository(session).query(entity_type, entity_id, action, since, until, limit)
+
+@router.get("/audit-partitions/stats")
+async def audit_partitions_stats():
+    # Секции audit_logs и результаты последнего обслуживания (в воркере, который его выполнял)
+    return audit_partition_maintainer.stats()
+
+@router.get("/audit-log/stats")
+async def audit_log_stats():
+    # Очередь и пачки фоновой записи аудита текущего воркера
+    return audit_log.stats()
+
+@router.get("/payments/stats")
+async def payments_stats():
+    # Обработанные и схлопнутые повторы оплат текущего воркера
+    return payment_processor.stats()
+
+@router.get("/pg-listener/stats")
+async def pg_listener_stats():
+    # Соединение LISTEN текущего воркера и число полученных NOTIFY
+    return pg_listener.stats()
+
+@router.get("/db-pool/stats")
+async def db_pool_stats():
+    # Состояние пула соединений с БД текущего воркера
+    return pool_stats()
+
+@router.get("/dns-cache/stats")
+async def dns_cache_stats():
+    # Статистика кэша DNS-резолвера текущего воркера
+    return dns_resolver.stats()
+
+@router.get("/vpn-encoder/stats")
+async def vpn_encoder_stats():
+    # Кодирование vpn://-ключей и генерация ключей WireGuard текущего воркера
+    return {**vpn_encoder.stats(), "keygen": keypair_generator.stats()}
+
+@router.get("/ssh-admission/stats")
+async def ssh_admission_stats():
+    # Очереди и отказы допуска к серверам, склейка установок пиров текущего воркера
+    return {"admission": ssh_admission.stats(), "install_batcher": peer_install_batcher.stats()}
+
+async def _stream_fleet_health(concurrency: Optional[int], timeout: Optional[float]):
+    servers = await fleet_executor.active_servers()
+    # Сессия ServerService для проверки не нужна: show_peers обращается только к SSH
+    service = ServerService(None)
+
+    async def check(server):
+        peers = await service.show_peers(server)
+        if peers is None:
+            raise RuntimeError("SSH-команда не выполнена")
+        return {"peers": len(peers)}
+
+    results = []
+    started = time.monotonic()
+    async for result in fleet_executor.stream(servers, check, concurrency=concurrency, timeout=timeout):
+        results.append(result)
+        yield json.dumps(result.to_dict(), ensure_ascii=False) + "\n"
+    yield json.dumps({"summary": FleetReport(results, time.monotonic() - started).summary()}) + "\n"
+
+@router.get("/fleet/health")
+async def fleet_health(
+    concurrency: Optional[int] = Query(None, ge=1, description="Сколько серверов проверять одновременно"),
+    timeout: Optional[float] = Query(None, gt=0, description="Тайм-аут одного сервера, секунд"),
+):
+    # Проверка всех активных серверов; строки NDJSON по мере ответа серверов, последней - сводка
+    return StreamingResponse(_stream_fleet_health(concurrency, timeout), media_type="application/x-ndjson")
+
+@router.get("/fleet/stats")
+async def fleet_stats():
+    return fleet_executor.stats()
+
+@router.post("/server/{server_id}/reconcile")
+async def reconcile_server(
+    server_id: int = Path(..., description="ID сервера"),
+    dry_run: bool = Query(True, description="Только показать расхождение, не меняя сервер"),
+    force: bool = Query(False, description="Применить, даже если удалить нужно большую часть пиров"),
+    session: AsyncSession = Depends(get_session),
+):
+    # Сверка пиров интерфейса с выданными адресами сервера
+    server = await ServerService(session).repo.get_server_by_id(server_id)
+    if not server:
+        raise HTTPException(status_code=404, detail="Сервер не найден")
+    try:
+        return await peer_reconciler.reconcile_server(server, dry_run=dry_run, force=force)
+    except RuntimeError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+@router.post("/reconcile")
+async def reconcile_all(dry_run: bool = Query(True, description="Только показать расхождения, не меняя серверы")):
+    # Сверка всех активных серверов; перегруженные и недоступные попадают в failed
+    report = await peer_reconciler.reconcile_all(dry_run=dry_run)
+    return {"summary": report.summary(), "servers": [result.to_dict() for result in report.results]}
+
+@router.get("/peer-reconciler/stats")
+async def peer_reconciler_stats():
+    return peer_reconciler.stats()
+
+@router.get("/server-load/stats")
+async def server_load_stats():
+    # Снимок нагрузки серверов текущего воркера, от наименее загруженного
+    return server_load_monitor.stats()
+
+@router.get("/peer-pool/stats")
+async def peer_pool_stats(session: AsyncSession = Depends(get_session)):
+    # Число готовых пиров по серверам (из базы) и счётчики пополнения текущего воркера
+    available = await PeerPoolRepository(session).count_available()
+    return {"available": available, "replenisher": peer_pool_replenisher.stats()}
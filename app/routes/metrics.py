@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+
+from service.metrics import METRICS_CONTENT_TYPE, render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    # Метрики всех воркеров uvicorn при заданном PROMETHEUS_MULTIPROC_DIR
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from service.price_cache import price_cache
+
+router = APIRouter(prefix="/prices", tags=["prices"])
+
+@router.get("")
+async def get_prices():
+    # Тот же список, что GetPrices в gRPC: готовый JSON из кэша, без запроса к базе
+    entry = await price_cache.get()
+    return Response(content=entry.json, media_type="application/json", headers={"ETag": f'"{entry.version}"'})
@@ -1,5 +1,10 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
+import os
+
+# Максимум ключей за один запрос пакетной генерации
+MAX_KEYS_PER_REQUEST = int(os.getenv("GENERATE_KEYS_MAX_COUNT", "1000"))
 
 class GenerateKeyRequest(BaseModel):
     server_id: int = Field(..., description="ID сервера для генерации ключа")
@@ -7,6 +12,45 @@ class GenerateKeyRequest(BaseModel):
 class GenerateKeyResponse(BaseModel):
     amneziawg_key: str = Field(..., description="AmneziaWG-ключ (vpn://)")
     conf: str = Field(..., description="WireGuard .conf файл клиента")
+    public_key: Optional[str] = Field(None, description="Публичный ключ клиента (нужен для отзыва)")
+
+class PlacedKeyResponse(GenerateKeyResponse):
+    server_id: int = Field(..., description="ID сервера, выбранного под ключ")
+
+class ServerPlacementResponse(BaseModel):
+    server_id: int = Field(..., description="ID наименее загруженного сервера")
+    location: Optional[str] = Field(None, description="Местоположение сервера")
+    peers: int = Field(..., description="Пиров на интерфейсе")
+    recent_handshakes: int = Field(..., description="Активных клиентов (недавний handshake)")
+    free_ips: Optional[int] = Field(None, description="Свободных адресов в пуле (None - пул ещё не создан)")
+    ssh_latency_ms: Optional[float] = Field(None, description="Задержка SSH при последнем опросе")
+    score: float = Field(..., description="Оценка нагрузки (меньше - свободнее)")
+
+class GenerateKeysRequest(BaseModel):
+    count: int = Field(..., ge=1, le=MAX_KEYS_PER_REQUEST, description="Сколько ключей выпустить")
+    stream: Optional[bool] = Field(None, description="Отдавать результат потоком NDJSON (по умолчанию - для больших партий)")
+
+class GeneratedKey(BaseModel):
+    amneziawg_key: str = Field(..., description="AmneziaWG-ключ (vpn://)")
+    conf: str = Field(..., description="WireGuard .conf файл клиента")
+    public_key: str = Field(..., description="Публичный ключ клиента (нужен для отзыва)")
+    address: str = Field(..., description="Адрес клиента в подсети сервера")
+
+class GenerateKeysResponse(BaseModel):
+    keys: List[GeneratedKey] = Field(..., description="Выпущенные ключи")
+
+class RevokeKeyRequest(BaseModel):
+    public_key: str = Field(..., description="Публичный ключ клиента, выданный при генерации")
+
+class RevokeKeyResponse(BaseModel):
+    released_ip: str = Field(..., description="Освобождённый адрес клиента")
+
+class IpPoolUsageResponse(BaseModel):
+    server_id: int = Field(..., description="ID сервера")
+    subnet: str = Field(..., description="Подсеть клиентов")
+    capacity: int = Field(..., description="Всего адресов в пуле")
+    allocated: int = Field(..., description="Выдано адресов")
+    free: int = Field(..., description="Свободно адресов")
 
 class AddServerRequest(BaseModel):
     host: str = Field(..., description="IP-адрес или доменное имя сервера")
@@ -16,8 +60,20 @@ class AddServerRequest(BaseModel):
     password: Optional[str] = Field(None, description="Пароль для SSH (если используется)")
     key_path: Optional[str] = Field(None, description="Путь к приватному ключу (если используется)")
     wg_config_file: Optional[str] = Field(None, description="Путь к конфигу WireGuard на сервере")
+    location: Optional[str] = Field(None, description="Местоположение сервера (как location тарифа)")
     # endpoint не указывается пользователем, вычисляется автоматически
 
 class AddServerResponse(BaseModel):
     id: int = Field(..., description="ID добавленного сервера")
     server_public_key: Optional[str] = Field(None, description="Публичный ключ WireGuard сервера")
+
+class AuditLogEntry(BaseModel):
+    id: int = Field(..., description="ID записи аудита")
+    entity_type: str = Field(..., description="Тип сущности: 'subscription' или 'key'")
+    entity_id: int = Field(..., description="ID сущности")
+    action: str = Field(..., description="Действие")
+    timestamp: datetime = Field(..., description="Время действия (UTC)")
+    details: Optional[str] = Field(None, description="Детали изменения (JSON)")
+
+    class Config:
+        from_attributes = True
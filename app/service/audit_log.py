@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from database.database import async_session
+from repositories.audit_repo import AuditLogRepository, AuditRow
+
+logger = logging.getLogger(__name__)
+
+# Событий в очереди на запись; при переполнении record() ждёт место (обратное давление)
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+# Пачка пишется, когда набралось AUDIT_FLUSH_BATCH событий или прошло AUDIT_FLUSH_INTERVAL_MS
+AUDIT_FLUSH_BATCH = int(os.getenv("AUDIT_FLUSH_BATCH", "500"))
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "200"))
+AUDIT_FLUSH_RETRIES = int(os.getenv("AUDIT_FLUSH_RETRIES", "3"))
+AUDIT_RETRY_DELAY = float(os.getenv("AUDIT_RETRY_DELAY", "1"))
+# Сколько секунд при остановке ждём, пока очередь допишется в базу
+AUDIT_DRAIN_TIMEOUT = float(os.getenv("AUDIT_DRAIN_TIMEOUT", "10"))
+# Критичные действия "entity_type:action" через запятую ("*" - все): record() возвращается
+# только после записи пачки с событием в базу. Остальные пишутся в фоне
+AUDIT_SYNC_ACTIONS = os.getenv("AUDIT_SYNC_ACTIONS", "subscription:payment,key:revoke")
+
+# Событие для record_many: (entity_type, entity_id, action, details)
+AuditEvent = Tuple[str, int, str, object]
+
+
+def _parse_sync_actions(value: str) -> set:
+    return {item.strip() for item in value.split(",") if item.strip()}
+
+
+def _details(details) -> Optional[str]:
+    if details is None or isinstance(details, str):
+        return details
+    return json.dumps(details, ensure_ascii=False, default=str)
+
+
+class _QueuedEvent:
+    __slots__ = ("row", "future")
+
+    def __init__(self, row: AuditRow, future: Optional[asyncio.Future]):
+        self.row = row
+        # Есть только у критичных событий: вызывающий ждёт записи
+        self.future = future
+
+
+class AuditLogWriter:
+    """
+    Запись AuditLog вне транзакций запросов: события копятся в ограниченной очереди,
+    фоновая задача пишет их пачками одним INSERT ... SELECT FROM unnest. Критичные
+    действия (AUDIT_SYNC_ACTIONS) ждут записи своей пачки - пачка при этом уходит сразу,
+    не дожидаясь интервала. При остановке очередь дописывается.
+    """
+
+    def __init__(self, sync_actions: str = AUDIT_SYNC_ACTIONS):
+        self.sync_actions = _parse_sync_actions(sync_actions)
+        self._queue: "asyncio.Queue[_QueuedEvent]" = asyncio.Queue(maxsize=AUDIT_QUEUE_SIZE)
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.queue_full_waits = 0
+        self.max_batch = 0
+        self.last_flush_ms: Optional[float] = None
+
+    def is_sync(self, entity_type: str, action: str) -> bool:
+        return "*" in self.sync_actions or f"{entity_type}:{action}" in self.sync_actions
+
+    async def record(self, entity_type: str, entity_id: int, action: str, details=None, sync: Optional[bool] = None) -> bool:
+        """
+        Ставит событие в очередь. sync=None - по AUDIT_SYNC_ACTIONS. Для синхронных
+        возвращает, записано ли событие; для фоновых - True сразу после постановки в очередь.
+        """
+        return await self.record_many([(entity_type, entity_id, action, details)], sync)
+
+    async def record_many(self, events: Iterable[AuditEvent], sync: Optional[bool] = None) -> bool:
+        loop = asyncio.get_running_loop()
+        queued = []
+        now = datetime.utcnow()
+        for entity_type, entity_id, action, details in events:
+            wait = self.is_sync(entity_type, action) if sync is None else sync
+            row = (entity_type, entity_id, action, now, _details(details))
+            queued.append(_QueuedEvent(row, loop.create_future() if wait else None))
+        if not queued:
+            return True
+        if self._task is None:
+            # Фоновая запись не запущена (отдельный скрипт, остановка приложения) - пишем сразу
+            return await self._flush(queued)
+        for event in queued:
+            if self._queue.full():
+                self.queue_full_waits += 1
+            await self._queue.put(event)
+            self.enqueued += 1
+        futures = [event.future for event in queued if event.future is not None]
+        if not futures:
+            return True
+        return all(await asyncio.gather(*futures))
+
+    async def _write(self, rows: List[AuditRow]):
+        async with async_session() as session:
+            await AuditLogRepository(session).bulk_insert(rows)
+
+    async def _flush(self, batch: List[_QueuedEvent]) -> bool:
+        started = time.monotonic()
+        rows = [event.row for event in batch]
+        ok = False
+        for attempt in range(1, AUDIT_FLUSH_RETRIES + 1):
+            try:
+                await self._write(rows)
+                ok = True
+                break
+            except Exception as e:
+                logger.error(f"Ошибка записи аудита ({len(rows)} событий), попытка {attempt}/{AUDIT_FLUSH_RETRIES}: {e}")
+                if attempt < AUDIT_FLUSH_RETRIES:
+                    await asyncio.sleep(AUDIT_RETRY_DELAY * attempt)
+        if ok:
+            self.written += len(rows)
+        else:
+            self.failed += len(rows)
+        self.flushes += 1
+        self.max_batch = max(self.max_batch, len(rows))
+        self.last_flush_ms = round((time.monotonic() - started) * 1000, 3)
+        for event in batch:
+            if event.future is not None and not event.future.done():
+                event.future.set_result(ok)
+        return ok
+
+    async def _collect(self) -> List[_QueuedEvent]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + AUDIT_FLUSH_INTERVAL_MS / 1000
+        has_sync = batch[0].future is not None
+        while len(batch) < AUDIT_FLUSH_BATCH:
+            try:
+                event = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                # Всё накопившееся забрали: критичное событие не ждёт конца интервала
+                timeout = deadline - loop.time()
+                if has_sync or timeout <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(event)
+            has_sync = has_sync or event.future is not None
+        return batch
+
+    async def _loop(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), AUDIT_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"Очередь аудита не дописана за {AUDIT_DRAIN_TIMEOUT} с, потеряно событий: {self._queue.qsize()}")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "queued": self._queue.qsize(),
+            "queue_size": AUDIT_QUEUE_SIZE,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "max_batch": self.max_batch,
+            "last_flush_ms": self.last_flush_ms,
+            "queue_full_waits": self.queue_full_waits,
+            "sync_actions": sorted(self.sync_actions),
+        }
+
+
+audit_log = AuditLogWriter()
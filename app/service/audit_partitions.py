@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from database.database import engine
+
+logger = logging.getLogger(__name__)
+
+AUDIT_PARTITION_MAINTENANCE_ENABLED = os.getenv("AUDIT_PARTITION_MAINTENANCE_ENABLED", "1").lower() in ("1", "true", "yes")
+AUDIT_PARTITION_INTERVAL = float(os.getenv("AUDIT_PARTITION_INTERVAL", "3600"))
+# На сколько месяцев вперёд держать готовые секции
+AUDIT_PARTITIONS_AHEAD = int(os.getenv("AUDIT_PARTITIONS_AHEAD", "2"))
+# Сколько месяцев (не считая текущего) хранить аудит; 0 - не удалять
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))
+# Ключ advisory-блокировки Postgres: секциями занимается только один воркер одновременно
+AUDIT_PARTITION_LOCK_KEY = 7301003
+
+AUDIT_TABLE = "audit_logs"
+AUDIT_DEFAULT_PARTITION = "audit_logs_default"
+PARTITION_NAME = re.compile(r"^audit_logs_p(\d{4})(\d{2})$")
+
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"audit_logs_p{month.year:04d}{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[datetime]:
+    match = PARTITION_NAME.match(name)
+    return datetime(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+class AuditPartitionMaintainer:
+    """
+    Обслуживание месячных секций audit_logs: заранее создаёт секции на
+    AUDIT_PARTITIONS_AHEAD месяцев вперёд, переносит в свои секции строки, попавшие
+    в audit_logs_default, и удаляет секции старше AUDIT_RETENTION_MONTHS целиком,
+    без DELETE по строкам.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.skipped_runs = 0
+        self.created_total = 0
+        self.dropped_total = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_seconds: Optional[float] = None
+        self.partitions: List[str] = []
+
+    async def _existing_partitions(self, conn) -> List[str]:
+        result = await conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+        ), {"table": AUDIT_TABLE})
+        return list(result.scalars().all())
+
+    async def _default_months(self, conn) -> List[datetime]:
+        # Обычно пусто: строки сюда попадают только до создания своей секции
+        result = await conn.execute(text(
+            f"SELECT DISTINCT date_trunc('month', timestamp) FROM {AUDIT_DEFAULT_PARTITION}"
+        ))
+        return [month_start(month) for month in result.scalars().all()]
+
+    async def _create_partition(self, month: datetime):
+        name = partition_name(month)
+        start, end = month.strftime("%Y-%m-%d"), add_months(month, 1).strftime("%Y-%m-%d")
+        # Секция создаётся отдельной таблицей и присоединяется после переноса её строк из
+        # audit_logs_default: иначе ATTACH/PARTITION OF отказался бы из-за этих строк
+        async with engine.begin() as conn:
+            await conn.execute(text(f"CREATE TABLE {name} (LIKE {AUDIT_TABLE} INCLUDING DEFAULTS)"))
+            await conn.execute(text(
+                f"WITH moved AS (DELETE FROM {AUDIT_DEFAULT_PARTITION} WHERE timestamp >= '{start}' AND timestamp < '{end}' RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ))
+            await conn.execute(text(f"ALTER TABLE {AUDIT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"))
+        self.created_total += 1
+        logger.info(f"Создана секция аудита {name}")
+
+    async def _drop_partition(self, name: str):
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {AUDIT_TABLE} DETACH PARTITION {name}"))
+            await conn.execute(text(f"DROP TABLE {name}"))
+        self.dropped_total += 1
+        logger.info(f"Удалена секция аудита {name} (старше {AUDIT_RETENTION_MONTHS} мес.)")
+
+    async def _maintain(self):
+        current = month_start(datetime.utcnow())
+        oldest = add_months(current, -AUDIT_RETENTION_MONTHS) if AUDIT_RETENTION_MONTHS > 0 else None
+        async with engine.connect() as conn:
+            existing = set(await self._existing_partitions(conn))
+            months = {add_months(current, i) for i in range(AUDIT_PARTITIONS_AHEAD + 1)}
+            months |= set(await self._default_months(conn))
+        for month in sorted(months):
+            if oldest is not None and month < oldest:
+                continue
+            if partition_name(month) not in existing:
+                await self._create_partition(month)
+        if oldest is not None:
+            for name in sorted(existing):
+                month = partition_month(name)
+                if month is not None and month < oldest:
+                    await self._drop_partition(name)
+            async with engine.begin() as conn:
+                await conn.execute(text(f"DELETE FROM {AUDIT_DEFAULT_PARTITION} WHERE timestamp < :oldest"), {"oldest": oldest})
+        async with engine.connect() as conn:
+            self.partitions = await self._existing_partitions(conn)
+
+    async def run_once(self) -> bool:
+        started = time.monotonic()
+        async with engine.connect() as lock_conn:
+            locked = (await lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": AUDIT_PARTITION_LOCK_KEY})).scalar()
+            if not locked:
+                # Секциями уже занимается другой воркер
+                self.skipped_runs += 1
+                return False
+            try:
+                await self._maintain()
+            finally:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": AUDIT_PARTITION_LOCK_KEY})
+        self.runs += 1
+        self.last_run_at = time.time()
+        self.last_run_seconds = round(time.monotonic() - started, 3)
+        return True
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception(f"Ошибка обслуживания секций аудита: {e}")
+            await asyncio.sleep(AUDIT_PARTITION_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "created_total": self.created_total,
+            "dropped_total": self.dropped_total,
+            "partitions": self.partitions,
+            "retention_months": AUDIT_RETENTION_MONTHS,
+            "last_run_at": self.last_run_at,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+
+audit_partition_maintainer = AuditPartitionMaintainer()
@@ -0,0 +1,87 @@
+import json
+import logging
+import re
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+AWG_CONTAINER = "amnezia-awg"
+DEFAULT_WG_CONFIG_FILE = "/opt/amnezia/awg/wg0.conf"
+
+# Параметры обфускации AmneziaWG из секции [Interface] серверного конфига
+AWG_PARAM_NAMES = ("Jc", "Jmin", "Jmax", "S1", "S2", "H1", "H2", "H3", "H4")
+# Значения по умолчанию, если сервер их не отдал
+DEFAULT_AWG_PARAMS = {
+    "Jc": "2", "Jmin": "10", "Jmax": "50",
+    "S1": "91", "S2": "149",
+    "H1": "96800746", "H2": "55774911", "H3": "440992545", "H4": "1000889014",
+}
+
+# Скрипт выполняется внутри контейнера одним вызовом `sh -s`, текст подаётся через stdin,
+# поэтому экранировать кавычки для ssh/docker не нужно. На выходе - одна строка JSON
+# с параметрами интерфейса. Ключи клиента генерируются в приложении (service.wg_keys).
+PROVISION_SCRIPT = """
+set -e
+conf="{wg_config_file}"
+port=$(sed -n 's/^ListenPort[[:space:]]*=[[:space:]]*\\([0-9]*\\).*/\\1/p' "$conf" | head -n 1)
+awg=$(awk -F '[[:space:]]*=[[:space:]]*' '/^\\[Peer\\]/ {{exit}} /^(Jc|Jmin|Jmax|S1|S2|H1|H2|H3|H4)[[:space:]]*=/ {{printf "%s\\"%s\\":\\"%s\\"", sep, $1, $2; sep=","}}' "$conf")
+printf '{{"listen_port":"%s","awg":{{%s}}}}\\n' "$port" "$awg"
+"""
+
+
+def build_provision_command(wg_config_file: Optional[str] = None) -> tuple:
+    """Возвращает (команда, stdin) для однократного вызова провижининга на сервере"""
+    command = f"docker exec -i {AWG_CONTAINER} sh -s"
+    script = PROVISION_SCRIPT.format(wg_config_file=wg_config_file or DEFAULT_WG_CONFIG_FILE)
+    return command, script
+
+
+def parse_provision_output(output: Optional[str]) -> Optional[dict]:
+    """Разбирает JSON-ответ скрипта. None - если сервер не поддерживает пакетный режим"""
+    if not output:
+        return None
+    try:
+        data = json.loads(output.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        logger.warning(f"Ответ провижининга не является JSON: {output!r}")
+        return None
+    if not isinstance(data, dict) or not data.get("listen_port"):
+        logger.warning(f"Ответ провижининга неполный: {data!r}")
+        return None
+    return {"listen_port": data["listen_port"], "awg": {**DEFAULT_AWG_PARAMS, **(data.get("awg") or {})}}
+
+
+def parse_interface_params(conf_text: Optional[str]) -> dict:
+    """Достаёт ListenPort и параметры обфускации AWG из текста wg0.conf"""
+    params = {"listen_port": None, "awg": dict(DEFAULT_AWG_PARAMS)}
+    if not conf_text:
+        return params
+    # Интересует только секция [Interface], она идёт до первого [Peer]
+    interface = conf_text.split("[Peer]", 1)[0]
+    m = re.search(r"^ListenPort\s*=\s*(\d+)", interface, re.MULTILINE)
+    if m:
+        params["listen_port"] = m.group(1).strip()
+    for name in AWG_PARAM_NAMES:
+        m = re.search(rf"^{name}\s*=\s*(\S+)", interface, re.MULTILINE)
+        if m:
+            params["awg"][name] = m.group(1).strip()
+    return params
+
+
+def parse_peers(conf_text: Optional[str]) -> list:
+    """Список пиров из wg0.conf в виде (AllowedIPs, PublicKey)"""
+    peers = []
+    if not conf_text:
+        return peers
+    for block in conf_text.split("[Peer]")[1:]:
+        public_key = re.search(r"^PublicKey\s*=\s*(\S+)", block, re.MULTILINE)
+        allowed_ips = re.search(r"^AllowedIPs\s*=\s*(.+)$", block, re.MULTILINE)
+        if not allowed_ips:
+            continue
+        for address in allowed_ips.group(1).split(","):
+            peers.append((address.strip(), public_key.group(1) if public_key else None))
+    return peers
+
+
+def format_awg_params(awg: dict) -> str:
+    return "\n".join(f"{name} = {awg[name]}" for name in AWG_PARAM_NAMES if name in awg)
@@ -3,7 +3,10 @@ import zlib
 import base64
 import re
 import ipaddress
-import socket
+
+from service.dns_resolver import dns_resolver
+
+ENDPOINT_PATTERN = r'^(.*Endpoint\s*=\s*)([^\s:]+)(?::(\d+))(.*)$'
 
 def qCompress(data, level=-1):
     compressed = zlib.compress(data, level)
@@ -21,14 +24,13 @@ def is_ip_address(address):
     except ValueError:
         return False
 
-def resolve_dns_to_ip(dns_name):
-    try:
-        ip_address = socket.gethostbyname(dns_name)
-        return ip_address
-    except socket.gaierror:
-        return None
+def endpoint_hosts(data):
+    hosts = re.findall(ENDPOINT_PATTERN, data, flags=re.MULTILINE)
+    return {address for _, address, _, _ in hosts if not is_ip_address(address)}
 
-def process_conf_data(data):
+def process_conf_data(data, resolved):
+    # resolved - заранее разрешённые имена {имя: адрес} (dns_resolver.resolve_many); сам DNS здесь
+    # не запрашивается, чтобы не блокировать event loop
     def replace_endpoint(match):
         full_line = match.group(0)
         prefix = match.group(1)
@@ -36,20 +38,24 @@ def process_conf_data(data):
         port = match.group(3)
         suffix = match.group(4)
         if not is_ip_address(address):
-            resolved_ip = resolve_dns_to_ip(address)
+            resolved_ip = resolved.get(address)
             if resolved_ip:
                 return f"{prefix}{resolved_ip}:{port}{suffix}"
             else:
                 raise ValueError(f"Could not resolve DNS name '{address}'")
         else:
             return full_line
-    pattern = r'^(.*Endpoint\s*=\s*)([^\s:]+)(?::(\d+))(.*)$'
-    return re.sub(pattern, replace_endpoint, data, flags=re.MULTILINE)
+    return re.sub(ENDPOINT_PATTERN, replace_endpoint, data, flags=re.MULTILINE)
 
-def encode_vpn_conf(conf_text: str) -> str:
-    processed_data = process_conf_data(conf_text)
+def pack_vpn_conf(processed_data: str) -> str:
     data_bytes = processed_data.encode('utf-8')
     compressed = qCompress(data_bytes, level=8)
     base64_encoded = base64url_encode(compressed)
     s = 'vpn://' + base64_encoded.decode('ascii')
-    return s 
\ No newline at end of file
+    return s
+
+async def encode_vpn_conf(conf_text: str, resolver=None) -> str:
+    # Имена из Endpoint разрешаются асинхронно через кэш, event loop не блокируется
+    resolver = resolver or dns_resolver
+    resolved = await resolver.resolve_many(endpoint_hosts(conf_text))
+    return pack_vpn_conf(process_conf_data(conf_text, resolved))
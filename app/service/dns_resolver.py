@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# getaddrinfo не отдаёт TTL записи, поэтому для системного резолвера используется DNS_CACHE_TTL.
+# Резолвер-заглушка (тесты, свой DNS-клиент) может вернуть TTL сам - он будет ограничен DNS_CACHE_MAX_TTL
+DNS_CACHE_TTL = float(os.getenv("DNS_CACHE_TTL", "300"))
+DNS_CACHE_MAX_TTL = float(os.getenv("DNS_CACHE_MAX_TTL", "3600"))
+# Сколько помним, что имя не разрешилось, чтобы не долбить DNS на каждом запросе
+DNS_NEGATIVE_TTL = float(os.getenv("DNS_NEGATIVE_TTL", "30"))
+DNS_TIMEOUT = float(os.getenv("DNS_TIMEOUT", "2"))
+
+# Функция разрешения имени: возвращает (IPv4-адрес или None, TTL в секундах или None)
+Lookup = Callable[[str], Awaitable[Tuple[Optional[str], Optional[float]]]]
+
+
+async def system_lookup(host: str) -> Tuple[Optional[str], Optional[float]]:
+    """Неблокирующий аналог socket.gethostbyname через getaddrinfo event loop"""
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        return None, None
+    if not infos:
+        return None, None
+    return infos[0][4][0], None
+
+
+class DnsResolver:
+    """
+    Кэширующий асинхронный резолвер для подстановки Endpoint в клиентские конфиги.
+    Повторное разрешение известного имени - обращение к словарю; параллельные запросы
+    одного и того же имени ждут один общий lookup.
+    """
+
+    def __init__(self, lookup: Optional[Lookup] = None, timeout: float = DNS_TIMEOUT):
+        self._lookup = lookup or system_lookup
+        self.timeout = timeout
+        # host -> (адрес или None, момент истечения по time.monotonic)
+        self._cache: Dict[str, Tuple[Optional[str], float]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.timeouts = 0
+
+    def set_lookup(self, lookup: Optional[Lookup]):
+        """Подменяет функцию разрешения (например, локальной заглушкой) и сбрасывает кэш"""
+        self._lookup = lookup or system_lookup
+        self.clear()
+
+    def clear(self):
+        self._cache.clear()
+
+    async def _query(self, host: str) -> Optional[str]:
+        try:
+            address, ttl = await asyncio.wait_for(self._lookup(host), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            address, ttl = None, None
+            logger.warning(f"Таймаут разрешения DNS-имени {host} ({self.timeout} с)")
+        except Exception as e:
+            address, ttl = None, None
+            logger.warning(f"Ошибка разрешения DNS-имени {host}: {e}")
+        if address:
+            ttl = DNS_CACHE_TTL if ttl is None else min(max(ttl, 0), DNS_CACHE_MAX_TTL)
+        else:
+            self.failures += 1
+            ttl = DNS_NEGATIVE_TTL
+        self._cache[host] = (address, time.monotonic() + ttl)
+        return address
+
+    async def resolve(self, host: str) -> Optional[str]:
+        """Возвращает IPv4-адрес имени или None, если имя не разрешилось"""
+        cached = self._cache.get(host)
+        if cached and cached[1] > time.monotonic():
+            self.hits += 1
+            return cached[0]
+        self.misses += 1
+        future = self._inflight.get(host)
+        if future is None:
+            # Разрешение - отдельной задачей: _query сам превращает ошибки lookup в None
+            future = asyncio.ensure_future(self._query(host))
+            self._inflight[host] = future
+            future.add_done_callback(lambda done: self._forget_inflight(host, done))
+        # shield: отмена вызывающего, начавшего разрешение, не должна отменять его для остальных
+        return await asyncio.shield(future)
+
+    def _forget_inflight(self, host: str, future: asyncio.Future):
+        if self._inflight.get(host) is future:
+            del self._inflight[host]
+
+    async def resolve_many(self, hosts: Iterable[str]) -> Dict[str, Optional[str]]:
+        hosts = list(dict.fromkeys(hosts))
+        addresses = await asyncio.gather(*(self.resolve(host) for host in hosts))
+        return dict(zip(hosts, addresses))
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "pid": os.getpid(),
+            "entries": len(self._cache),
+            "negative_entries": sum(1 for address, expires in self._cache.values() if address is None and expires > now),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+        }
+
+
+dns_resolver = DnsResolver()
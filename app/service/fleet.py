@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, List, Optional
+
+from database.database import async_session
+from models.server_models import SSHServerConfig
+from repositories.server_repo import ServerRepository
+from service.ssh_admission import AdmissionRejected
+
+logger = logging.getLogger(__name__)
+
+# Сколько серверов обрабатывать одновременно и сколько секунд ждать один сервер
+FLEET_CONCURRENCY = int(os.getenv("FLEET_CONCURRENCY", "32"))
+FLEET_NODE_TIMEOUT = float(os.getenv("FLEET_NODE_TIMEOUT", "30"))
+
+NodeOperation = Callable[[SSHServerConfig], Awaitable[Any]]
+
+
+class NodeResult:
+    """Итог операции на одном сервере"""
+
+    __slots__ = ("server_id", "host", "ok", "value", "error", "timed_out", "seconds")
+
+    def __init__(self, server: SSHServerConfig, seconds: float, value: Any = None,
+                 error: Optional[str] = None, timed_out: bool = False):
+        self.server_id = server.id
+        self.host = server.host
+        self.ok = error is None
+        self.value = value
+        self.error = error
+        self.timed_out = timed_out
+        self.seconds = seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "server_id": self.server_id,
+            "host": self.host,
+            "ok": self.ok,
+            "value": self.value,
+            "error": self.error,
+            "timed_out": self.timed_out,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+class FleetReport:
+    """Итог операции по всем серверам: результаты в порядке завершения и сводка"""
+
+    def __init__(self, results: List[NodeResult], seconds: float):
+        self.results = results
+        self.seconds = seconds
+
+    @property
+    def succeeded(self) -> List[NodeResult]:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> List[NodeResult]:
+        return [result for result in self.results if not result.ok]
+
+    def summary(self) -> dict:
+        return {
+            "nodes": len(self.results),
+            "succeeded": len(self.succeeded),
+            "failed": len(self.failed),
+            "timed_out": sum(1 for result in self.results if result.timed_out),
+            "seconds": round(self.seconds, 3),
+        }
+
+
+class FleetExecutor:
+    """
+    Выполнение операции сразу на многих серверах: не больше FLEET_CONCURRENCY одновременно,
+    у каждого сервера свой тайм-аут FLEET_NODE_TIMEOUT. Ошибка или тайм-аут одного сервера
+    не прерывает остальные, а попадает в его NodeResult. Полный проход занимает примерно
+    время самого медленного сервера, а не сумму.
+
+    Операция не должна пользоваться общей AsyncSession: сессия не допускает параллельных
+    запросов. Обращения к базе - до или после прохода, либо своя сессия внутри операции.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self.nodes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.last_run_seconds: Optional[float] = None
+
+    async def _run_node(self, server: SSHServerConfig, operation: NodeOperation, timeout: float) -> NodeResult:
+        started = time.monotonic()
+        try:
+            value = await asyncio.wait_for(operation(server), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.failures += 1
+            logger.warning(f"Сервер id={server.id} не ответил за {timeout:.0f}с")
+            return NodeResult(server, time.monotonic() - started, error=f"timeout after {timeout:.0f}s", timed_out=True)
+        except AdmissionRejected as e:
+            self.failures += 1
+            return NodeResult(server, time.monotonic() - started, error=str(e))
+        except Exception as e:
+            self.failures += 1
+            logger.exception(f"Ошибка операции на сервере id={server.id}: {e}")
+            return NodeResult(server, time.monotonic() - started, error=str(e) or type(e).__name__)
+        return NodeResult(server, time.monotonic() - started, value=value)
+
+    async def stream(self, servers: Iterable[SSHServerConfig], operation: NodeOperation,
+                     concurrency: Optional[int] = None, timeout: Optional[float] = None) -> AsyncIterator[NodeResult]:
+        """
+        Результаты по серверам в порядке завершения. При досрочном выходе из цикла оставшиеся
+        операции отменяются, когда генератор закрыт - используйте contextlib.aclosing
+        """
+        servers = list(servers)
+        timeout = FLEET_NODE_TIMEOUT if timeout is None else timeout
+        semaphore = asyncio.Semaphore(concurrency or FLEET_CONCURRENCY)
+        finished: asyncio.Queue = asyncio.Queue()
+        started = time.monotonic()
+
+        async def run(server: SSHServerConfig):
+            async with semaphore:
+                # Тайм-аут считается с момента старта на сервере, ожидание очереди в него не входит
+                finished.put_nowait(await self._run_node(server, operation, timeout))
+
+        tasks = [asyncio.create_task(run(server)) for server in servers]
+        self.runs += 1
+        try:
+            for _ in tasks:
+                self.nodes += 1
+                yield await finished.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.last_run_seconds = round(time.monotonic() - started, 3)
+
+    async def run(self, servers: Iterable[SSHServerConfig], operation: NodeOperation,
+                  concurrency: Optional[int] = None, timeout: Optional[float] = None) -> FleetReport:
+        started = time.monotonic()
+        results = [result async for result in self.stream(servers, operation, concurrency, timeout)]
+        return FleetReport(results, time.monotonic() - started)
+
+    @staticmethod
+    async def active_servers() -> List[SSHServerConfig]:
+        async with async_session() as session:
+            return await ServerRepository(session).get_active_servers()
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "concurrency": FLEET_CONCURRENCY,
+            "node_timeout_seconds": FLEET_NODE_TIMEOUT,
+            "runs": self.runs,
+            "nodes": self.nodes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+
+fleet_executor = FleetExecutor()
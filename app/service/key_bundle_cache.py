@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from database.database import async_session
+from pb import telegram_bot_service_pb2 as pb2
+from service.pg_listener import pg_listener
+from service.subscription_service import SubscriptionService, key_bundle_app
+
+logger = logging.getLogger(__name__)
+
+# Канал NOTIFY триггеров user_keys_changed_* (см. SCHEMA_PATCHES в database.py),
+# payload - telegram_user_id через запятую
+KEY_BUNDLES_CHANNEL = "user_keys_changed"
+# Наборов ключей в памяти воркера
+KEY_BUNDLE_CACHE_SIZE = int(os.getenv("KEY_BUNDLE_CACHE_SIZE", "50000"))
+# Каталог, куда вытесняются наборы из памяти (пусто - вытесненные просто забываются)
+KEY_BUNDLE_SPILL_DIR = os.getenv("KEY_BUNDLE_SPILL_DIR", "")
+KEY_BUNDLE_SPILL_SIZE = int(os.getenv("KEY_BUNDLE_SPILL_SIZE", "500000"))
+# Пока LISTEN не подключён, об изменениях мы не узнаем - набор живёт не дольше этого срока
+KEY_BUNDLE_FALLBACK_TTL = float(os.getenv("KEY_BUNDLE_FALLBACK_TTL", "30"))
+
+CacheKey = Tuple[str, str]
+
+EMPTY_BUNDLE = pb2.ConfigurationKeysResponse().SerializeToString()
+
+
+def _timestamp(end_date: Optional[datetime]) -> Optional[float]:
+    # end_date в базе - наивное UTC-время
+    return end_date.replace(tzinfo=timezone.utc).timestamp() if end_date else None
+
+
+class KeyBundle:
+    """Ответ GetConfigurationKeys пользователя, сериализованный один раз"""
+
+    __slots__ = ("payload", "expires_at", "loaded_at")
+
+    def __init__(self, payload: bytes, expires_at: Optional[float], loaded_at: Optional[float] = None):
+        self.payload = payload
+        # Когда истекает первая из подписок набора: после этого набор уже неверен без всякого NOTIFY
+        self.expires_at = expires_at
+        self.loaded_at = loaded_at if loaded_at is not None else time.monotonic()
+
+    def fresh(self, listener_connected: bool) -> bool:
+        if self.expires_at is not None and time.time() >= self.expires_at:
+            return False
+        return listener_connected or time.monotonic() - self.loaded_at < KEY_BUNDLE_FALLBACK_TTL
+
+
+class KeyBundleCache:
+    """
+    Кэш ответов GetConfigurationKeys по (telegram_id, набор ключей приложения) с LRU в памяти
+    и необязательным вытеснением на диск. Набор сбрасывается по NOTIFY от триггеров на
+    выдачу, отзыв ключей и изменение подписок, так что в горячем пути - поиск в словаре.
+    """
+
+    def __init__(self, max_size: int = KEY_BUNDLE_CACHE_SIZE, spill_dir: str = KEY_BUNDLE_SPILL_DIR,
+                 spill_size: int = KEY_BUNDLE_SPILL_SIZE):
+        self.max_size = max_size
+        self.spill_size = spill_size
+        # Свой подкаталог на воркер: файлы других воркеров (и прошлых запусков) не читаем
+        self.spill_dir = os.path.join(spill_dir, str(os.getpid())) if spill_dir else ""
+        self._cache: "OrderedDict[CacheKey, KeyBundle]" = OrderedDict()
+        # Вытесненные на диск: ключ -> (файл, expires_at, loaded_at)
+        self._spilled: "OrderedDict[CacheKey, Tuple[str, Optional[float], float]]" = OrderedDict()
+        self._by_user: Dict[str, Set[CacheKey]] = {}
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        # Счётчик сбросов: набор, загруженный во время сброса, в кэш не кладём
+        self._epoch = 0
+        self._spill_seq = 0
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.spill_errors = 0
+        pg_listener.add_channel(KEY_BUNDLES_CHANNEL, self._on_notify, on_connect=self.clear)
+
+    def _index(self, key: CacheKey):
+        self._by_user.setdefault(key[0], set()).add(key)
+
+    def _unindex(self, key: CacheKey):
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def _remove_file(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.spill_errors += 1
+            logger.warning(f"Не удалось удалить вытесненный набор ключей {path}: {e}")
+
+    def _drop_spilled(self, key: CacheKey):
+        spilled = self._spilled.pop(key, None)
+        if spilled is not None:
+            self._remove_file(spilled[0])
+
+    def _spill(self, key: CacheKey, bundle: KeyBundle):
+        # Файлы по несколько сотен байт на локальном диске: пишем и читаем прямо в event loop
+        if not self.spill_dir:
+            self._unindex(key)
+            return
+        self._spill_seq += 1
+        path = os.path.join(self.spill_dir, f"{self._spill_seq}.bin")
+        try:
+            with open(path, "wb") as f:
+                f.write(bundle.payload)
+        except OSError as e:
+            self.spill_errors += 1
+            self._unindex(key)
+            logger.warning(f"Не удалось вытеснить набор ключей на диск: {e}")
+            return
+        self._drop_spilled(key)
+        self._spilled[key] = (path, bundle.expires_at, bundle.loaded_at)
+        while len(self._spilled) > self.spill_size:
+            old_key, (old_path, _, _) = self._spilled.popitem(last=False)
+            self._remove_file(old_path)
+            if old_key not in self._cache:
+                self._unindex(old_key)
+
+    def _put(self, key: CacheKey, bundle: KeyBundle):
+        self._drop_spilled(key)
+        self._cache[key] = bundle
+        self._cache.move_to_end(key)
+        self._index(key)
+        while len(self._cache) > self.max_size:
+            old_key, old_bundle = self._cache.popitem(last=False)
+            self.evictions += 1
+            self._spill(old_key, old_bundle)
+
+    def _load_spilled(self, key: CacheKey) -> Optional[KeyBundle]:
+        spilled = self._spilled.get(key)
+        if spilled is None:
+            return None
+        path, expires_at, loaded_at = spilled
+        bundle = KeyBundle(b"", expires_at, loaded_at)
+        if not bundle.fresh(pg_listener.connected):
+            return None
+        try:
+            with open(path, "rb") as f:
+                bundle.payload = f.read()
+        except OSError as e:
+            self.spill_errors += 1
+            logger.warning(f"Не удалось прочитать вытесненный набор ключей {path}: {e}")
+            return None
+        return bundle
+
+    async def _load(self, key: CacheKey) -> bytes:
+        epoch = self._epoch
+        async with async_session() as session:
+            keys, expires_at = await SubscriptionService(session).get_key_bundle(*key)
+        self.loads += 1
+        payload = pb2.ConfigurationKeysResponse(keys=[
+            pb2.ConfigurationKeysResponse.KeyValuePair(server=server, key=name, value=value)
+            for server, name, value in keys
+        ]).SerializeToString()
+        if epoch == self._epoch:
+            self._put(key, KeyBundle(payload, _timestamp(expires_at)))
+        return payload
+
+    async def get(self, telegram_id, vpn_app: str = "") -> bytes:
+        """Сериализованный ConfigurationKeysResponse пользователя"""
+        app = key_bundle_app(vpn_app)
+        if app is None:
+            return EMPTY_BUNDLE
+        key = (str(telegram_id), app)
+        bundle = self._cache.get(key)
+        if bundle is not None and bundle.fresh(pg_listener.connected):
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return bundle.payload
+        bundle = self._load_spilled(key)
+        if bundle is not None:
+            self.spill_hits += 1
+            self._put(key, bundle)
+            return bundle.payload
+        self.misses += 1
+        # Параллельные промахи по одному пользователю ждут одну загрузку
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget_inflight(key, done))
+        return await asyncio.shield(future)
+
+    def _forget_inflight(self, key: CacheKey, future: asyncio.Future):
+        # После сброса на этом месте может быть уже новая загрузка
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def invalidate(self, telegram_ids: Iterable):
+        """Сбрасывает наборы ключей пользователей (выдача или отзыв ключей, продление подписки)"""
+        self._epoch += 1
+        for telegram_id in telegram_ids:
+            telegram_id = str(telegram_id)
+            for key in self._by_user.pop(telegram_id, ()):
+                self._cache.pop(key, None)
+                self._drop_spilled(key)
+                self._inflight.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self):
+        # После (пере)подключения LISTEN: уведомления, пришедшие без соединения, потеряны
+        self._epoch += 1
+        for path, _, _ in self._spilled.values():
+            self._remove_file(path)
+        self._cache.clear()
+        self._spilled.clear()
+        self._by_user.clear()
+        self._inflight.clear()
+
+    def _on_notify(self, payload: str):
+        self.invalidate(payload.split(","))
+
+    def start(self):
+        if self.spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    async def close(self):
+        self.clear()
+        if self.spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.spill_hits + self.misses
+        return {
+            "pid": os.getpid(),
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "spilled": len(self._spilled),
+            "spill_dir": self.spill_dir or None,
+            "hits": self.hits,
+            "spill_hits": self.spill_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.spill_hits) / lookups, 4) if lookups else None,
+            "loads": self.loads,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "spill_errors": self.spill_errors,
+            "listener_connected": pg_listener.connected,
+        }
+
+
+key_bundle_cache = KeyBundleCache()
@@ -0,0 +1,61 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from service.wg_keys import generate_keypair
+
+# Потоки для генерации пачек ключей: отдельный пул, чтобы массовая выдача не занимала
+# общий executor по умолчанию, которым пользуются другие компоненты
+WG_KEYGEN_WORKERS = int(os.getenv("WG_KEYGEN_WORKERS", "1"))
+# Пачки не больше этого размера считаются прямо в event loop (~80 мкс на ключ, см. service/wg_keys.py).
+# Большие уходят в поток: X25519 считается в OpenSSL, и на 2000 ключах loop задерживается
+# не больше чем на ~2 мс против ~100 мс при генерации прямо в нём
+WG_KEYGEN_INLINE_MAX = int(os.getenv("WG_KEYGEN_INLINE_MAX", "16"))
+# Сколько ключей отдаётся в поток за раз: между частями loop успевает обслужить другие запросы
+WG_KEYGEN_CHUNK_SIZE = int(os.getenv("WG_KEYGEN_CHUNK_SIZE", "50"))
+
+
+class KeypairGenerator:
+    """Генерация пачек ключей WireGuard в своём ограниченном пуле потоков"""
+
+    def __init__(self, workers: int = WG_KEYGEN_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.generated = 0
+        self.offloaded = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="wg-keygen")
+        return self._executor
+
+    async def generate_many(self, count: int) -> List[Tuple[str, str, str]]:
+        """count троек (private_key, public_key, preshared_key)"""
+        self.generated += count
+        if count <= WG_KEYGEN_INLINE_MAX:
+            return [generate_keypair() for _ in range(count)]
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        keys = []
+        for i in range(0, count, WG_KEYGEN_CHUNK_SIZE):
+            size = min(WG_KEYGEN_CHUNK_SIZE, count - i)
+            keys += await loop.run_in_executor(executor, lambda size=size: [generate_keypair() for _ in range(size)])
+        self.offloaded += count
+        return keys
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "workers": self.workers,
+            "generated": self.generated,
+            "offloaded": self.offloaded,
+        }
+
+
+keypair_generator = KeypairGenerator()
@@ -0,0 +1,157 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+
+# Каталог для файлов метрик воркеров uvicorn: задаётся до запуска и очищается перед стартом
+# (см. docker-compose.yml). Без него метрики видны только того воркера, который ответил на /metrics
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+
+# Границы для быстрых операций (запросы к БД, кодирование ключей) и для SSH
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SSH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Метка route - шаблон пути (/admin/server/{server_id}/generate-key), а не сам путь:
+# иначе число серий росло бы с каждым id
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса",
+    ["method", "route", "status"],
+)
+SSH_COMMAND_DURATION = Histogram(
+    "ssh_command_duration_seconds", "Время выполнения SSH-команды на сервере",
+    ["server_id", "kind", "outcome"], buckets=SSH_BUCKETS,
+)
+SSH_ADMISSION_WAIT = Histogram(
+    "ssh_admission_wait_seconds", "Ожидание слота для удалённой операции на сервере",
+    buckets=SSH_BUCKETS,
+)
+SSH_ADMISSION_REJECTED = Counter(
+    "ssh_admission_rejected", "Операции, отклонённые из-за перегрузки сервера", ["reason"],
+)
+PEER_INSTALL_BATCH_SIZE = Histogram(
+    "peer_install_batch_requests", "Сколько установок пиров склеено в одно применение конфига",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Время выполнения SQL-запроса",
+    ["operation"], buckets=FAST_BUCKETS,
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Ожидание свободного соединения в пуле SQLAlchemy",
+    buckets=FAST_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts", "Тайм-ауты ожидания соединения в пуле")
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Соединения пула, выданные в работу",
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "Постоянный размер пула соединений", multiprocess_mode="livesum")
+VPN_ENCODE_DURATION = Histogram(
+    "vpn_encode_duration_seconds", "Время кодирования пачки конфигов в vpn://-ключи",
+    ["mode"], buckets=FAST_BUCKETS,
+)
+VPN_ENCODE_CONFS = Counter("vpn_encode_confs", "Конфигов, переданных на кодирование")
+
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+def sql_operation(statement: str) -> str:
+    # Метка - только первое слово запроса, чтобы число серий не зависело от текста запросов
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine):
+    """Тайминги запросов и состояние пула движка SQLAlchemy"""
+    sync_engine = engine.sync_engine
+    pool = sync_engine.pool
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_started")
+        if started:
+            DB_QUERY_DURATION.labels(sql_operation(statement)).observe(time.perf_counter() - started.pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(context):
+        # Упавший запрос не доходит до after_cursor_execute: снимаем его отметку
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    @event.listens_for(pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+    DB_POOL_SIZE.set(pool.size())
+    pool.wait_observer = observe_pool_wait
+
+
+def observe_pool_wait(waited: float, timed_out: bool):
+    DB_POOL_WAIT.observe(waited)
+    if timed_out:
+        DB_POOL_TIMEOUTS.inc()
+
+
+class PrometheusMiddleware:
+    """ASGI-middleware: гистограмма времени HTTP-запросов по шаблону маршрута"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"],
+                getattr(route, "path", "<unmatched>"),
+                str(status["code"]),
+            ).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> bytes:
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_worker_dead():
+    # Живые gauge (livesum) остановленного воркера не должны попадать в сумму
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
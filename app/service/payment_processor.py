@@ -0,0 +1,57 @@
+import asyncio
+import os
+from typing import Dict, Tuple
+
+from database.database import async_session
+from service.subscription_service import SubscriptionService
+
+
+class PaymentProcessor:
+    """
+    Обработка оплат ProcessSubscriptionPayment. Повторы вебхука с тем же payment_id,
+    пришедшие, пока оплата ещё обрабатывается в этом воркере, ждут тот же результат
+    и не занимают соединение с базой. Между воркерами повторы отсекает журнал
+    subscription_payments (см. SubscriptionService.process_payment).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.processed = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def _process(self, telegram_id, duration_days: int, payment_id: str) -> Tuple[str, dict]:
+        try:
+            async with async_session() as session:
+                return await SubscriptionService(session).process_payment(telegram_id, duration_days, payment_id)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.processed += 1
+
+    async def process(self, telegram_id, duration_days: int, payment_id: str = "") -> Tuple[str, dict]:
+        """(результат, новый статус) оплаты; без payment_id - без защиты от повторов"""
+        if not payment_id:
+            return await self._process(telegram_id, duration_days, payment_id)
+        future = self._inflight.get(payment_id)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(self._process(telegram_id, duration_days, payment_id))
+        self._inflight[payment_id] = future
+        future.add_done_callback(lambda _: self._inflight.pop(payment_id, None))
+        # shield: отмена RPC, пришедшего первым, не должна отменять оплату для остальных
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "in_flight": len(self._inflight),
+            "processed": self.processed,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
+
+
+payment_processor = PaymentProcessor()
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from models.server_models import SSHServerConfig
+from service.metrics import PEER_INSTALL_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Сколько миллисекунд собирать установки пиров одного сервера перед применением (0 - без склейки)
+PEER_INSTALL_COALESCE_MS = float(os.getenv("PEER_INSTALL_COALESCE_MS", "20"))
+# Максимум пиров в одном применении; остаток уходит следующим тиком
+PEER_INSTALL_MAX_BATCH = int(os.getenv("PEER_INSTALL_MAX_BATCH", "500"))
+
+ApplyPeers = Callable[[SSHServerConfig, list], Awaitable[bool]]
+# Откат установки запроса, который отменили: (server, peers, installed) - снять пиры с сервера,
+# если они успели встать, и вернуть адреса
+RollbackPeers = Callable[[SSHServerConfig, list, bool], Awaitable[None]]
+
+
+class _PendingInstall:
+    """Запрос на установку в очереди сервера; сервер и функция применения - свои у каждого запроса"""
+
+    __slots__ = ("server", "peers", "apply", "rollback", "future")
+
+    def __init__(self, server: SSHServerConfig, peers: list, apply: ApplyPeers, rollback: Optional[RollbackPeers]):
+        self.server = server
+        self.peers = peers
+        self.apply = apply
+        self.rollback = rollback
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class PeerInstallBatcher:
+    """
+    Склейка одновременных установок пиров на один сервер: запросы, пришедшие за тик
+    PEER_INSTALL_COALESCE_MS (или пока идёт предыдущее применение), ставятся одним
+    скриптом hot-apply. Под всплеском выдачи ключей сервер получает одну сессию на тик
+    вместо сессии на каждый запрос. Результат (или исключение) применения получают
+    все запросы пачки.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, List[_PendingInstall]] = {}
+        self._flushers: Dict[int, asyncio.Task] = {}
+        self._rollbacks: Set[asyncio.Task] = set()
+        self.requests = 0
+        self.batches = 0
+        self.peers = 0
+        self.failed_batches = 0
+        self.max_batch_requests = 0
+        self.cancelled_requests = 0
+
+    async def install(self, server: SSHServerConfig, peers: list, apply: ApplyPeers,
+                      rollback: Optional[RollbackPeers] = None) -> bool:
+        if server.id is None or PEER_INSTALL_COALESCE_MS <= 0:
+            return await apply(server, peers)
+        entry = _PendingInstall(server, peers, apply, rollback)
+        self._pending.setdefault(server.id, []).append(entry)
+        self.requests += 1
+        if server.id not in self._flushers:
+            self._flushers[server.id] = asyncio.create_task(self._flush_loop(server.id))
+        try:
+            # shield: отмена вызывающего не отменяет его долю уже идущего применения
+            return await asyncio.shield(entry.future)
+        except asyncio.CancelledError:
+            self._cancel(entry)
+            raise
+
+    def _cancel(self, entry: _PendingInstall):
+        # Вызывающий отменён (клиент отключился): его пиры и адреса больше никто не запишет
+        if entry.future.cancelled():
+            # Отменён сам цикл применения (остановка приложения)
+            return
+        self.cancelled_requests += 1
+        pending = self._pending.get(entry.server.id, [])
+        if entry in pending:
+            # Ещё в очереди - просто не ставим
+            pending.remove(entry)
+            if not pending:
+                self._pending.pop(entry.server.id, None)
+            installed = None
+        else:
+            # Уже в применении - дождёмся его итога и откатим
+            installed = entry.future
+        if entry.rollback is not None:
+            task = asyncio.create_task(self._rollback(entry, installed))
+            self._rollbacks.add(task)
+            task.add_done_callback(self._rollbacks.discard)
+
+    async def _rollback(self, entry: _PendingInstall, installed: Optional[asyncio.Future]):
+        ok = False
+        if installed is not None:
+            try:
+                ok = await installed
+            except asyncio.CancelledError:
+                # Применение прервано остановкой - пиры могли успеть встать, снимаем на всякий случай
+                ok = True
+            except Exception:
+                ok = False
+        try:
+            await entry.rollback(entry.server, entry.peers, ok)
+        except Exception as e:
+            logger.exception(f"Ошибка отката установки {len(entry.peers)} пиров на сервер id={entry.server.id}: {e}")
+
+    def _take_batch(self, server_id: int) -> List[_PendingInstall]:
+        pending = self._pending.get(server_id, [])
+        taken, size = 0, 0
+        while taken < len(pending) and (taken == 0 or size + len(pending[taken].peers) <= PEER_INSTALL_MAX_BATCH):
+            size += len(pending[taken].peers)
+            taken += 1
+        batch, rest = pending[:taken], pending[taken:]
+        if rest:
+            self._pending[server_id] = rest
+        else:
+            self._pending.pop(server_id, None)
+        return [entry for entry in batch if not entry.future.done()]
+
+    async def _flush_loop(self, server_id: int):
+        batch: List[_PendingInstall] = []
+        try:
+            while self._pending.get(server_id):
+                await asyncio.sleep(PEER_INSTALL_COALESCE_MS / 1000)
+                batch = self._take_batch(server_id)
+                if not batch:
+                    continue
+                # Сервер и применение - последнего запроса пачки: его вызывающий ждёт результата,
+                # а не первого запроса, с которого цикл начался
+                server, apply = batch[-1].server, batch[-1].apply
+                peers = [peer for entry in batch for peer in entry.peers]
+                self.batches += 1
+                self.peers += len(peers)
+                self.max_batch_requests = max(self.max_batch_requests, len(batch))
+                PEER_INSTALL_BATCH_SIZE.observe(len(batch))
+                error: Optional[BaseException] = None
+                ok = False
+                try:
+                    ok = await apply(server, peers)
+                except Exception as e:
+                    error = e
+                if error is not None or not ok:
+                    self.failed_batches += 1
+                if len(batch) > 1:
+                    logger.info(f"На сервер id={server_id} одним применением поставлено {len(peers)} пиров из {len(batch)} запросов")
+                for entry in batch:
+                    if entry.future.done():
+                        continue
+                    if error is not None:
+                        entry.future.set_exception(error)
+                    else:
+                        entry.future.set_result(ok)
+                batch = []
+        finally:
+            self._flushers.pop(server_id, None)
+            # Цикл прерван (отмена при остановке) - ожидающим больше некому ответить
+            for entry in batch + self._pending.pop(server_id, []):
+                if not entry.future.done():
+                    entry.future.cancel()
+
+    async def close(self):
+        tasks = list(self._flushers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Откаты отменённых запросов доводим до конца: иначе пиры и адреса останутся без владельца
+        await asyncio.gather(*self._rollbacks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "coalesce_ms": PEER_INSTALL_COALESCE_MS,
+            "requests": self.requests,
+            "batches": self.batches,
+            "peers": self.peers,
+            "failed_batches": self.failed_batches,
+            "avg_batch_requests": round(self.requests / self.batches, 2) if self.batches else None,
+            "max_batch_requests": self.max_batch_requests,
+            "cancelled_requests": self.cancelled_requests,
+            "pending": sum(len(items) for items in self._pending.values()),
+        }
+
+
+peer_install_batcher = PeerInstallBatcher()
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+
+from database.database import async_session, engine
+from models.server_models import SSHServerConfig
+from service.server_service import ServerService, peer_pool_depth
+
+logger = logging.getLogger(__name__)
+
+# Период проверки пула и максимум пиров, выпускаемых на сервер за один проход (скорость пополнения)
+PEER_POOL_REFILL_INTERVAL = float(os.getenv("PEER_POOL_REFILL_INTERVAL", "10"))
+PEER_POOL_REFILL_BATCH = int(os.getenv("PEER_POOL_REFILL_BATCH", "20"))
+# Порог, ниже которого пишем предупреждение (по умолчанию - четверть глубины пула)
+PEER_POOL_LOW_WATERMARK = os.getenv("PEER_POOL_LOW_WATERMARK")
+# Невостребованные пиры старше этого срока удаляются с сервера и из пула
+PEER_POOL_MAX_AGE_HOURS = float(os.getenv("PEER_POOL_MAX_AGE_HOURS", "168"))
+PEER_POOL_GC_BATCH = int(os.getenv("PEER_POOL_GC_BATCH", "100"))
+# Ключ advisory-блокировки Postgres: пул обслуживает только один воркер одновременно
+PEER_POOL_LOCK_KEY = 7301001
+
+
+def low_watermark(server_id: int) -> int:
+    if PEER_POOL_LOW_WATERMARK is not None:
+        return int(PEER_POOL_LOW_WATERMARK)
+    return peer_pool_depth(server_id) // 4
+
+
+class PeerPoolReplenisher:
+    """Фоновое пополнение пула готовых пиров и сборка невостребованных"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.skipped_runs = 0
+        self.peers_created = 0
+        self.peers_collected = 0
+        self.low_watermark_alerts = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_seconds: Optional[float] = None
+        self.available = {}
+
+    async def _refill(self, service: ServerService, server: SSHServerConfig, available: int):
+        depth = peer_pool_depth(server.id)
+        if available < low_watermark(server.id):
+            self.low_watermark_alerts += 1
+            logger.warning(f"Пул готовых пиров сервера id={server.id} ниже порога: {available} из {depth}")
+        missing = min(depth - available, PEER_POOL_REFILL_BATCH)
+        if missing <= 0:
+            return
+        peers = await service.create_peers(server, missing)
+        try:
+            await service.peer_pool_repo.add_many(server.id, peers)
+        except Exception:
+            # Пиры уже стоят на сервере, но в пул не попали - снимаем их и возвращаем адреса.
+            # Адреса освобождаются только после удаления с сервера, иначе их выдадут второй раз
+            await service.db.rollback()
+            public_keys = [peer["public_key"] for peer in peers]
+            if await service.remove_and_release(server, public_keys) is None:
+                logger.error(f"Не удалось удалить с сервера id={server.id} пиры, не записанные в пул: {len(public_keys)}")
+            raise
+        self.peers_created += len(peers)
+        self.available[server.id] = available + len(peers)
+        logger.info(f"Пул готовых пиров сервера id={server.id} пополнен на {len(peers)}")
+
+    async def _collect(self, service: ServerService, server: SSHServerConfig) -> int:
+        # Сначала снимаем пиры с выдачи, затем удаляем с сервера; при сбое удаления
+        # строки остаются в статусе retiring и подбираются на следующем проходе
+        cutoff = datetime.utcnow() - timedelta(hours=PEER_POOL_MAX_AGE_HOURS)
+        public_keys = await service.peer_pool_repo.mark_retiring(server.id, cutoff, PEER_POOL_GC_BATCH)
+        if not public_keys:
+            return 0
+        if await service.remove_and_release(server, public_keys) is None:
+            logger.error(f"Не удалось удалить устаревшие пиры пула с сервера id={server.id}")
+            return len(public_keys)
+        await service.peer_pool_repo.delete_retired(server.id, public_keys)
+        self.peers_collected += len(public_keys)
+        logger.info(f"Удалено невостребованных пиров пула с сервера id={server.id}: {len(public_keys)}")
+        return len(public_keys)
+
+    async def run_once(self) -> bool:
+        started = time.monotonic()
+        async with engine.connect() as lock_conn:
+            locked = (await lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": PEER_POOL_LOCK_KEY})).scalar()
+            if not locked:
+                # Пулом уже занимается другой воркер
+                self.skipped_runs += 1
+                return False
+            try:
+                async with async_session() as session:
+                    service = ServerService(session)
+                    servers = [s for s in await service.repo.get_all_servers() if s.is_active and peer_pool_depth(s.id) > 0]
+                    available = await service.peer_pool_repo.count_available()
+                    self.available = {server.id: available.get(server.id, 0) for server in servers}
+                    for server in servers:
+                        try:
+                            # Сначала сборка устаревших, чтобы пополнение сразу их заменило
+                            retired = await self._collect(service, server)
+                            await self._refill(service, server, max(0, available.get(server.id, 0) - retired))
+                        except Exception as e:
+                            await session.rollback()
+                            logger.exception(f"Ошибка обслуживания пула пиров сервера id={server.id}: {e}")
+            finally:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PEER_POOL_LOCK_KEY})
+        self.runs += 1
+        self.last_run_at = time.time()
+        self.last_run_seconds = round(time.monotonic() - started, 3)
+        return True
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception(f"Ошибка пополнения пула пиров: {e}")
+            await asyncio.sleep(PEER_POOL_REFILL_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "peers_created": self.peers_created,
+            "peers_collected": self.peers_collected,
+            "low_watermark_alerts": self.low_watermark_alerts,
+            "last_run_at": self.last_run_at,
+            "last_run_seconds": self.last_run_seconds,
+            "available": self.available,
+        }
+
+
+peer_pool_replenisher = PeerPoolReplenisher()
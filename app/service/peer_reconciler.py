@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from database.database import async_session, engine
+from models.server_models import SSHServerConfig
+from repositories.ip_pool_repo import IpPoolRepository
+from service.fleet import FleetReport, fleet_executor
+from service.server_service import ServerService
+
+logger = logging.getLogger(__name__)
+
+# Фоновая сверка: 'off' - выключена, 'dry-run' - только отчёт о расхождениях, 'apply' - исправление
+PEER_RECONCILE_MODE = os.getenv("PEER_RECONCILE_MODE", "dry-run").lower()
+PEER_RECONCILE_INTERVAL = float(os.getenv("PEER_RECONCILE_INTERVAL", "600"))
+# Сколько серверов сверять одновременно
+PEER_RECONCILE_CONCURRENCY = int(os.getenv("PEER_RECONCILE_CONCURRENCY", "8"))
+# Без force не удалять больше этой доли пиров интерфейса за раз (защита от пустой или чужой базы);
+# небольшие удаления (до PEER_RECONCILE_REMOVE_GUARD_MIN) проходят всегда
+PEER_RECONCILE_MAX_REMOVE_FRACTION = float(os.getenv("PEER_RECONCILE_MAX_REMOVE_FRACTION", "0.5"))
+PEER_RECONCILE_REMOVE_GUARD_MIN = int(os.getenv("PEER_RECONCILE_REMOVE_GUARD_MIN", "10"))
+# Адреса, выданные не раньше этого числа секунд назад, не сверяются: их установка может быть ещё в пути
+PEER_RECONCILE_ALLOCATION_GRACE = float(os.getenv("PEER_RECONCILE_ALLOCATION_GRACE", "300"))
+# Ключ advisory-блокировки Postgres: фоновую сверку выполняет только один воркер одновременно
+PEER_RECONCILE_LOCK_KEY = 7301004
+
+
+def _allowed_ips(value: Optional[str]) -> frozenset:
+    if not value or value == "(none)":
+        return frozenset()
+    return frozenset(item.strip() for item in value.split(",") if item.strip())
+
+
+class PeerDiff:
+    """Расхождение пиров интерфейса с базой"""
+
+    __slots__ = ("to_add", "to_remove", "changed", "unrepairable", "unsettled", "bot_managed", "in_sync")
+
+    def __init__(self):
+        # Пиры (словари для build_reconcile_script), которых нет на интерфейсе
+        self.to_add: List[dict] = []
+        # Публичные ключи пиров, которых нет среди выданных адресов
+        self.to_remove: List[str] = []
+        # Пиры с чужими AllowedIPs: удаляются и ставятся заново, поэтому есть и в to_add, и в to_remove
+        self.changed: List[str] = []
+        # Пиры, которые нельзя восстановить: в базе нет PSK (пир был на сервере до создания пула)
+        self.unrepairable: List[str] = []
+        # Пиры, которые сейчас удаляются или только что выданы: их не трогаем до следующей сверки
+        self.unsettled: List[str] = []
+        # Пиры бота (awg-docker-bot-main): их нет в базе, но удалять их нельзя
+        self.bot_managed: List[str] = []
+        self.in_sync = 0
+
+    @property
+    def clean(self) -> bool:
+        return not (self.to_add or self.to_remove or self.unrepairable)
+
+    def to_dict(self) -> dict:
+        return {
+            "to_add": [peer["public_key"] for peer in self.to_add],
+            "to_remove": self.to_remove,
+            "changed": self.changed,
+            "unrepairable": self.unrepairable,
+            "unsettled": self.unsettled,
+            "bot_managed": self.bot_managed,
+            "in_sync": self.in_sync,
+        }
+
+
+def diff_peers(desired: Dict[str, dict], live: Iterable[dict], unsettled: Set[str] = frozenset(),
+               bot_managed: Set[str] = frozenset()) -> PeerDiff:
+    """
+    Сверка по публичному ключу за O(n): desired - public_key -> {preshared_key, address}
+    из базы, live - пиры из parse_wg_dump. Ключи unsettled не добавляются и не удаляются,
+    ключи bot_managed не удаляются
+    """
+    diff = PeerDiff()
+    seen = set()
+    for peer in live:
+        public_key = peer["public_key"]
+        seen.add(public_key)
+        wanted = desired.get(public_key)
+        if public_key in unsettled:
+            diff.unsettled.append(public_key)
+        elif wanted is None and public_key in bot_managed:
+            diff.bot_managed.append(public_key)
+        elif wanted is None:
+            diff.to_remove.append(public_key)
+        elif _allowed_ips(peer["allowed_ips"]) != _allowed_ips(wanted["address"]):
+            if wanted["preshared_key"]:
+                diff.changed.append(public_key)
+                diff.to_remove.append(public_key)
+                diff.to_add.append({"public_key": public_key, "preshared_key": wanted["preshared_key"], "allowed_ips": wanted["address"]})
+            else:
+                diff.unrepairable.append(public_key)
+        else:
+            diff.in_sync += 1
+    for public_key, wanted in desired.items():
+        if public_key in seen:
+            continue
+        if public_key in unsettled:
+            diff.unsettled.append(public_key)
+            continue
+        if wanted["preshared_key"]:
+            diff.to_add.append({"public_key": public_key, "preshared_key": wanted["preshared_key"], "allowed_ips": wanted["address"]})
+        else:
+            diff.unrepairable.append(public_key)
+    return diff
+
+
+class PeerReconciler:
+    """
+    Сверка пиров работающего интерфейса (`wg show dump`) с базой: лишние пиры удаляются,
+    недостающие ставятся заново, с неверными AllowedIPs - переустанавливаются. Источник
+    правды - выданные адреса ip_allocations; пиры бота (именованные в wg0.conf или из
+    clientsTable) не удаляются. Исправление - одним горячим применением на сервер, только
+    по разнице; в режиме dry-run сервер не меняется.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.skipped_runs = 0
+        self.servers_checked = 0
+        self.servers_drifted = 0
+        self.peers_added = 0
+        self.peers_removed = 0
+        self.guarded = 0
+        self.failures = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_seconds: Optional[float] = None
+
+    @staticmethod
+    async def _desired(repo: IpPoolRepository, server_id: int) -> Optional[Tuple[Dict[str, dict], Set[str]]]:
+        """Выданные пиры сервера и ключи, которые сейчас меняются (см. get_unsettled_keys)"""
+        if not await repo.get_pool(server_id):
+            return None
+        peers = await repo.get_allocated_peers(server_id)
+        unsettled = await repo.get_unsettled_keys(server_id, datetime.utcnow() - timedelta(seconds=PEER_RECONCILE_ALLOCATION_GRACE))
+        desired = {
+            public_key: {"preshared_key": preshared_key, "address": address}
+            for public_key, preshared_key, address in peers
+        }
+        return desired, unsettled
+
+    async def reconcile_server(self, server: SSHServerConfig, dry_run: bool = True, force: bool = False) -> dict:
+        """Сверяет один сервер; в dry_run только возвращает расхождение"""
+        service = ServerService(None)
+        # Сначала интерфейс, потом база: пир, установленный до снимка интерфейса, уже есть в базе -
+        # выдача резервирует адрес раньше установки, поэтому свежий ключ не будет принят за лишний.
+        # Пиры бота - после интерфейса: бот дописывает wg0.conf раньше, чем применяет его
+        live = await service.show_peers(server)
+        if live is None:
+            raise RuntimeError("wg show dump не выполнен")
+        bot_managed = await service.show_bot_peers(server)
+        if bot_managed is None:
+            raise RuntimeError("не удалось прочитать пиры бота")
+        async with async_session() as session:
+            loaded = await self._desired(IpPoolRepository(session), server.id)
+        if loaded is None:
+            # Пул ещё не создан - базе не с чем сверять, все пиры сервера считались бы лишними
+            return {"status": "no_pool", "live": len(live)}
+        desired, unsettled = loaded
+        started = time.monotonic()
+        diff = diff_peers(desired, live, unsettled, bot_managed)
+        result = {
+            "status": "in_sync" if diff.clean else "drift",
+            "live": len(live),
+            "desired": len(desired),
+            "diff_ms": round((time.monotonic() - started) * 1000, 2),
+            "diff": diff.to_dict(),
+        }
+        self.servers_checked += 1
+        if diff.clean:
+            return result
+        self.servers_drifted += 1
+        logger.warning(
+            f"Пиры сервера id={server.id} расходятся с базой: добавить {len(diff.to_add)}, "
+            f"удалить {len(diff.to_remove)}, не восстановить {len(diff.unrepairable)}"
+        )
+        if dry_run or not (diff.to_add or diff.to_remove):
+            return result
+        if not force and len(diff.to_remove) > max(PEER_RECONCILE_REMOVE_GUARD_MIN, len(live) * PEER_RECONCILE_MAX_REMOVE_FRACTION):
+            self.guarded += 1
+            logger.error(f"Сверка сервера id={server.id} не применена: удалить нужно {len(diff.to_remove)} из {len(live)} пиров")
+            result["status"] = "guarded"
+            return result
+        async with async_session() as session:
+            repo = IpPoolRepository(session)
+            # До конца применения отметки удаления на этом сервере (mark_releasing) ждут: отзыв,
+            # начатый после перечитывания базы, снимет пира уже после нас, а не до
+            await repo.lock_peer_changes(server.id)
+            current, unsettled = await self._desired(repo, server.id) or ({}, set())
+            # Ключ могли отозвать или начать удалять, пока шла сверка, - ставим только то, что выдано и сейчас
+            to_add = [peer for peer in diff.to_add if peer["public_key"] in current and peer["public_key"] not in unsettled]
+            to_remove = [public_key for public_key in diff.to_remove if public_key not in unsettled]
+            applied = not (to_add or to_remove) or await service.reconcile_peers(server, to_add, to_remove)
+            await session.commit()
+        if not applied:
+            raise RuntimeError("горячее применение не выполнено")
+        self.peers_added += len(to_add)
+        self.peers_removed += len(to_remove)
+        logger.info(f"Сверка сервера id={server.id} применена: добавлено {len(to_add)}, удалено {len(to_remove)}")
+        result["status"] = "applied"
+        return result
+
+    async def reconcile_all(self, dry_run: bool = True) -> FleetReport:
+        servers = await fleet_executor.active_servers()
+        return await fleet_executor.run(
+            servers,
+            lambda server: self.reconcile_server(server, dry_run=dry_run),
+            concurrency=PEER_RECONCILE_CONCURRENCY,
+        )
+
+    async def run_once(self) -> bool:
+        started = time.monotonic()
+        async with engine.connect() as lock_conn:
+            locked = (await lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": PEER_RECONCILE_LOCK_KEY})).scalar()
+            if not locked:
+                # Сверкой уже занимается другой воркер
+                self.skipped_runs += 1
+                return False
+            try:
+                report = await self.reconcile_all(dry_run=PEER_RECONCILE_MODE != "apply")
+            finally:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PEER_RECONCILE_LOCK_KEY})
+        self.failures += len(report.failed)
+        self.runs += 1
+        self.last_run_at = time.time()
+        self.last_run_seconds = round(time.monotonic() - started, 3)
+        return True
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(PEER_RECONCILE_INTERVAL)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception(f"Ошибка сверки пиров: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "mode": PEER_RECONCILE_MODE,
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "servers_checked": self.servers_checked,
+            "servers_drifted": self.servers_drifted,
+            "peers_added": self.peers_added,
+            "peers_removed": self.peers_removed,
+            "guarded": self.guarded,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at,
+            "last_run_seconds": self.last_run_seconds,
+        }
+
+
+peer_reconciler = PeerReconciler()
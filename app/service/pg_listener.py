@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, List, Optional
+
+import asyncpg
+
+from database.database import engine
+
+logger = logging.getLogger(__name__)
+
+PG_LISTENER_RECONNECT_DELAY = float(os.getenv("PG_LISTENER_RECONNECT_DELAY", "5"))
+
+# Обработчик уведомления: получает payload из pg_notify
+NotifyHandler = Callable[[str], None]
+
+
+def listener_dsn() -> str:
+    # Отдельное соединение asyncpg вне пула SQLAlchemy: LISTEN держит его всё время работы
+    return engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class PgListener:
+    """
+    Одно соединение LISTEN на воркер для всех каналов NOTIFY (цены, ключи пользователей).
+    После (пере)подключения вызываются обработчики on_connect: уведомления, пришедшие,
+    пока соединения не было, потеряны, и кэши должны перечитать или сбросить данные.
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, NotifyHandler] = {}
+        self._on_connect: List[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+        self.notifications = 0
+        self.reconnects = 0
+
+    def add_channel(self, channel: str, handler: NotifyHandler, on_connect: Optional[Callable[[], None]] = None):
+        """Регистрирует канал до start()"""
+        self._handlers[channel] = handler
+        if on_connect is not None:
+            self._on_connect.append(on_connect)
+
+    def _dispatch(self, connection, pid, channel, payload):
+        self.notifications += 1
+        handler = self._handlers.get(channel)
+        if handler is None:
+            return
+        try:
+            handler(payload)
+        except Exception as e:
+            logger.exception(f"Ошибка обработчика NOTIFY {channel}: {e}")
+
+    async def _listen(self):
+        conn = await asyncpg.connect(listener_dsn())
+        closed = asyncio.Event()
+        conn.add_termination_listener(lambda _: closed.set())
+        try:
+            for channel in self._handlers:
+                await conn.add_listener(channel, self._dispatch)
+            self.connected = True
+            for on_connect in self._on_connect:
+                on_connect()
+            await closed.wait()
+        finally:
+            self.connected = False
+            if not conn.is_closed():
+                await conn.close()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self._listen()
+                logger.warning("Соединение LISTEN закрыто, переподключаемся")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка соединения LISTEN: {e}")
+            self.reconnects += 1
+            await asyncio.sleep(PG_LISTENER_RECONNECT_DELAY)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "channels": sorted(self._handlers),
+            "connected": self.connected,
+            "notifications": self.notifications,
+            "reconnects": self.reconnects,
+        }
+
+
+pg_listener = PgListener()
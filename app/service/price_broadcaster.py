@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Set, Tuple
+
+# Очередь подписчика: при переполнении выбрасывается самое старое обновление -
+# медленному клиенту всё равно нужна только последняя версия цен
+PRICE_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("PRICE_SUBSCRIBER_QUEUE_SIZE", "4"))
+
+
+class PriceSubscription:
+    """Очередь обновлений одного подписчика SubscribeToPrices"""
+
+    def __init__(self, maxsize: int):
+        self.queue: "asyncio.Queue[Tuple[int, bytes]]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.delivered_version = 0
+
+    def put(self, version: int, payload: bytes):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((version, payload))
+
+    async def get(self) -> bytes:
+        version, payload = await self.queue.get()
+        self.delivered_version = version
+        return payload
+
+
+class PriceBroadcaster:
+    """
+    Раздача изменений цен всем подписчикам SubscribeToPrices. Новую версию публикует
+    PriceCache (по NOTIFY от триггера на subscription_plans) уже сериализованной в
+    PriceList - подписчики получают ссылку на одни и те же байты.
+    """
+
+    def __init__(self, queue_size: int = PRICE_SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[PriceSubscription] = set()
+        self._snapshot: Optional[bytes] = None
+        self._version = 0
+        self.published = 0
+        self.dropped_total = 0
+        self.last_published_at: Optional[float] = None
+
+    @property
+    def snapshot(self) -> Optional[bytes]:
+        return self._snapshot
+
+    def publish(self, payload: bytes):
+        """Рассылает новую версию цен: одна ссылка на байты в очередь каждого подписчика"""
+        if payload == self._snapshot:
+            return
+        self._snapshot = payload
+        self._version += 1
+        self.published += 1
+        self.last_published_at = time.time()
+        for subscription in self._subscribers:
+            dropped = subscription.dropped
+            subscription.put(self._version, payload)
+            self.dropped_total += subscription.dropped - dropped
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """Подписка на цены: первым элементом очереди идёт текущий снимок (если уже загружен)"""
+        subscription = PriceSubscription(self.queue_size)
+        if self._snapshot is not None:
+            subscription.put(self._version, self._snapshot)
+        self._subscribers.add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._subscribers.discard(subscription)
+
+    def stats(self) -> dict:
+        lags = [self._version - subscription.delivered_version for subscription in self._subscribers]
+        return {
+            "pid": os.getpid(),
+            "subscribers": len(self._subscribers),
+            "version": self._version,
+            "published": self.published,
+            "dropped_total": self.dropped_total,
+            "max_lag_versions": max(lags) if lags else 0,
+            "lagging_subscribers": sum(1 for lag in lags if lag > 0),
+            "queued_updates": sum(subscription.queue.qsize() for subscription in self._subscribers),
+            "last_published_at": self.last_published_at,
+        }
+
+
+price_broadcaster = PriceBroadcaster()
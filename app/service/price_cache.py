@@ -0,0 +1,134 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from database.database import async_session
+from pb import telegram_bot_service_pb2 as pb2
+from service.pg_listener import pg_listener
+from service.price_broadcaster import price_broadcaster
+from service.subscription_service import SubscriptionService
+
+logger = logging.getLogger(__name__)
+
+# Канал NOTIFY, в который пишет триггер на subscription_plans (см. SCHEMA_PATCHES в database.py)
+PRICES_CHANNEL = "subscription_plans_changed"
+# Пока LISTEN не подключён, об изменениях мы не узнаем - кэш живёт не дольше этого срока
+PRICE_CACHE_FALLBACK_TTL = float(os.getenv("PRICE_CACHE_FALLBACK_TTL", "30"))
+PRICE_RELOAD_RETRY_DELAY = float(os.getenv("PRICE_RELOAD_RETRY_DELAY", "5"))
+
+
+class PriceEntry:
+    """Список цен, сериализованный один раз: PriceList для gRPC и JSON для REST"""
+
+    __slots__ = ("proto", "json", "version", "loaded_at")
+
+    def __init__(self, prices: list, version: int):
+        self.proto = pb2.PriceList(plans=[pb2.SubscriptionPlan(**price) for price in prices]).SerializeToString()
+        self.json = json.dumps({"plans": prices}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+
+class PriceCache:
+    """
+    Read-through кэш активных тарифов. Сбрасывается по NOTIFY от триггера на
+    subscription_plans, поэтому GetPrices и GET /prices отдают готовые байты без
+    обращения к базе. Новая версия цен сразу уходит подписчикам SubscribeToPrices.
+    """
+
+    def __init__(self):
+        self._entry: Optional[PriceEntry] = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._reload_event = asyncio.Event()
+        self.hits = 0
+        self.loads = 0
+        self.notifications = 0
+        pg_listener.add_channel(PRICES_CHANNEL, self._on_notify, on_connect=self._reload_event.set)
+
+    def _fresh(self, entry: Optional[PriceEntry]) -> bool:
+        if entry is None:
+            return False
+        return pg_listener.connected or time.monotonic() - entry.loaded_at < PRICE_CACHE_FALLBACK_TTL
+
+    async def _load(self) -> PriceEntry:
+        async with async_session() as session:
+            prices = await SubscriptionService(session).get_prices()
+        self.loads += 1
+        entry = PriceEntry(prices, self._version)
+        if self._entry is None or self._entry.proto != entry.proto:
+            # Правка, не затрагивающая цены (например, описания тарифа), версию не двигает
+            self._version += 1
+            entry.version = self._version
+        self._entry = entry
+        price_broadcaster.publish(entry.proto)
+        return entry
+
+    async def get(self) -> PriceEntry:
+        entry = self._entry
+        if self._fresh(entry):
+            self.hits += 1
+            return entry
+        # Параллельные промахи ждут одну загрузку
+        async with self._lock:
+            entry = self._entry
+            if self._fresh(entry):
+                self.hits += 1
+                return entry
+            return await self._load()
+
+    async def reload(self) -> PriceEntry:
+        async with self._lock:
+            return await self._load()
+
+    def _on_notify(self, payload: str):
+        self.notifications += 1
+        # Пачка изменений в одной транзакции даёт одно перечитывание
+        self._reload_event.set()
+
+    async def _loop(self):
+        # Перечитываем по NOTIFY и после (пере)подключения LISTEN: пока соединения не было,
+        # уведомления могли пропустить
+        while True:
+            await self._reload_event.wait()
+            self._reload_event.clear()
+            try:
+                await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка перечитывания цен: {e}")
+                # Без повтора кэш так и остался бы со старыми ценами при живом LISTEN
+                await asyncio.sleep(PRICE_RELOAD_RETRY_DELAY)
+                self._reload_event.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "version": self._entry.version if self._entry else None,
+            "hits": self.hits,
+            "loads": self.loads,
+            "notifications": self.notifications,
+            "listener_connected": pg_listener.connected,
+            "reconnects": pg_listener.reconnects,
+        }
+
+
+price_cache = PriceCache()
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from database.database import async_session, engine
+from models.server_models import SSHServerConfig
+from repositories.ip_pool_repo import IpPoolRepository
+from repositories.server_load_repo import ServerLoadRepository
+from repositories.server_repo import ServerRepository
+from service.fleet import fleet_executor
+from service.server_service import ServerService
+from service.ssh_admission import AdmissionRejected
+
+logger = logging.getLogger(__name__)
+
+SERVER_PLACEMENT_ENABLED = os.getenv("SERVER_PLACEMENT_ENABLED", "1").lower() in ("1", "true", "yes")
+# Период опроса серверов; placement читает только снимок в памяти
+SERVER_LOAD_REFRESH_INTERVAL = float(os.getenv("SERVER_LOAD_REFRESH_INTERVAL", "30"))
+# Результат опроса старше этого срока (опрашивающий воркер пропал) - сервер считается недоступным
+SERVER_LOAD_STALE_AFTER = float(os.getenv("SERVER_LOAD_STALE_AFTER", str(SERVER_LOAD_REFRESH_INTERVAL * 3)))
+# Сколько серверов опрашивать одновременно
+SERVER_LOAD_PROBE_CONCURRENCY = int(os.getenv("SERVER_LOAD_PROBE_CONCURRENCY", "16"))
+# Пир считается активным, если handshake был не раньше, чем столько секунд назад
+SERVER_LOAD_HANDSHAKE_WINDOW = int(os.getenv("SERVER_LOAD_HANDSHAKE_WINDOW", "180"))
+# Веса оценки: активный клиент, установленный пир, миллисекунда задержки SSH
+SERVER_LOAD_HANDSHAKE_WEIGHT = float(os.getenv("SERVER_LOAD_HANDSHAKE_WEIGHT", "1.0"))
+SERVER_LOAD_PEER_WEIGHT = float(os.getenv("SERVER_LOAD_PEER_WEIGHT", "0.1"))
+SERVER_LOAD_LATENCY_WEIGHT = float(os.getenv("SERVER_LOAD_LATENCY_WEIGHT", "0.02"))
+# Ключ advisory-блокировки Postgres: серверы по SSH опрашивает только один воркер одновременно
+SERVER_LOAD_LOCK_KEY = 7301005
+
+
+class ServerSignals:
+    """Снимок нагрузки одного сервера"""
+
+    __slots__ = (
+        "server_id", "location", "peers", "recent_handshakes", "free_ips",
+        "ssh_latency", "reachable", "overloaded", "placed", "refreshed_at",
+    )
+
+    def __init__(self, server: SSHServerConfig):
+        self.server_id = server.id
+        self.location = (server.location or "").lower() or None
+        self.peers = 0
+        self.recent_handshakes = 0
+        self.free_ips: Optional[int] = None
+        self.ssh_latency: Optional[float] = None
+        self.reachable = False
+        self.overloaded = False
+        # Ключи, выданные этим воркером после опроса: следующий запрос видит их сразу, а не через интервал
+        self.placed = 0
+        self.refreshed_at = 0.0
+
+    def available(self) -> bool:
+        # free_ips is None - пул адресов ещё не создан, он создастся при первой выдаче
+        return self.reachable and not self.overloaded and (self.free_ips is None or self.free_ips > self.placed)
+
+    def score(self) -> float:
+        latency_ms = (self.ssh_latency or 0.0) * 1000
+        return (
+            (self.recent_handshakes + self.placed) * SERVER_LOAD_HANDSHAKE_WEIGHT
+            + (self.peers + self.placed) * SERVER_LOAD_PEER_WEIGHT
+            + latency_ms * SERVER_LOAD_LATENCY_WEIGHT
+        )
+
+    def to_row(self) -> dict:
+        return {
+            "server_id": self.server_id,
+            "peers": self.peers,
+            "recent_handshakes": self.recent_handshakes,
+            "ssh_latency": self.ssh_latency,
+            "reachable": self.reachable,
+            "overloaded": self.overloaded,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "server_id": self.server_id,
+            "location": self.location,
+            "peers": self.peers,
+            "recent_handshakes": self.recent_handshakes,
+            "free_ips": self.free_ips,
+            "ssh_latency_ms": round(self.ssh_latency * 1000, 1) if self.ssh_latency is not None else None,
+            "reachable": self.reachable,
+            "overloaded": self.overloaded,
+            "placed": self.placed,
+            "score": round(self.score(), 3),
+        }
+
+
+class ServerLoadMonitor:
+    """
+    Фоновый опрос активных серверов для выбора наименее загруженного под новый ключ:
+    число пиров и активных клиентов (по `wg show dump`), свободные адреса пула и
+    задержка SSH. По SSH серверы опрашивает один воркер (advisory-блокировка) и пишет
+    результат в server_load, остальные воркеры берут снимок оттуда. Выбор сервера -
+    проход по снимку в памяти, без запросов к базе и SSH.
+    """
+
+    def __init__(self):
+        self._signals: Dict[int, ServerSignals] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_lock = asyncio.Lock()
+        self._loaded = False
+        self.refreshes = 0
+        self.probes = 0
+        self.skipped_probes = 0
+        self.probe_failures = 0
+        self.placements = 0
+        self.last_refresh_at: Optional[float] = None
+        self.last_refresh_seconds: Optional[float] = None
+
+    async def _probe(self, service: ServerService, server: SSHServerConfig, signals: ServerSignals, previous):
+        started = time.monotonic()
+        try:
+            peers = await service.show_peers(server)
+        except AdmissionRejected:
+            # Сервер занят выдачей ключей - сам по себе сигнал не направлять туда новых
+            if previous is not None:
+                signals.peers, signals.recent_handshakes = previous.peers, previous.recent_handshakes
+                signals.ssh_latency = previous.ssh_latency
+            signals.reachable = True
+            signals.overloaded = True
+            return
+        if peers is None:
+            self.probe_failures += 1
+            return
+        signals.ssh_latency = time.monotonic() - started
+        signals.reachable = True
+        signals.peers = len(peers)
+        active_since = time.time() - SERVER_LOAD_HANDSHAKE_WINDOW
+        signals.recent_handshakes = sum(1 for peer in peers if peer["latest_handshake"] >= active_since)
+
+    async def _probe_all(self) -> bool:
+        async with engine.connect() as lock_conn:
+            locked = (await lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SERVER_LOAD_LOCK_KEY})).scalar()
+            if not locked:
+                # Серверы уже опрашивает другой воркер
+                self.skipped_probes += 1
+                return False
+            try:
+                async with async_session() as session:
+                    servers = await ServerRepository(session).get_active_servers()
+                    previous = await ServerLoadRepository(session).get_all()
+                    # Опрос параллельный, но только по SSH: к сессии ServerService в нём не обращается
+                    service = ServerService(session)
+                    signals = {server.id: ServerSignals(server) for server in servers}
+                    # Не ответивший за FLEET_NODE_TIMEOUT сервер считается недоступным до следующего опроса
+                    report = await fleet_executor.run(
+                        servers,
+                        lambda server: self._probe(service, server, signals[server.id], previous.get(server.id)),
+                        concurrency=SERVER_LOAD_PROBE_CONCURRENCY,
+                    )
+                    self.probe_failures += sum(1 for result in report.failed if result.timed_out)
+                    await ServerLoadRepository(session).save_many([item.to_row() for item in signals.values()])
+            finally:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SERVER_LOAD_LOCK_KEY})
+        self.probes += 1
+        return True
+
+    async def refresh(self):
+        async with self._refresh_lock:
+            started = time.monotonic()
+            await self._probe_all()
+            async with async_session() as session:
+                servers = await ServerRepository(session).get_active_servers()
+                usage = await IpPoolRepository(session).get_usage_all()
+                loads = await ServerLoadRepository(session).get_all()
+            stale_before = datetime.utcnow() - timedelta(seconds=SERVER_LOAD_STALE_AFTER)
+            now = time.monotonic()
+            signals = {}
+            for server in servers:
+                item = ServerSignals(server)
+                if server.id in usage:
+                    item.free_ips = usage[server.id]["free"]
+                load = loads.get(server.id)
+                if load is not None and load.probed_at >= stale_before:
+                    item.peers, item.recent_handshakes = load.peers, load.recent_handshakes
+                    item.ssh_latency, item.reachable, item.overloaded = load.ssh_latency, load.reachable, load.overloaded
+                item.refreshed_at = now
+                signals[server.id] = item
+            self._signals = signals
+            # Пока опрашивающий воркер не записал ни одного результата, следующий выбор снова перечитает базу
+            self._loaded = bool(loads)
+            self.refreshes += 1
+            self.last_refresh_at = time.time()
+            self.last_refresh_seconds = round(now - started, 3)
+
+    def _pick(self, location: Optional[str], exclude: Iterable[int]) -> Optional[ServerSignals]:
+        location = location.lower() if location else None
+        excluded = set(exclude)
+        best: Optional[ServerSignals] = None
+        best_score = 0.0
+        for item in self._signals.values():
+            if item.server_id in excluded or not item.available():
+                continue
+            if location is not None and item.location != location:
+                continue
+            score = item.score()
+            if best is None or score < best_score:
+                best, best_score = item, score
+        return best
+
+    async def place(self, location: Optional[str] = None, exclude: Iterable[int] = ()) -> Optional[ServerSignals]:
+        """Наименее загруженный доступный сервер (с учётом location); None - подходящих нет"""
+        if not self._loaded:
+            # Первый выбор до первого опроса ждёт его, дальше - только снимок
+            await self.refresh()
+        best = self._pick(location, exclude)
+        if best is not None:
+            best.placed += 1
+            self.placements += 1
+        return best
+
+    def snapshot(self) -> List[ServerSignals]:
+        return list(self._signals.values())
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.exception(f"Ошибка опроса нагрузки серверов: {e}")
+            await asyncio.sleep(SERVER_LOAD_REFRESH_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "refreshes": self.refreshes,
+            "probes": self.probes,
+            "skipped_probes": self.skipped_probes,
+            "probe_failures": self.probe_failures,
+            "placements": self.placements,
+            "last_refresh_at": self.last_refresh_at,
+            "last_refresh_seconds": self.last_refresh_seconds,
+            "servers": [item.to_dict() for item in sorted(self._signals.values(), key=lambda item: item.score())],
+        }
+
+
+server_load_monitor = ServerLoadMonitor()
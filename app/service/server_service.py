@@ -1,38 +1,98 @@
+import asyncio
 import logging
-import asyncssh
 from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import async_session
 from repositories.server_repo import ServerRepository
+from repositories.ip_pool_repo import IpPoolRepository
+from repositories.peer_pool_repo import PeerPoolRepository
 from models.server_models import SSHServerConfig
 from typing import Optional
-from service.awg_utils import encode_vpn_conf
+from service.awg_utils import endpoint_hosts
+from service.dns_resolver import dns_resolver
+from service.vpn_encoder import vpn_encoder
+from service.ssh_pool import ssh_pool
+from service.metrics import SSH_COMMAND_DURATION
+from service.ssh_admission import AdmissionRejected, ssh_admission
+from service.peer_install_batcher import peer_install_batcher
+from service.keypair_generator import keypair_generator
+from service.wg_keys import public_key_from_private
+from service.wg_hotapply import (
+    HOT_APPLY_COMMAND,
+    build_add_peers_script,
+    build_bot_peers_script,
+    build_reconcile_script,
+    build_remove_peers_script,
+    build_show_dump_command,
+    parse_bot_peers,
+    parse_wg_dump,
+)
+from service.awg_provision import (
+    DEFAULT_WG_CONFIG_FILE,
+    build_provision_command,
+    format_awg_params,
+    parse_interface_params,
+    parse_peers,
+    parse_provision_output,
+)
 import time
 import subprocess
 import base64
 import re
+import os
 
 logger = logging.getLogger(__name__)
 
+# Режим получения параметров интерфейса: 'batch' - скрипт с ответом в JSON, 'stepwise' - чтение wg0.conf целиком
+PROVISION_MODE = os.getenv("AWG_PROVISION_MODE", "batch")
+# Сколько секунд держать в памяти ListenPort и параметры AWG сервера
+INTERFACE_PARAMS_TTL = float(os.getenv("AWG_INTERFACE_PARAMS_TTL", "300"))
+# Сколько готовых пиров держать на каждом сервере (0 - пул выключен), см. service/peer_pool.py
+PEER_POOL_DEPTH = int(os.getenv("PEER_POOL_DEPTH", "0"))
+# Переопределение глубины пула для отдельных серверов: "1:50,2:10"
+PEER_POOL_DEPTH_OVERRIDES = {
+    int(server_id): int(depth)
+    for server_id, depth in (
+        item.split(":") for item in os.getenv("PEER_POOL_DEPTH_OVERRIDES", "").split(",") if item.strip()
+    )
+}
+
+
+def peer_pool_depth(server_id: int) -> int:
+    return PEER_POOL_DEPTH_OVERRIDES.get(server_id, PEER_POOL_DEPTH)
+
 class ServerService:
+    # Серверы, на которых пакетный скрипт не сработал (общий для всех экземпляров сервиса)
+    _batch_unsupported = set()
+    # Кэш параметров интерфейса: server_id -> (время получения, параметры)
+    _interface_params = {}
+    # Идущие запросы параметров интерфейса и инициализации пула адресов:
+    # одновременные запросы к одному серверу ждут один вызов
+    _interface_params_loading = {}
+    _ip_pool_seeding = {}
+
     def __init__(self, db: AsyncSession):
         self.db = db
         self.repo = ServerRepository(db)
+        self.ip_repo = IpPoolRepository(db)
+        self.peer_pool_repo = PeerPoolRepository(db)
 
     async def add_server(self, schema) -> Optional[SSHServerConfig]:
         server = SSHServerConfig.from_schema(schema)
         # Получаем server.conf из контейнера
         wg_config_file = server.wg_config_file or "/opt/amnezia/awg/wg0.conf"
         get_conf_cmd = f"docker exec -i amnezia-awg cat {wg_config_file}"
-        conf_text = await self._run_ssh_command(server, get_conf_cmd)
+        conf_text = await self._run_ssh_command(server, get_conf_cmd, kind="read_conf")
         server_public_key = None
         listen_port = None
         if conf_text:
             m = re.search(r"^PrivateKey\s*=\s*(.+)$", conf_text, re.MULTILINE)
             if m:
                 private_key = m.group(1).strip()
-                pubkey_cmd = f"echo '{private_key}' | docker exec -i amnezia-awg wg pubkey"
-                pubkey = await self._run_ssh_command(server, pubkey_cmd)
-                if pubkey:
-                    server_public_key = pubkey.strip()
+                # Публичный ключ сервера считаем локально, отдельный вызов `wg pubkey` не нужен
+                try:
+                    server_public_key = public_key_from_private(private_key)
+                except ValueError as e:
+                    logger.error(f"Некорректный PrivateKey в конфиге сервера: {e}")
             m_port = re.search(r"^ListenPort\s*=\s*(\d+)$", conf_text, re.MULTILINE)
             if m_port:
                 listen_port = m_port.group(1).strip()
@@ -44,90 +104,308 @@ class ServerService:
         logger.info(f"Добавлен новый сервер: {server}")
         return server
 
-    async def _run_ssh_command(self, server: SSHServerConfig, command: str) -> Optional[str]:
-        logger.info(f"Попытка подключения к серверу {server.host}:{server.port} как {server.username} для выполнения команды: {command}")
-        try:
-            conn_params = {
-                'host': server.host,
-                'port': server.port,
-                'username': server.username,
-                'known_hosts': None
-            }
-            if server.auth_type == 'password':
-                conn_params['password'] = server.password
-            elif server.auth_type == 'key':
-                conn_params['client_keys'] = [server.key_path]
-            else:
-                logger.error(f"Неизвестный тип аутентификации: {server.auth_type}")
-                raise ValueError('Unknown auth_type')
-            async with asyncssh.connect(**conn_params) as conn:
-                logger.info(f"Успешное SSH-подключение к {server.host}:{server.port}")
-                result = await conn.run(command, check=True)
+    async def _run_ssh_command(self, server: SSHServerConfig, command: str, input: Optional[str] = None,
+                               kind: str = "other") -> Optional[str]:
+        # kind - тип команды для метрики ssh_command_duration_seconds (read_conf, add_peers, remove_peers, provision).
+        # При перегрузке сервера выбрасывает AdmissionRejected (HTTP 429), а не возвращает None
+        async with ssh_admission.admit(server.id):
+            logger.info(f"Выполнение команды на сервере {server.host}:{server.port} как {server.username}: {command}")
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                # Соединение берётся из пула, повторный handshake на каждую команду не нужен
+                result = await ssh_pool.run(server, command, input=input, check=True)
                 if result.stderr:
                     logger.error(f"Ошибка при выполнении команды на сервере {server.host}: {result.stderr}")
                     raise Exception(f'SSH error: {result.stderr}')
                 logger.info(f"Команда '{command}' успешно выполнена на сервере {server.host}")
+                outcome = "ok"
                 return result.stdout.strip()
-        except Exception as e:
-            logger.exception(f"Ошибка SSH при работе с сервером {server.host}: {e}")
+            except Exception as e:
+                logger.exception(f"Ошибка SSH при работе с сервером {server.host}: {e}")
+                return None
+            finally:
+                # У сервера, ещё не сохранённого в базе (add_server), id нет
+                SSH_COMMAND_DURATION.labels(
+                    str(server.id) if server.id is not None else "new", kind, outcome,
+                ).observe(time.perf_counter() - started)
+
+    @staticmethod
+    async def _single_flight(loading: dict, server_id: int, load):
+        """
+        Одновременные вызовы для одного сервера получают результат (или исключение) одного load().
+        load() идёт отдельной задачей и не должен пользоваться сессией вызывающего: отмена
+        запроса, начавшего загрузку, не отменяет её для остальных
+        """
+        task = loading.get(server_id)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            loading[server_id] = task
+            task.add_done_callback(lambda done: ServerService._forget_loading(loading, server_id, done))
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _forget_loading(loading: dict, server_id: int, task: asyncio.Future):
+        if loading.get(server_id) is task:
+            del loading[server_id]
+        # Все ожидавшие могли быть отменены - исключение забираем, чтобы asyncio не предупреждал о непрочитанном
+        if not task.cancelled():
+            task.exception()
+
+    async def _seed_ip_pool(self, server: SSHServerConfig) -> bool:
+        # Пул создаётся один раз: занятые адреса берём из пиров текущего wg0.conf
+        wg_config_file = server.wg_config_file or DEFAULT_WG_CONFIG_FILE
+        conf_text = await self._run_ssh_command(server, f"docker exec -i amnezia-awg cat {wg_config_file}", kind="read_conf")
+        if conf_text is None:
+            logger.error(f"Не удалось прочитать wg0.conf сервера id={server.id} для инициализации пула адресов")
+            return False
+        existing = parse_peers(conf_text)
+        # Своя сессия: создание пула переживает отмену запроса, который его начал (см. _single_flight)
+        async with async_session() as session:
+            await IpPoolRepository(session).ensure_pool(server.id, existing=existing)
+        logger.info(f"Создан пул адресов для сервера id={server.id}, занято адресов: {len(existing)}")
+        return True
+
+    async def _reserve_client_ips(self, server: SSHServerConfig, peers: list) -> list:
+        addresses = await self.ip_repo.reserve_many(server.id, peers)
+        if len(addresses) < len(peers):
+            # Пул мог создать параллельный запрос уже после нашей попытки - тогда просто повторяем
+            if not await self.ip_repo.get_pool(server.id):
+                # Соединение сессии отдаём в пул до ожидания: пул создаётся в своей сессии,
+                # и под всплеском ожидающие иначе разобрали бы все соединения
+                await self.db.commit()
+                seeded = await self._single_flight(self._ip_pool_seeding, server.id, lambda: self._seed_ip_pool(server))
+                if not seeded:
+                    return addresses
+            addresses += await self.ip_repo.reserve_many(server.id, peers[len(addresses):])
+        return addresses
+
+    async def install_peers(self, server: SSHServerConfig, peers: list) -> bool:
+        # Одновременные установки на один сервер склеиваются в одно применение
+        return await peer_install_batcher.install(server, peers, self._apply_add_peers, rollback=self._rollback_install)
+
+    async def _rollback_install(self, server: SSHServerConfig, peers: list, installed: bool):
+        # Запрос отменён (клиент отключился) - ни пиров, ни адресов больше никто не запишет.
+        # Сессия запроса к этому моменту может быть уже закрыта, адреса возвращаем в своей
+        public_keys = [peer["public_key"] for peer in peers]
+        async with async_session() as session:
+            if installed:
+                if await ServerService(session).remove_and_release(server, public_keys) is None:
+                    logger.error(f"Не удалось удалить с сервера id={server.id} пиры отменённого запроса: {len(public_keys)}")
+                    return
+            else:
+                await IpPoolRepository(session).release_many(server.id, public_keys)
+        logger.info(f"Запрос на установку {len(public_keys)} пиров на сервер id={server.id} отменён, адреса возвращены в пул")
+
+    async def _apply_add_peers(self, server: SSHServerConfig, peers: list) -> bool:
+        # Пиры добавляются в работающий интерфейс через `wg set`, без wg-quick down/up
+        script = build_add_peers_script(server.wg_config_file, peers)
+        output = await self._run_ssh_command(server, HOT_APPLY_COMMAND, input=script, kind="add_peers")
+        return output is not None
+
+    async def remove_peers(self, server: SSHServerConfig, public_keys: list) -> bool:
+        script = build_remove_peers_script(server.wg_config_file, public_keys)
+        output = await self._run_ssh_command(server, HOT_APPLY_COMMAND, input=script, kind="remove_peers")
+        return output is not None
+
+    async def remove_and_release(self, server: SSHServerConfig, public_keys: list) -> Optional[list]:
+        """
+        Удаляет пиров с сервера и освобождает их адреса. До удаления адреса отмечаются
+        как освобождаемые: сверка пиров не поставит их обратно, пока идёт SSH.
+        None - удалить не удалось, адреса остаются выданными
+        """
+        await self.ip_repo.mark_releasing(server.id, public_keys)
+        if not await self.remove_peers(server, public_keys):
+            await self.ip_repo.clear_releasing(server.id, public_keys)
             return None
+        return await self.ip_repo.release_many(server.id, public_keys)
 
-    def _generate_unique_client_ip(self) -> str:
-        # Простейшая генерация IP на основе времени (для демо, не для продакшена)
-        octet = 2 + int(time.time()) % 253
-        return f"10.8.1.{octet}/32"
+    async def reconcile_peers(self, server: SSHServerConfig, add_peers: list, remove_keys: list) -> bool:
+        """Удаление и добавление пиров одним вызовом (см. service/peer_reconciler.py)"""
+        script = build_reconcile_script(server.wg_config_file, add_peers, remove_keys)
+        output = await self._run_ssh_command(server, HOT_APPLY_COMMAND, input=script, kind="reconcile")
+        return output is not None
 
-    async def generate_wg_key_for_server(self, server_id: int) -> tuple:
-        logger.info(f"Запрос на генерацию AmneziaWG-ключа для сервера с id={server_id}")
+    async def show_peers(self, server: SSHServerConfig) -> Optional[list]:
+        """Пиры работающего интерфейса (`wg show dump`); None - если сервер не ответил"""
+        output = await self._run_ssh_command(server, build_show_dump_command(server.wg_config_file), kind="show_dump")
+        return parse_wg_dump(output) if output is not None else None
+
+    async def show_bot_peers(self, server: SSHServerConfig) -> Optional[set]:
+        """Ключи пиров, которыми управляет бот (см. build_bot_peers_script); None - если сервер не ответил"""
+        output = await self._run_ssh_command(server, HOT_APPLY_COMMAND, input=build_bot_peers_script(server.wg_config_file), kind="bot_peers")
+        return parse_bot_peers(output) if output is not None else None
+
+    async def revoke_peer(self, server_id: int, public_key: str) -> Optional[str]:
         server = await self.repo.get_server_by_id(server_id)
         if not server:
             logger.error(f"Сервер с id={server_id} не найден в базе данных")
-            return None, None
-        # 1. Генерируем приватный ключ внутри контейнера
-        private_key = await self._run_ssh_command(server, "docker exec -i amnezia-awg wg genkey")
-        logger.info(f"Сгенерированный приватный ключ: {private_key}")
-        if not private_key:
-            logger.error("Не удалось сгенерировать приватный ключ внутри контейнера")
-            return None, None
-        # 2. Генерируем публичный ключ внутри контейнера
-        public_key = await self._run_ssh_command(server, f"echo '{private_key}' | docker exec -i amnezia-awg wg pubkey")
-        logger.info(f"Сгенерированный публичный ключ клиента: {public_key}")
-        if not public_key:
-            logger.error("Не удалось сгенерировать публичный ключ клиента внутри контейнера")
-            return None, None
-        # 3. Генерируем pre-shared key внутри контейнера
-        psk = await self._run_ssh_command(server, "docker exec -i amnezia-awg wg genpsk")
-        logger.info(f"Сгенерированный pre-shared key: {psk}")
-        if not psk:
-            logger.error("Не удалось сгенерировать pre-shared key внутри контейнера")
-            return None, None
-        # 4. Получаем публичный ключ сервера из базы
-        server_pubkey = server.server_public_key
-        logger.info(f"Публичный ключ сервера из базы: {server_pubkey}")
-        if not server_pubkey:
-            logger.error("Публичный ключ сервера отсутствует в базе. Проверьте этап добавления сервера!")
-            return None, None
-        # 5. Получаем ListenPort из wg0.conf внутри контейнера
-        wg_config_file = server.wg_config_file or "/opt/amnezia/awg/wg0.conf"
+            return None
+        # Сначала убираем пира с сервера, и только потом освобождаем адрес для повторной выдачи
+        addresses = await self.remove_and_release(server, [public_key])
+        if addresses is None:
+            logger.error(f"Не удалось удалить пира {public_key} с сервера id={server_id}")
+            return None
+        address = addresses[0] if addresses else None
+        if address:
+            logger.info(f"Адрес {address} на сервере id={server_id} освобождён (ключ {public_key})")
+        else:
+            logger.warning(f"Ключ {public_key} не найден среди выданных на сервере id={server_id}")
+        return address
+
+    async def revoke_peers(self, server_id: int, public_keys: list) -> Optional[list]:
+        """Удаляет пачку пиров с сервера одним вызовом и освобождает их адреса. None - при ошибке"""
+        server = await self.repo.get_server_by_id(server_id)
+        if not server:
+            logger.error(f"Сервер с id={server_id} не найден в базе данных")
+            return None
+        addresses = await self.remove_and_release(server, public_keys)
+        if addresses is None:
+            logger.error(f"Не удалось удалить {len(public_keys)} пиров с сервера id={server_id}")
+        return addresses
+
+    async def get_ip_pool_usage(self, server_id: int) -> Optional[dict]:
+        return await self.ip_repo.get_usage(server_id)
+
+    async def _provision_batch(self, server: SSHServerConfig) -> Optional[str]:
+        # Один вызов на сервер: ListenPort и параметры AWG одной строкой JSON
+        command, script = build_provision_command(server.wg_config_file)
+        return await self._run_ssh_command(server, command, input=script, kind="provision")
+
+    async def _provision_stepwise(self, server: SSHServerConfig) -> dict:
+        # Читаем wg0.conf целиком и разбираем на нашей стороне
+        wg_config_file = server.wg_config_file or DEFAULT_WG_CONFIG_FILE
         get_conf_cmd = f"docker exec -i amnezia-awg cat {wg_config_file}"
-        conf_text = await self._run_ssh_command(server, get_conf_cmd)
-        listen_port = None
-        if conf_text:
-            m = re.search(r"^ListenPort\s*=\s*(\d+)$", conf_text, re.MULTILINE)
-            if m:
-                listen_port = m.group(1).strip()
-        logger.info(f"ListenPort из wg0.conf: {listen_port}")
-        if not listen_port:
+        conf_text = await self._run_ssh_command(server, get_conf_cmd, kind="read_conf")
+        return parse_interface_params(conf_text)
+
+    async def _provision(self, server: SSHServerConfig) -> dict:
+        if PROVISION_MODE == "batch" and server.id not in self._batch_unsupported:
+            output = await self._provision_batch(server)
+            data = parse_provision_output(output)
+            if data:
+                return data
+            if output:
+                # Команда отработала, но ответ не тот - пакетный режим на этом сервере не поддерживается
+                logger.warning(f"Пакетный провижининг недоступен на сервере id={server.id}, переходим на пошаговый режим")
+                self._batch_unsupported.add(server.id)
+        return await self._provision_stepwise(server)
+
+    async def _get_interface_params(self, server: SSHServerConfig) -> dict:
+        # Параметры интерфейса меняются крайне редко, держим их в памяти процесса
+        cached = self._interface_params.get(server.id)
+        if cached and time.monotonic() - cached[0] < INTERFACE_PARAMS_TTL:
+            return cached[1]
+        params = await self._single_flight(self._interface_params_loading, server.id, lambda: self._provision(server))
+        if params.get("listen_port"):
+            self._interface_params[server.id] = (time.monotonic(), params)
+        return params
+
+    def _build_client_conf(self, server: SSHServerConfig, params: dict, private_key: str, psk: str, client_ip: str) -> str:
+        additional_params = format_awg_params(params["awg"])
+        return f"""[Interface]\nAddress = {client_ip}\nDNS = 1.1.1.1, 1.0.0.1\nPrivateKey = {private_key}\n{additional_params}\n[Peer]\nPublicKey = {server.server_public_key}\nPresharedKey = {psk}\nAllowedIPs = 0.0.0.0/0, ::/0\nEndpoint = {server.endpoint}\nPersistentKeepalive = 25\n"""
+
+    async def create_peers(self, server: SSHServerConfig, count: int) -> list:
+        """
+        Выпускает count новых клиентов сервера: ключи, адреса из пула, установка пиров
+        одним вызовом на сервер. Возвращает список словарей с ключами клиента,
+        адресом, .conf и AmneziaWG-ключом; при ошибке - пустой список.
+        """
+        # 1. Получаем публичный ключ сервера из базы
+        logger.info(f"Публичный ключ сервера из базы: {server.server_public_key}")
+        if not server.server_public_key:
+            logger.error("Публичный ключ сервера отсутствует в базе. Проверьте этап добавления сервера!")
+            return []
+        # 2. ListenPort и параметры AWG (из кэша или одним вызовом на сервер)
+        params = await self._get_interface_params(server)
+        logger.info(f"ListenPort из wg0.conf: {params['listen_port']}")
+        if not params["listen_port"]:
             logger.error("Не удалось получить ListenPort из wg0.conf!")
-            return None, None
-        # 6. Формируем endpoint строго как в референсе
-        endpoint = server.endpoint
-        # 7. Формируем .conf-файл
-        client_ip = self._generate_unique_client_ip()
-        additional_params = "Jc = 2\nJmin = 10\nJmax = 50\nS1 = 91\nS2 = 149\nH1 = 96800746\nH2 = 55774911\nH3 = 440992545\nH4 = 1000889014"
-        conf = f"""[Interface]\nAddress = {client_ip}\nDNS = 1.1.1.1, 1.0.0.1\nPrivateKey = {private_key}\n{additional_params}\n[Peer]\nPublicKey = {server_pubkey}\nPresharedKey = {psk}\nAllowedIPs = 0.0.0.0/0, ::/0\nEndpoint = {endpoint}\nPersistentKeepalive = 25\n"""
-        logger.info(f"Сгенерированный .conf-файл клиента:\n{conf}")
-        # 8. Кодируем в AmneziaWG-ключ
-        amneziawg_key = encode_vpn_conf(conf)
-        logger.info(f"AmneziaWG-ключ успешно сгенерирован для сервера id={server_id}")
-        return amneziawg_key, conf
+            return []
+        # Имя из Endpoint разрешаем до выдачи адресов: при сбое DNS ничего не ставим на сервер,
+        # а при кодировании ключей адрес уже будет в кэше резолвера
+        resolved = await dns_resolver.resolve_many(endpoint_hosts(f"Endpoint = {server.endpoint}"))
+        if not all(resolved.values()):
+            logger.error(f"Не удалось разрешить DNS-имя в endpoint сервера id={server.id}: {server.endpoint}")
+            return []
+        # 3. Генерируем ключи клиентов локально, без обращения к серверу
+        # Пачка ключей считается в своём пуле потоков, чтобы не задерживать другие запросы
+        keys = await keypair_generator.generate_many(count)
+        # 4. Выдаём клиентам адреса из пула сервера
+        addresses = await self._reserve_client_ips(server, [(public_key, psk) for _, public_key, psk in keys])
+        if not addresses:
+            logger.error(f"Нет свободных адресов в пуле сервера id={server.id}")
+            return []
+        if len(addresses) < count:
+            logger.warning(f"Пул адресов сервера id={server.id} исчерпан: выдано {len(addresses)} из {count}")
+        keys = keys[:len(addresses)]
+        # 5. Устанавливаем пиров на сервер одним вызовом, без перезапуска интерфейса
+        peers = [
+            {"public_key": public_key, "preshared_key": psk, "allowed_ips": address}
+            for (_, public_key, psk), address in zip(keys, addresses)
+        ]
+        try:
+            installed = await self.install_peers(server, peers)
+        except AdmissionRejected:
+            # Сервер перегружен: адреса возвращаем, отказ уходит клиенту как 429
+            await self.ip_repo.release_many(server.id, [peer["public_key"] for peer in peers])
+            raise
+        if not installed:
+            logger.error(f"Не удалось установить пиров на сервер id={server.id}, адреса возвращаются в пул")
+            await self.ip_repo.release_many(server.id, [peer["public_key"] for peer in peers])
+            return []
+        # 6. Формируем .conf-файлы и кодируем в AmneziaWG-ключи
+        confs = [
+            self._build_client_conf(server, params, private_key, psk, address)
+            for (private_key, _, psk), address in zip(keys, addresses)
+        ]
+        encoded = await vpn_encoder.encode_many(confs)
+        result = []
+        for (private_key, public_key, psk), address, conf, amneziawg_key in zip(keys, addresses, confs, encoded):
+            result.append({
+                "private_key": private_key,
+                "public_key": public_key,
+                "preshared_key": psk,
+                "address": address,
+                "conf": conf,
+                "amneziawg_key": amneziawg_key,
+            })
+        logger.info(f"Выпущено клиентов для сервера id={server.id}: {len(result)}")
+        return result
+
+    async def _get_active_server(self, server_id: int) -> Optional[SSHServerConfig]:
+        server = await self.repo.get_server_by_id(server_id)
+        if not server:
+            logger.error(f"Сервер с id={server_id} не найден в базе данных")
+            return None
+        if not server.is_active:
+            logger.error(f"Сервер с id={server_id} отключён, ключи на нём не выдаются")
+            return None
+        return server
+
+    async def generate_wg_key_for_server(self, server_id: int) -> tuple:
+        logger.info(f"Запрос на генерацию AmneziaWG-ключа для сервера с id={server_id}")
+        # Сервер проверяем до выдачи из пула: отключённый сервер не должен раздавать готовые пиры
+        server = await self._get_active_server(server_id)
+        if not server:
+            return None, None, None
+        # Готовый заранее пир из пула - без обращения к серверу
+        if peer_pool_depth(server_id) > 0:
+            pooled = await self.peer_pool_repo.claim(server_id)
+            if pooled:
+                logger.info(f"AmneziaWG-ключ выдан из пула готовых пиров сервера id={server_id}")
+                return pooled.amneziawg_key, pooled.conf, pooled.public_key
+        peers = await self.create_peers(server, 1)
+        if not peers:
+            return None, None, None
+        peer = peers[0]
+        logger.info(f"AmneziaWG-ключ успешно сгенерирован для сервера id={server_id}, адрес {peer['address']}")
+        return peer["amneziawg_key"], peer["conf"], peer["public_key"]
+
+    async def generate_wg_keys_for_server(self, server_id: int, count: int) -> Optional[list]:
+        """Пакетная выдача: N адресов, N ключей, одна запись конфига и одно применение на сервере"""
+        logger.info(f"Запрос на пакетную генерацию {count} AmneziaWG-ключей для сервера с id={server_id}")
+        server = await self._get_active_server(server_id)
+        if not server:
+            return None
+        return await self.create_peers(server, count)
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from service.metrics import SSH_ADMISSION_REJECTED, SSH_ADMISSION_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Сколько удалённых операций одновременно выполняется на одном сервере (на воркер)
+SSH_ADMISSION_CONCURRENCY = int(os.getenv("SSH_ADMISSION_CONCURRENCY", "4"))
+# Сколько операций может ждать своей очереди; остальные сразу получают отказ
+SSH_ADMISSION_MAX_QUEUE = int(os.getenv("SSH_ADMISSION_MAX_QUEUE", "100"))
+# Сколько секунд операция готова ждать свободного слота
+SSH_ADMISSION_MAX_WAIT = float(os.getenv("SSH_ADMISSION_MAX_WAIT", "10"))
+# Сглаживание оценки длительности операции (EWMA) и её начальное значение
+SSH_ADMISSION_EWMA_ALPHA = float(os.getenv("SSH_ADMISSION_EWMA_ALPHA", "0.2"))
+SSH_ADMISSION_INITIAL_ESTIMATE = float(os.getenv("SSH_ADMISSION_INITIAL_ESTIMATE", "0.5"))
+
+
+class AdmissionRejected(Exception):
+    """Сервер перегружен: операция не дождётся слота до своего дедлайна"""
+
+    def __init__(self, server_id: int, reason: str, retry_after: int):
+        super().__init__(f"server {server_id} overloaded ({reason}), retry after {retry_after}s")
+        self.server_id = server_id
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ServerGate:
+    """Слоты и очередь одного сервера"""
+
+    def __init__(self, server_id: int):
+        self.server_id = server_id
+        self.slots = asyncio.Semaphore(SSH_ADMISSION_CONCURRENCY)
+        self.active = 0
+        self.waiting = 0
+        self.avg_hold = SSH_ADMISSION_INITIAL_ESTIMATE
+        self.admitted = 0
+        self.rejected = 0
+
+    def expected_wait(self) -> float:
+        # Ожидающие впереди разбираются волнами по SSH_ADMISSION_CONCURRENCY операций
+        if not self.slots.locked() and self.waiting == 0:
+            return 0.0
+        return (self.waiting // SSH_ADMISSION_CONCURRENCY + 1) * self.avg_hold
+
+    def observe_hold(self, seconds: float):
+        self.avg_hold += SSH_ADMISSION_EWMA_ALPHA * (seconds - self.avg_hold)
+
+    def stats(self) -> dict:
+        return {
+            "server_id": self.server_id,
+            "active": self.active,
+            "waiting": self.waiting,
+            "avg_hold_ms": round(self.avg_hold * 1000, 1),
+            "expected_wait_ms": round(self.expected_wait() * 1000, 1),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class SSHAdmissionController:
+    """
+    Допуск удалённых операций к серверу: не больше SSH_ADMISSION_CONCURRENCY одновременно,
+    остальные ждут в очереди. Операция, которая по оценке (длина очереди и средняя
+    длительность операции) не успеет до дедлайна, отклоняется сразу, а не после ожидания:
+    клиент получает 429 с Retry-After, а сервер - только ту нагрузку, которую успевает обработать.
+    """
+
+    def __init__(self):
+        self._gates: Dict[int, _ServerGate] = {}
+
+    def _gate(self, server_id: int) -> _ServerGate:
+        gate = self._gates.get(server_id)
+        if gate is None:
+            gate = _ServerGate(server_id)
+            self._gates[server_id] = gate
+        return gate
+
+    def _reject(self, gate: _ServerGate, reason: str, retry_after: float):
+        gate.rejected += 1
+        SSH_ADMISSION_REJECTED.labels(reason).inc()
+        logger.warning(f"Операция на сервере id={gate.server_id} отклонена ({reason}): очередь {gate.waiting}, активно {gate.active}")
+        raise AdmissionRejected(gate.server_id, reason, max(1, math.ceil(retry_after)))
+
+    @asynccontextmanager
+    async def admit(self, server_id: Optional[int], max_wait: Optional[float] = None):
+        """Удерживает слот сервера на время операции; AdmissionRejected - если слота не дождаться"""
+        if server_id is None:
+            # Сервер ещё не сохранён (этап добавления) - ограничивать нечего
+            yield
+            return
+        gate = self._gate(server_id)
+        max_wait = SSH_ADMISSION_MAX_WAIT if max_wait is None else max_wait
+        started = time.monotonic()
+        if gate.slots.locked() or gate.waiting:
+            if gate.waiting >= SSH_ADMISSION_MAX_QUEUE:
+                self._reject(gate, "queue_full", gate.expected_wait())
+            expected = gate.expected_wait()
+            if expected > max_wait:
+                self._reject(gate, "deadline", expected)
+            gate.waiting += 1
+            try:
+                await asyncio.wait_for(gate.slots.acquire(), max_wait)
+            except asyncio.TimeoutError:
+                self._reject(gate, "timeout", gate.avg_hold)
+            finally:
+                gate.waiting -= 1
+        else:
+            # Свободный слот занимается без ожидания
+            await gate.slots.acquire()
+        SSH_ADMISSION_WAIT.observe(time.monotonic() - started)
+        gate.active += 1
+        gate.admitted += 1
+        acquired = time.monotonic()
+        try:
+            yield
+        finally:
+            gate.observe_hold(time.monotonic() - acquired)
+            gate.active -= 1
+            gate.slots.release()
+
+    def stats(self) -> dict:
+        servers = [gate.stats() for gate in self._gates.values()]
+        return {
+            "pid": os.getpid(),
+            "concurrency": SSH_ADMISSION_CONCURRENCY,
+            "max_queue": SSH_ADMISSION_MAX_QUEUE,
+            "max_wait_seconds": SSH_ADMISSION_MAX_WAIT,
+            "servers": servers,
+            "active": sum(s["active"] for s in servers),
+            "waiting": sum(s["waiting"] for s in servers),
+            "rejected": sum(s["rejected"] for s in servers),
+        }
+
+
+ssh_admission = SSHAdmissionController()
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+import asyncssh
+
+from models.server_models import SSHServerConfig
+
+logger = logging.getLogger(__name__)
+
+# Параметры пула берутся из окружения, чтобы их можно было подстроить без релиза
+SSH_POOL_MAX_SESSIONS = int(os.getenv("SSH_POOL_MAX_SESSIONS", "8"))  # Макс. одновременных каналов на сервер (sshd MaxSessions = 10)
+SSH_POOL_IDLE_TIMEOUT = float(os.getenv("SSH_POOL_IDLE_TIMEOUT", "300"))  # Через сколько секунд простоя закрывать соединение
+SSH_POOL_HEALTHCHECK_INTERVAL = float(os.getenv("SSH_POOL_HEALTHCHECK_INTERVAL", "30"))  # Период проверки соединений
+SSH_POOL_CONNECT_TIMEOUT = float(os.getenv("SSH_POOL_CONNECT_TIMEOUT", "10"))
+SSH_POOL_RECONNECT_ATTEMPTS = int(os.getenv("SSH_POOL_RECONNECT_ATTEMPTS", "3"))
+SSH_POOL_BACKOFF_BASE = float(os.getenv("SSH_POOL_BACKOFF_BASE", "0.5"))
+SSH_POOL_BACKOFF_MAX = float(os.getenv("SSH_POOL_BACKOFF_MAX", "30"))
+
+# Ошибки, после которых соединение считаем мёртвым и переподключаемся
+CONNECTION_ERRORS = (asyncssh.DisconnectError, asyncssh.ChannelOpenError, ConnectionError, OSError)
+
+
+class SSHConnectError(Exception):
+    """Не удалось установить соединение с сервером после всех попыток"""
+
+
+def build_connect_params(server: SSHServerConfig) -> dict:
+    conn_params = {
+        'host': server.host,
+        'port': server.port,
+        'username': server.username,
+        'known_hosts': None,
+        'connect_timeout': SSH_POOL_CONNECT_TIMEOUT,
+        'keepalive_interval': SSH_POOL_HEALTHCHECK_INTERVAL,
+    }
+    if server.auth_type == 'password':
+        conn_params['password'] = server.password
+    elif server.auth_type == 'key':
+        conn_params['client_keys'] = [server.key_path]
+    else:
+        logger.error(f"Неизвестный тип аутентификации: {server.auth_type}")
+        raise ValueError('Unknown auth_type')
+    return conn_params
+
+
+class _PooledConnection:
+    """Долгоживущее SSH-соединение одного сервера и его счётчики"""
+
+    def __init__(self, server_id: int):
+        self.server_id = server_id
+        self.conn: Optional[asyncssh.SSHClientConnection] = None
+        self.fingerprint: Optional[Tuple] = None
+        self.lock = asyncio.Lock()
+        self.sessions = asyncio.Semaphore(SSH_POOL_MAX_SESSIONS)
+        self.in_use = 0
+        self.waiting = 0
+        self.last_used = time.monotonic()
+        self.connected_at: Optional[float] = None
+        self.failures = 0
+        self.next_attempt_at = 0.0
+        self.commands = 0
+        self.connects = 0
+        self.connect_errors = 0
+        self.evictions = 0
+
+    def is_alive(self) -> bool:
+        return self.conn is not None and not self.conn.is_closed()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = None
+        self.connected_at = None
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "server_id": self.server_id,
+            "connected": self.is_alive(),
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "max_sessions": SSH_POOL_MAX_SESSIONS,
+            "idle_seconds": round(now - self.last_used, 1),
+            "uptime_seconds": round(now - self.connected_at, 1) if self.connected_at else None,
+            "commands": self.commands,
+            "connects": self.connects,
+            "connect_errors": self.connect_errors,
+            "consecutive_failures": self.failures,
+            "evictions": self.evictions,
+        }
+
+
+class SSHConnectionPool:
+    """
+    Пул SSH-соединений по одному на сервер (ключ - SSHServerConfig.id).
+    Команды мультиплексируются каналами поверх одного аутентифицированного соединения,
+    число одновременных каналов ограничено SSH_POOL_MAX_SESSIONS.
+    Пул живёт в пределах процесса: каждый воркер uvicorn держит свои соединения.
+    """
+
+    def __init__(self):
+        self._connections: Dict[int, _PooledConnection] = {}
+        self._maintenance_task: Optional[asyncio.Task] = None
+
+    def _get_entry(self, server_id: int) -> _PooledConnection:
+        entry = self._connections.get(server_id)
+        if entry is None:
+            entry = _PooledConnection(server_id)
+            self._connections[server_id] = entry
+        return entry
+
+    @staticmethod
+    def _fingerprint(server: SSHServerConfig) -> Tuple:
+        return (server.host, server.port, server.username, server.auth_type, server.password, server.key_path)
+
+    async def _connect(self, entry: _PooledConnection, server: SSHServerConfig) -> asyncssh.SSHClientConnection:
+        conn_params = build_connect_params(server)
+        last_error: Optional[Exception] = None
+        for attempt in range(SSH_POOL_RECONNECT_ATTEMPTS):
+            # Экспоненциальная задержка после серии неудач, чтобы не долбить sshd
+            delay = entry.next_attempt_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                logger.info(f"Открытие SSH-соединения к {server.host}:{server.port} как {server.username} (попытка {attempt + 1})")
+                conn = await asyncssh.connect(**conn_params)
+            except (asyncssh.Error, OSError, asyncio.TimeoutError) as e:
+                last_error = e
+                entry.failures += 1
+                entry.connect_errors += 1
+                backoff = min(SSH_POOL_BACKOFF_MAX, SSH_POOL_BACKOFF_BASE * (2 ** (entry.failures - 1)))
+                entry.next_attempt_at = time.monotonic() + backoff
+                logger.warning(f"Не удалось подключиться к {server.host}:{server.port}: {e}. Повтор через {backoff:.1f}с")
+                continue
+            entry.failures = 0
+            entry.next_attempt_at = 0.0
+            entry.connects += 1
+            entry.connected_at = time.monotonic()
+            logger.info(f"Успешное SSH-подключение к {server.host}:{server.port}")
+            return conn
+        raise SSHConnectError(f"SSH connect to {server.host}:{server.port} failed: {last_error}")
+
+    async def _acquire_connection(self, entry: _PooledConnection, server: SSHServerConfig) -> asyncssh.SSHClientConnection:
+        fingerprint = self._fingerprint(server)
+        if entry.is_alive() and entry.fingerprint == fingerprint:
+            return entry.conn
+        async with entry.lock:
+            if entry.is_alive() and entry.fingerprint == fingerprint:
+                return entry.conn
+            # Параметры сервера изменились или соединение умерло - пересоздаём
+            entry.close()
+            entry.conn = await self._connect(entry, server)
+            entry.fingerprint = fingerprint
+            return entry.conn
+
+    @asynccontextmanager
+    async def connection(self, server: SSHServerConfig):
+        """Выдаёт соединение из пула, удерживая один слот сессии на время использования"""
+        if server.id is None:
+            # Сервер ещё не сохранён (этап добавления) - пулить нечего
+            async with asyncssh.connect(**build_connect_params(server)) as conn:
+                yield conn
+            return
+        entry = self._get_entry(server.id)
+        entry.waiting += 1
+        try:
+            await entry.sessions.acquire()
+        finally:
+            entry.waiting -= 1
+        entry.in_use += 1
+        try:
+            conn = await self._acquire_connection(entry, server)
+            entry.commands += 1
+            yield conn
+        except CONNECTION_ERRORS:
+            # Соединение оборвалось посреди команды - следующий запрос переподключится
+            if entry.conn is not None and entry.conn.is_closed():
+                entry.close()
+            raise
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            entry.sessions.release()
+
+    async def run(self, server: SSHServerConfig, command: str, **kwargs) -> asyncssh.SSHCompletedProcess:
+        """Выполняет команду, один раз переподключаясь, если соединение оказалось мёртвым"""
+        for attempt in range(2):
+            try:
+                async with self.connection(server) as conn:
+                    return await conn.run(command, **kwargs)
+            except CONNECTION_ERRORS as e:
+                if attempt:
+                    raise
+                logger.warning(f"SSH-соединение с {server.host} потеряно ({e}), переподключаемся")
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for entry in self._connections.values():
+            if entry.conn is None:
+                continue
+            if not entry.is_alive():
+                logger.info(f"SSH-соединение с сервером id={entry.server_id} закрыто удалённой стороной")
+                entry.close()
+                entry.evictions += 1
+            elif entry.in_use == 0 and now - entry.last_used > SSH_POOL_IDLE_TIMEOUT:
+                logger.info(f"Закрываем простаивающее SSH-соединение с сервером id={entry.server_id}")
+                entry.close()
+                entry.evictions += 1
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(SSH_POOL_HEALTHCHECK_INTERVAL)
+            try:
+                self._evict_idle()
+            except Exception as e:
+                logger.exception(f"Ошибка обслуживания пула SSH: {e}")
+
+    def start(self):
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+
+    def invalidate(self, server_id: int):
+        entry = self._connections.pop(server_id, None)
+        if entry is not None:
+            entry.close()
+
+    async def close(self):
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        for entry in self._connections.values():
+            entry.close()
+        self._connections.clear()
+
+    def stats(self) -> dict:
+        servers = [entry.stats() for entry in self._connections.values()]
+        return {
+            "pid": os.getpid(),
+            "servers": servers,
+            "connected": sum(1 for s in servers if s["connected"]),
+            "in_use": sum(s["in_use"] for s in servers),
+            "waiting": sum(s["waiting"] for s in servers),
+        }
+
+
+ssh_pool = SSHConnectionPool()
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from database.database import async_session, engine
+from repositories.user_repo import UserRepository
+from service.audit_log import audit_log
+from service.server_service import ServerService
+from service.fleet import fleet_executor
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_EXPIRY_ENABLED = os.getenv("SUBSCRIPTION_EXPIRY_ENABLED", "1").lower() in ("1", "true", "yes")
+SUBSCRIPTION_EXPIRY_INTERVAL = float(os.getenv("SUBSCRIPTION_EXPIRY_INTERVAL", "60"))
+# Подписок за один UPDATE и максимум пачек за проход (остаток доберёт следующий проход)
+SUBSCRIPTION_EXPIRY_BATCH = int(os.getenv("SUBSCRIPTION_EXPIRY_BATCH", "1000"))
+SUBSCRIPTION_EXPIRY_MAX_BATCHES = int(os.getenv("SUBSCRIPTION_EXPIRY_MAX_BATCHES", "50"))
+# Удалять ли пиры истёкших подписок с серверов и сколько ключей обрабатывать за проход
+SUBSCRIPTION_EXPIRY_REVOKE_PEERS = os.getenv("SUBSCRIPTION_EXPIRY_REVOKE_PEERS", "1").lower() in ("1", "true", "yes")
+SUBSCRIPTION_EXPIRY_REVOKE_BATCH = int(os.getenv("SUBSCRIPTION_EXPIRY_REVOKE_BATCH", "500"))
+# Сервер, с которого не удалось удалить пиры, пропускается следующие проходы: пауза удваивается
+# с каждым сбоем подряд, от REVOKE_BACKOFF до REVOKE_BACKOFF_MAX секунд
+SUBSCRIPTION_EXPIRY_REVOKE_BACKOFF = float(os.getenv("SUBSCRIPTION_EXPIRY_REVOKE_BACKOFF", "60"))
+SUBSCRIPTION_EXPIRY_REVOKE_BACKOFF_MAX = float(os.getenv("SUBSCRIPTION_EXPIRY_REVOKE_BACKOFF_MAX", "3600"))
+# Ключ advisory-блокировки Postgres: истечение обрабатывает только один воркер одновременно
+SUBSCRIPTION_EXPIRY_LOCK_KEY = 7301002
+
+# Подписчик получает пачку истёкших подписок (словари из UserRepository.expire_due_batch)
+ExpiryListener = Callable[[List[dict]], Awaitable[None]]
+
+
+class SubscriptionExpirySweeper:
+    """
+    Фоновое истечение подписок пачками UPDATE ... RETURNING вместо ленивой проверки
+    по одному пользователю. Истёкшие подписки передаются подписчикам, пиры их ключей
+    удаляются с серверов.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[ExpiryListener] = []
+        self.runs = 0
+        self.skipped_runs = 0
+        self.batches = 0
+        self.expired_total = 0
+        self.revoked_keys_total = 0
+        self.revoke_failures = 0
+        self.orphaned_keys_total = 0
+        # server_id -> (сбоев подряд, time.monotonic, до которого сервер пропускается)
+        self._revoke_backoff: Dict[int, Tuple[int, float]] = {}
+        self.listener_errors = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_seconds: Optional[float] = None
+        self.last_run_expired = 0
+
+    def add_listener(self, listener: ExpiryListener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: ExpiryListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    async def _notify(self, expired: List[dict]):
+        for listener in list(self._listeners):
+            try:
+                await listener(expired)
+            except Exception as e:
+                self.listener_errors += 1
+                logger.exception(f"Ошибка обработчика истёкших подписок: {e}")
+
+    def _backoff(self, server_id: int):
+        failures = self._revoke_backoff.get(server_id, (0, 0.0))[0] + 1
+        delay = min(SUBSCRIPTION_EXPIRY_REVOKE_BACKOFF * 2 ** (failures - 1), SUBSCRIPTION_EXPIRY_REVOKE_BACKOFF_MAX)
+        self._revoke_backoff[server_id] = (failures, time.monotonic() + delay)
+
+    async def _revoke_orphaned(self, repo: UserRepository, server_id: int, items: List[Tuple[int, str]]):
+        # Сервера больше нет в базе - удалять пиры не с чего, ключи закрываются без SSH,
+        # иначе они выбирались бы на каждом проходе
+        await repo.mark_keys_revoked([key_id for key_id, _ in items])
+        await audit_log.record_many(
+            ("key", key_id, "revoke", {"server_id": server_id, "public_key": public_key, "reason": "server_missing"})
+            for key_id, public_key in items
+        )
+        self.orphaned_keys_total += len(items)
+        logger.warning(f"Сервер с id={server_id} не найден в базе данных, ключи закрыты без удаления пиров: {len(items)}")
+
+    async def _revoke_peers(self, session) -> int:
+        # Берём все ещё не отозванные ключи истёкших подписок, а не только истёкших в этом проходе:
+        # ключи, которые не удалось удалить с сервера в прошлый раз, повторяются автоматически.
+        # Выборка - до SUBSCRIPTION_EXPIRY_REVOKE_BATCH ключей на каждый сервер, серверы на паузе
+        # после сбоя пропускаются, поэтому один сбойный сервер не задерживает остальные
+        repo = UserRepository(session)
+        service = ServerService(session)
+        now = time.monotonic()
+        paused = [server_id for server_id, (_, retry_at) in self._revoke_backoff.items() if retry_at > now]
+        keys = await repo.get_keys_to_revoke(SUBSCRIPTION_EXPIRY_REVOKE_BATCH, exclude_servers=paused)
+        by_server = defaultdict(list)
+        for key_id, server_id, public_key in keys:
+            by_server[server_id].append((key_id, public_key))
+        revoked = 0
+        servers = await service.repo.get_servers_by_ids(list(by_server))
+        for server_id in set(by_server) - {server.id for server in servers}:
+            await self._revoke_orphaned(repo, server_id, by_server[server_id])
+            self._revoke_backoff.pop(server_id, None)
+        # Адреса отмечаются как освобождаемые до удаления, чтобы сверка пиров не поставила их обратно.
+        # Пиры удаляются со всех серверов параллельно (только SSH), база обновляется после прохода
+        for server in servers:
+            await service.ip_repo.mark_releasing(server.id, [public_key for _, public_key in by_server[server.id]])
+        report = await fleet_executor.run(
+            servers,
+            lambda server: service.remove_peers(server, [public_key for _, public_key in by_server[server.id]]),
+        )
+        for result in report.results:
+            items = by_server[result.server_id]
+            if not result.ok or not result.value:
+                # В т.ч. перегрузка сервера (AdmissionRejected): его пиры удалим после паузы
+                logger.warning(f"Не удалось удалить пиры истёкших подписок с сервера id={result.server_id}: {result.error or 'ошибка SSH'}")
+                self.revoke_failures += 1
+                self._backoff(result.server_id)
+                await service.ip_repo.clear_releasing(result.server_id, [public_key for _, public_key in items])
+                continue
+            self._revoke_backoff.pop(result.server_id, None)
+            await service.ip_repo.release_many(result.server_id, [public_key for _, public_key in items])
+            await repo.mark_keys_revoked([key_id for key_id, _ in items])
+            await audit_log.record_many(
+                ("key", key_id, "revoke", {"server_id": result.server_id, "public_key": public_key})
+                for key_id, public_key in items
+            )
+            revoked += len(items)
+            logger.info(f"С сервера id={result.server_id} удалено пиров истёкших подписок: {len(items)}")
+        self.revoked_keys_total += revoked
+        return revoked
+
+    async def run_once(self) -> bool:
+        started = time.monotonic()
+        async with engine.connect() as lock_conn:
+            locked = (await lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SUBSCRIPTION_EXPIRY_LOCK_KEY})).scalar()
+            if not locked:
+                # Истечением уже занимается другой воркер
+                self.skipped_runs += 1
+                return False
+            try:
+                expired_count = 0
+                async with async_session() as session:
+                    repo = UserRepository(session)
+                    for _ in range(SUBSCRIPTION_EXPIRY_MAX_BATCHES):
+                        expired = await repo.expire_due_batch(SUBSCRIPTION_EXPIRY_BATCH)
+                        if not expired:
+                            break
+                        self.batches += 1
+                        expired_count += len(expired)
+                        await audit_log.record_many(
+                            ("subscription", item["subscription_id"], "expire", {"user_id": item["user_id"], "end_date": item["end_date"]})
+                            for item in expired
+                        )
+                        await self._notify(expired)
+                        if len(expired) < SUBSCRIPTION_EXPIRY_BATCH:
+                            break
+                    if SUBSCRIPTION_EXPIRY_REVOKE_PEERS:
+                        try:
+                            await self._revoke_peers(session)
+                        except Exception as e:
+                            await session.rollback()
+                            logger.exception(f"Ошибка удаления пиров истёкших подписок: {e}")
+            finally:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SUBSCRIPTION_EXPIRY_LOCK_KEY})
+        if expired_count:
+            logger.info(f"Истекло подписок: {expired_count}")
+        self.expired_total += expired_count
+        self.last_run_expired = expired_count
+        self.runs += 1
+        self.last_run_at = time.time()
+        self.last_run_seconds = round(time.monotonic() - started, 3)
+        return True
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.exception(f"Ошибка обработки истёкших подписок: {e}")
+            await asyncio.sleep(SUBSCRIPTION_EXPIRY_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "runs": self.runs,
+            "skipped_runs": self.skipped_runs,
+            "batches": self.batches,
+            "expired_total": self.expired_total,
+            "revoked_keys_total": self.revoked_keys_total,
+            "revoke_failures": self.revoke_failures,
+            "orphaned_keys_total": self.orphaned_keys_total,
+            "revoke_backoff_servers": sorted(
+                server_id for server_id, (_, retry_at) in self._revoke_backoff.items() if retry_at > time.monotonic()
+            ),
+            "listener_errors": self.listener_errors,
+            "last_run_at": self.last_run_at,
+            "last_run_seconds": self.last_run_seconds,
+            "last_run_expired": self.last_run_expired,
+            "last_run_rows_per_second": (
+                round(self.last_run_expired / self.last_run_seconds, 1) if self.last_run_seconds else None
+            ),
+        }
+
+
+subscription_expiry_sweeper = SubscriptionExpirySweeper()
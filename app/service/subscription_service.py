@@ -0,0 +1,150 @@
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from repositories.payment_repo import PaymentRepository
+from repositories.plan_repo import SubscriptionPlanRepository
+from repositories.server_repo import ServerRepository
+from repositories.user_repo import UserRepository
+from service.audit_log import audit_log
+
+logger = logging.getLogger(__name__)
+
+# Верхняя граница длительности одной оплаты
+MAX_PAYMENT_DURATION_DAYS = int(os.getenv("MAX_PAYMENT_DURATION_DAYS", "3650"))
+# Имена приложения, для которых отдаются vpn://-ключи AmneziaWG (пустое - приложение не указано)
+AMNEZIA_VPN_APPS = {"", "amnezia", "amneziavpn", "amneziawg"}
+AMNEZIA_KEY_NAME = "amneziawg"
+
+PAYMENT_SUCCESS = "success"
+PAYMENT_USER_NOT_FOUND = "user_not_found"
+PAYMENT_INVALID_DURATION = "invalid_duration"
+
+
+def subscription_status(end_date: Optional[datetime], now: Optional[datetime] = None) -> dict:
+    """Статус подписки с датой окончания end_date в виде, который отдаётся боту"""
+    now = now or datetime.utcnow()
+    if end_date is None or end_date <= now:
+        return {"is_active": False, "days_until_expiration": 0, "expiration_date": end_date.isoformat() if end_date else ""}
+    return {
+        "is_active": True,
+        "days_until_expiration": max(0, (end_date - now).days),
+        "expiration_date": end_date.isoformat(),
+    }
+
+
+def key_bundle_app(vpn_app: str) -> Optional[str]:
+    """Имя набора ключей для приложения vpn_app; None - ключей для него нет"""
+    if (vpn_app or "").strip().lower() in AMNEZIA_VPN_APPS:
+        return AMNEZIA_KEY_NAME
+    return None
+
+
+def server_label(server) -> str:
+    if server.endpoint:
+        return server.endpoint.rsplit(":", 1)[0]
+    return server.host
+
+
+class SubscriptionService:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.payment_repo = PaymentRepository(session)
+        self.user_repo = UserRepository(session)
+        self.plan_repo = SubscriptionPlanRepository(session)
+        self.server_repo = ServerRepository(session)
+
+    async def user_exists(self, telegram_id) -> bool:
+        return await self.user_repo.get_user_by_telegram_id(telegram_id) is not None
+
+    async def batch_user_exists(self, telegram_ids: List[int]) -> List[Tuple[int, bool]]:
+        existing = await self.user_repo.get_existing_telegram_ids([str(telegram_id) for telegram_id in telegram_ids])
+        return [(telegram_id, str(telegram_id) in existing) for telegram_id in telegram_ids]
+
+    async def batch_get_status(self, telegram_ids: List[int]) -> List[Tuple[int, dict]]:
+        end_dates = await self.user_repo.get_active_end_dates([str(telegram_id) for telegram_id in telegram_ids])
+        now = datetime.utcnow()
+        return [
+            (telegram_id, subscription_status(end_dates.get(str(telegram_id)), now))
+            for telegram_id in telegram_ids
+        ]
+
+    async def get_status(self, telegram_id) -> dict:
+        subscription = await self.user_repo.get_active_subscription(telegram_id)
+        return subscription_status(subscription.end_date if subscription else None)
+
+    async def get_configuration_keys(self, telegram_id, vpn_app: str = "") -> List[Tuple[str, str, str]]:
+        """Ключи действующих подписок: (сервер, имя ключа, значение)"""
+        keys, _ = await self.get_key_bundle(telegram_id, vpn_app)
+        return keys
+
+    async def get_key_bundle(self, telegram_id, vpn_app: str = "") -> Tuple[List[Tuple[str, str, str]], Optional[datetime]]:
+        """Ключи действующих подписок и момент, когда первая из этих подписок истечёт"""
+        if key_bundle_app(vpn_app) is None:
+            return [], None
+        keys = await self.user_repo.get_active_keys(telegram_id)
+        servers = await self.server_repo.get_servers_by_ids(list({server_id for server_id, _, _ in keys if server_id is not None}))
+        labels = {server.id: server_label(server) for server in servers}
+        expires_at = min((end_date for _, _, end_date in keys), default=None)
+        return [(labels.get(server_id, ""), AMNEZIA_KEY_NAME, key) for server_id, key, _ in keys], expires_at
+
+    async def process_payment(self, telegram_id, duration_days: int, payment_id: str = "") -> Tuple[str, dict]:
+        """
+        Продлевает подписку пользователя на duration_days дней (от текущего окончания или
+        от сегодня, если подписка истекла); при отсутствии подписок оформляет новую.
+        С payment_id оплата записывается в журнал в той же транзакции, что и продление:
+        повтор той же оплаты возвращает сохранённый результат, ничего не продлевая.
+        Возвращает (результат, новый статус).
+        """
+        if duration_days <= 0 or duration_days > MAX_PAYMENT_DURATION_DAYS:
+            return PAYMENT_INVALID_DURATION, subscription_status(None)
+        user = await self.user_repo.get_user_by_telegram_id(telegram_id)
+        if not user:
+            return PAYMENT_USER_NOT_FOUND, subscription_status(None)
+        try:
+            if payment_id and not await self.payment_repo.claim(payment_id, telegram_id, duration_days):
+                return await self._replay_payment(payment_id, telegram_id, duration_days)
+            extended = await self.user_repo.extend_latest_subscription(user.id, duration_days, commit=False)
+            if extended:
+                subscription_id, end_date = extended
+            else:
+                plan = await self.plan_repo.get_plan_for_duration(duration_days)
+                if not plan:
+                    await self.session.rollback()
+                    logger.error("Нет активных тарифных планов для оформления подписки")
+                    return PAYMENT_INVALID_DURATION, subscription_status(None)
+                end_date = (await self.user_repo.bulk_upsert_subscriptions([user.id], plan.id, duration_days, commit=False)).get(user.id)
+                subscription_id = (await self.user_repo.get_latest_subscription(user.id)).id
+            if payment_id:
+                await self.payment_repo.set_result(payment_id, PAYMENT_SUCCESS, end_date)
+            await self.session.commit()
+        except SQLAlchemyError:
+            await self.session.rollback()
+            raise
+        logger.info(f"Подписка пользователя {telegram_id} продлена на {duration_days} дн. (до {end_date}), оплата {payment_id or '-'}")
+        await audit_log.record("subscription", subscription_id, "payment", {
+            "telegram_id": telegram_id,
+            "payment_id": payment_id or None,
+            "duration_days": duration_days,
+            "end_date": end_date,
+        })
+        return PAYMENT_SUCCESS, subscription_status(end_date)
+
+    async def _replay_payment(self, payment_id: str, telegram_id, duration_days: int) -> Tuple[str, dict]:
+        payment = await self.payment_repo.get(payment_id)
+        if payment.telegram_user_id != str(telegram_id) or payment.duration_days != duration_days:
+            logger.warning(
+                f"Повтор оплаты {payment_id} с другими данными: пользователь {telegram_id}, {duration_days} дн. "
+                f"(в журнале: {payment.telegram_user_id}, {payment.duration_days} дн.)"
+            )
+        logger.info(f"Оплата {payment_id} уже обработана, подписка не продлевается повторно")
+        return payment.result, subscription_status(payment.end_date)
+
+    async def get_prices(self) -> List[dict]:
+        plans = await self.plan_repo.get_active_plans()
+        # Цена в базе в копейках, боту отдаём рубли
+        return [{"duration_days": plan.duration_days, "base_price": plan.price // 100} for plan in plans]
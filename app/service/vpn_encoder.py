@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from service.awg_utils import endpoint_hosts, pack_vpn_conf, process_conf_data
+from service.dns_resolver import dns_resolver
+from service.metrics import VPN_ENCODE_CONFS, VPN_ENCODE_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Потоки для кодирования пачек: zlib отпускает GIL, а ограничение числа потоков
+# не даёт массовой выдаче занять весь процессор воркера
+VPN_ENCODE_WORKERS = int(os.getenv("VPN_ENCODE_WORKERS", "2"))
+# Пачки не больше этого размера кодируются прямо в event loop - перенос в поток дороже самой работы
+VPN_ENCODE_INLINE_MAX = int(os.getenv("VPN_ENCODE_INLINE_MAX", "4"))
+# Сколько конфигов отдаётся в поток за раз: между частями loop успевает обслужить другие запросы
+VPN_ENCODE_CHUNK_SIZE = int(os.getenv("VPN_ENCODE_CHUNK_SIZE", "50"))
+
+
+class VpnConfEncoder:
+    """
+    Кодирование .conf в vpn://-ключи AmneziaWG: маленькие пачки - в event loop,
+    большие - частями в ограниченном пуле потоков. Результаты не кэшируются: каждый
+    конфиг содержит свежий приватный ключ и кодируется ровно один раз.
+    """
+
+    def __init__(self, workers: int = VPN_ENCODE_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.encoded = 0
+        self.offloaded = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="vpn-encode")
+        return self._executor
+
+    async def _process(self, confs: List[str]) -> List[str]:
+        hosts = set()
+        for conf in confs:
+            hosts |= endpoint_hosts(conf)
+        resolved = await dns_resolver.resolve_many(hosts)
+        return [process_conf_data(conf, resolved) for conf in confs]
+
+    async def encode_many(self, confs: List[str]) -> List[str]:
+        started = time.perf_counter()
+        processed = await self._process(confs)
+        self.encoded += len(processed)
+        VPN_ENCODE_CONFS.inc(len(processed))
+        if len(processed) <= VPN_ENCODE_INLINE_MAX:
+            encoded = [pack_vpn_conf(conf) for conf in processed]
+            mode = "inline"
+        else:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            encoded = []
+            for i in range(0, len(processed), VPN_ENCODE_CHUNK_SIZE):
+                chunk = processed[i:i + VPN_ENCODE_CHUNK_SIZE]
+                encoded += await loop.run_in_executor(executor, lambda chunk=chunk: [pack_vpn_conf(c) for c in chunk])
+            self.offloaded += len(processed)
+            mode = "offloaded"
+        # mode: inline - кодирование в event loop, offloaded - в пуле потоков
+        VPN_ENCODE_DURATION.labels(mode).observe(time.perf_counter() - started)
+        return encoded
+
+    async def encode(self, conf_text: str) -> str:
+        return (await self.encode_many([conf_text]))[0]
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "encoded": self.encoded,
+            "offloaded": self.offloaded,
+            "workers": self.workers,
+        }
+
+
+vpn_encoder = VpnConfEncoder()
@@ -0,0 +1,216 @@
+import os
+import re
+from typing import Iterable, List, Optional, Set
+
+from service.awg_provision import AWG_CONTAINER, DEFAULT_WG_CONFIG_FILE
+
+# Изменение пиров "на горячую": `wg set` правит таблицу пиров ядра без перезапуска интерфейса,
+# а wg0.conf обновляется отдельно, чтобы изменения пережили перезапуск контейнера.
+# Все скрипты выполняются внутри контейнера одним вызовом `sh -s` (текст - через stdin).
+
+HOT_APPLY_COMMAND = f"docker exec -i {AWG_CONTAINER} sh -s"
+# Сколько секунд скрипт ждёт блокировку wg0.conf, прежде чем завершиться ошибкой
+WG_CONF_LOCK_TIMEOUT = int(os.getenv("WG_CONF_LOCK_TIMEOUT", "30"))
+
+# Удаляет из конфига блоки [Peer] с публичными ключами из первого файла (по ключу в строке),
+# остальное оставляет как есть. Ключи идут файлом, а не аргументом: аргумент ограничен 128 КБ
+_REMOVE_PEERS_AWK = r"""
+function flush() { if (!skip) printf "%s", block; block = ""; skip = 0 }
+FNR == NR { drop[$0] = 1; next }
+/^[ \t]*\[/ { flush() }
+{
+    block = block $0 "\n"
+    if ($0 ~ /^[ \t]*PublicKey[ \t]*=/) {
+        v = $0
+        sub(/^[ \t]*PublicKey[ \t]*=[ \t]*/, "", v)
+        sub(/[ \t\r]+$/, "", v)
+        if (v in drop) skip = 1
+    }
+}
+END { flush() }
+"""
+
+
+# Печатает ключи [Peer] с комментарием-именем: так пишет пиры бот (awg-docker-bot-main/awg/newclient.sh),
+# наши скрипты имени не пишут
+_NAMED_PEERS_AWK = r"""
+function flush() { if (named && key != "") print key; key = ""; named = 0 }
+/^[ \t]*\[/ { flush(); peer = ($0 ~ /^[ \t]*\[Peer\]/); next }
+!peer { next }
+/^[ \t]*#/ { named = 1; next }
+/^[ \t]*PublicKey[ \t]*=/ {
+    key = $0
+    sub(/^[ \t]*PublicKey[ \t]*=[ \t]*/, "", key)
+    sub(/[ \t\r]+$/, "", key)
+}
+END { flush() }
+"""
+# Таблица клиентов, которую ведут бот и приложение Amnezia
+BOT_CLIENTS_TABLE = "/opt/amnezia/awg/clientsTable"
+_CLIENT_ID_RE = re.compile(r'"clientId"\s*:\s*"([^"]*)"')
+
+
+def interface_name(wg_config_file: Optional[str] = None) -> str:
+    """Имя интерфейса совпадает с именем конфига: /opt/amnezia/awg/wg0.conf -> wg0"""
+    return os.path.splitext(os.path.basename(wg_config_file or DEFAULT_WG_CONFIG_FILE))[0]
+
+
+def _quote(value: str) -> str:
+    return "'" + str(value).replace("'", "'\"'\"'") + "'"
+
+
+def _header(wg_config_file: Optional[str]) -> List[str]:
+    return [
+        "set -e",
+        f"conf={_quote(wg_config_file or DEFAULT_WG_CONFIG_FILE)}",
+        f"iface={_quote(interface_name(wg_config_file))}",
+        # Все изменения wg0.conf - под одной блокировкой файла: добавление дописывает в конец,
+        # удаление переписывает файл целиком, и без неё пир, дописанный во время перезаписи, теряется
+        'exec 9>>"$conf.lock"',
+        f"flock -w {WG_CONF_LOCK_TIMEOUT} 9",
+    ]
+
+
+def _add_peers_lines(peers: Iterable[dict]) -> List[str]:
+    # Ожидает $psk_file, созданный вызывающим
+    lines = []
+    for peer in peers:
+        public_key = _quote(peer["public_key"])
+        allowed_ips = _quote(peer["allowed_ips"])
+        block = "\\n[Peer]\\n"
+        if peer.get("name"):
+            block += f"# {peer['name']}\\n"
+        block += f"PublicKey = {peer['public_key']}\\n"
+        if peer.get("preshared_key"):
+            block += f"PresharedKey = {peer['preshared_key']}\\n"
+        block += f"AllowedIPs = {peer['allowed_ips']}\\n"
+        if peer.get("preshared_key"):
+            lines.append(f'printf \'%s\\n\' {_quote(peer["preshared_key"])} > "$psk_file"')
+            lines.append(f'wg set "$iface" peer {public_key} preshared-key "$psk_file" allowed-ips {allowed_ips}')
+        else:
+            lines.append(f'wg set "$iface" peer {public_key} allowed-ips {allowed_ips}')
+        # В конфиг дописываем только если пира там ещё нет - повторный вызов безопасен
+        lines.append(
+            f'grep -qF {_quote("PublicKey = " + peer["public_key"])} "$conf" || printf \'%b\' {_quote(block)} >> "$conf"'
+        )
+    return lines
+
+
+def _remove_peers_lines(public_keys: List[str]) -> List[str]:
+    # Ожидает $tmp и $keys_file, созданные вызывающим; пустой список ключей не передавать -
+    # иначе awk примет сам конфиг за список ключей
+    lines = [f'wg set "$iface" peer {_quote(public_key)} remove' for public_key in public_keys]
+    lines += [
+        # printf - встроенная команда sh, лимит на длину аргументов exec к ней не относится
+        f'printf \'%s\\n\' {" ".join(_quote(public_key) for public_key in public_keys)} > "$keys_file"',
+        f'awk {_quote(_REMOVE_PEERS_AWK)} "$keys_file" "$conf" > "$tmp"',
+        # cat вместо mv - сохраняем права и inode файла, который смонтирован в контейнер
+        'cat "$tmp" > "$conf"',
+    ]
+    return lines
+
+
+def build_add_peers_script(wg_config_file: Optional[str], peers: Iterable[dict]) -> str:
+    """
+    Скрипт добавления пиров. peers - словари с ключами public_key, preshared_key, allowed_ips
+    и необязательным name (пишется комментарием в wg0.conf, как это делает бот).
+    """
+    lines = _header(wg_config_file) + [
+        'psk_file=$(mktemp)',
+        'trap \'rm -f "$psk_file"\' EXIT',
+    ]
+    lines += _add_peers_lines(peers)
+    return "\n".join(lines) + "\n"
+
+
+def build_remove_peers_script(wg_config_file: Optional[str], public_keys: Iterable[str]) -> str:
+    """Скрипт удаления пиров из ядра и из wg0.conf одним проходом awk"""
+    lines = _header(wg_config_file) + [
+        'tmp=$(mktemp)',
+        'keys_file=$(mktemp)',
+        'trap \'rm -f "$tmp" "$keys_file"\' EXIT',
+    ]
+    public_keys = list(public_keys)
+    if public_keys:
+        lines += _remove_peers_lines(public_keys)
+    return "\n".join(lines) + "\n"
+
+
+def build_reconcile_script(wg_config_file: Optional[str], add_peers: Iterable[dict], remove_keys: Iterable[str]) -> str:
+    """
+    Один скрипт сверки: сначала удаление лишних пиров, затем добавление недостающих.
+    Пир с изменёнными AllowedIPs передаётся в оба списка и ставится заново.
+    """
+    lines = _header(wg_config_file) + [
+        'tmp=$(mktemp)',
+        'keys_file=$(mktemp)',
+        'psk_file=$(mktemp)',
+        'trap \'rm -f "$tmp" "$keys_file" "$psk_file"\' EXIT',
+    ]
+    remove_keys = list(remove_keys)
+    if remove_keys:
+        lines += _remove_peers_lines(remove_keys)
+    lines += _add_peers_lines(add_peers)
+    return "\n".join(lines) + "\n"
+
+
+def build_syncconf_script(wg_config_file: Optional[str]) -> str:
+    """Применяет wg0.conf к работающему интерфейсу через `wg syncconf` (только разница, без рестарта)"""
+    lines = _header(wg_config_file) + [
+        'tmp=$(mktemp)',
+        'trap \'rm -f "$tmp"\' EXIT',
+        'wg-quick strip "$conf" > "$tmp"',
+        'wg syncconf "$iface" "$tmp"',
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def build_show_dump_command(wg_config_file: Optional[str]) -> str:
+    """Таблица пиров интерфейса в машиночитаемом виде (`wg show <iface> dump`)"""
+    return f"docker exec -i {AWG_CONTAINER} wg show {_quote(interface_name(wg_config_file))} dump"
+
+
+def parse_wg_dump(output: Optional[str]) -> List[dict]:
+    """
+    Разбирает вывод `wg show <iface> dump`. Первая строка - сам интерфейс, дальше по строке на пир:
+    public-key, preshared-key, endpoint, allowed-ips, latest-handshake, rx, tx, persistent-keepalive.
+    """
+    peers = []
+    for line in (output or "").splitlines()[1:]:
+        fields = line.split("\t")
+        if len(fields) < 8:
+            continue
+        peers.append({
+            "public_key": fields[0],
+            "preshared_key": None if fields[1] == "(none)" else fields[1],
+            "endpoint": None if fields[2] == "(none)" else fields[2],
+            "allowed_ips": "" if fields[3] == "(none)" else fields[3],
+            "latest_handshake": int(fields[4]) if fields[4].isdigit() else 0,
+            "rx_bytes": int(fields[5]) if fields[5].isdigit() else 0,
+            "tx_bytes": int(fields[6]) if fields[6].isdigit() else 0,
+        })
+    return peers
+
+
+def build_bot_peers_script(wg_config_file: Optional[str]) -> str:
+    """
+    Ключи пиров, которыми управляет бот, а не этот сервис: именованные блоки [Peer] в конфиге
+    и clientId из clientsTable. Бот дописывает конфиг до применения к интерфейсу, поэтому
+    пир, уже видный в `wg show dump`, здесь тоже виден
+    """
+    lines = [
+        f"conf={_quote(wg_config_file or DEFAULT_WG_CONFIG_FILE)}",
+        f'awk {_quote(_NAMED_PEERS_AWK)} "$conf"',
+        f"cat {_quote(BOT_CLIENTS_TABLE)} 2>/dev/null | grep -o '\"clientId\"[^,}}]*' || true",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def parse_bot_peers(output: Optional[str]) -> Set[str]:
+    keys = set()
+    for line in (output or "").splitlines():
+        match = _CLIENT_ID_RE.search(line)
+        key = match.group(1) if match else line.strip()
+        if key:
+            keys.add(key)
+    return keys
@@ -0,0 +1,89 @@
+import base64
+import os
+from typing import Tuple
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+# Генерация ключей WireGuard (Curve25519 / X25519, RFC 7748) прямо в процессе приложения.
+# Результат совпадает байт в байт с `wg genkey` / `wg pubkey` / `wg genpsk`.
+# Сама кривая - в cryptography (OpenSSL): постоянное время, ~80 мкс на ключ вместо ~2 мс на Python
+
+_BASE_POINT = (9).to_bytes(32, "little")
+
+
+def x25519(scalar: bytes, u_point: bytes) -> bytes:
+    """Умножение точки на скаляр (RFC 7748, раздел 5)"""
+    return X25519PrivateKey.from_private_bytes(scalar).exchange(X25519PublicKey.from_public_bytes(u_point))
+
+
+def _public_bytes(scalar: bytes) -> bytes:
+    return X25519PrivateKey.from_private_bytes(scalar).public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def generate_private_key() -> str:
+    """Аналог `wg genkey`: 32 случайных байта с зажатыми битами, base64"""
+    k = bytearray(os.urandom(32))
+    k[0] &= 248
+    k[31] &= 127
+    k[31] |= 64
+    return _b64(bytes(k))
+
+
+def public_key_from_private(private_key: str) -> str:
+    """Аналог `wg pubkey`"""
+    raw = base64.b64decode(private_key.strip(), validate=True)
+    if len(raw) != 32:
+        raise ValueError("WireGuard key must be 32 bytes")
+    return _b64(_public_bytes(raw))
+
+
+def generate_preshared_key() -> str:
+    """Аналог `wg genpsk`: 32 случайных байта без преобразований"""
+    return _b64(os.urandom(32))
+
+
+def generate_keypair() -> Tuple[str, str, str]:
+    """Возвращает (private_key, public_key, preshared_key) в формате WireGuard"""
+    private_key = generate_private_key()
+    return private_key, public_key_from_private(private_key), generate_preshared_key()
+
+
+# Контрольные векторы RFC 7748 (разделы 5.2 и 6.1)
+_KNOWN_VECTORS = (
+    (
+        bytes.fromhex("a546e36bf0527c9d3b16154b82465edd62144c0ac1fc5a18506a2244ba449ac4"),
+        bytes.fromhex("e6db6867583030db3594c1a424b15f7c726624ec26b3353b10a903a6d0ab1c4c"),
+        bytes.fromhex("c3da55379de9c6908e94ea4df28d084f32eccf03491c71f754b4075577a28552"),
+    ),
+    (
+        bytes.fromhex("4b66e9d4d1b4673c5ad22691957d6af5c11b6421e0ea01d42ca4169e7918ba0d"),
+        bytes.fromhex("e5210f12786811d3f4b7959d0538ae2c31dbe7106fc03c3efc4cd549c715a493"),
+        bytes.fromhex("95cbde9476e8907d7aade45cb4b873f88b595a68799fa152e6f8f7647aac7957"),
+    ),
+    (
+        bytes.fromhex("77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a"),
+        _BASE_POINT,
+        bytes.fromhex("8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a"),
+    ),
+    (
+        bytes.fromhex("5dab087e624a8a4b79e17f8b83800ee66f3bb1292618b6fd1c2f8b27ff88e0eb"),
+        _BASE_POINT,
+        bytes.fromhex("de9edb7d7b7dc1b4d35b61c2ece435373f8343c85b78674dadfc7e146f882b4f"),
+    ),
+)
+
+
+def verify_known_vectors() -> None:
+    """Проверяет реализацию на контрольных векторах, при расхождении бросает RuntimeError"""
+    for scalar, u_point, expected in _KNOWN_VECTORS:
+        if x25519(scalar, u_point) != expected:
+            raise RuntimeError("X25519 implementation does not match RFC 7748 test vectors")
+    # Та же проверка через base64-интерфейс, которым пользуется `wg pubkey`
+    alice_private, _, alice_public = _KNOWN_VECTORS[2]
+    if public_key_from_private(_b64(alice_private)) != _b64(alice_public):
+        raise RuntimeError("X25519 implementation does not match `wg pubkey` output")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули приложения импортируются от каталога app/, как при запуске uvicorn
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
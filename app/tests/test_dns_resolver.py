@@ -0,0 +1,186 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import service.dns_resolver as dns_module
+from service.awg_utils import encode_vpn_conf, process_conf_data
+from service.dns_resolver import DNS_NEGATIVE_TTL, DnsResolver
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class StubLookup:
+    """Локальный резолвер-заглушка: отвечает из словаря и считает обращения"""
+
+    def __init__(self, records=None, delay: float = 0.0):
+        self.records = dict(records or {})
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, host):
+        self.calls.append(host)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.records.get(host, (None, None))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    # Подменяется только time внутри модуля резолвера: event loop живёт по настоящим часам
+    monkeypatch.setattr(dns_module, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_cached_until_ttl_expires(clock):
+    lookup = StubLookup({"vpn.example.com": ("203.0.113.10", 60)})
+    resolver = DnsResolver(lookup)
+
+    async def scenario():
+        assert await resolver.resolve("vpn.example.com") == "203.0.113.10"
+        clock.now += 59
+        assert await resolver.resolve("vpn.example.com") == "203.0.113.10"
+        assert len(lookup.calls) == 1
+        # Запись истекла - имя разрешается заново и получает новый адрес
+        lookup.records["vpn.example.com"] = ("203.0.113.11", 60)
+        clock.now += 2
+        assert await resolver.resolve("vpn.example.com") == "203.0.113.11"
+        assert len(lookup.calls) == 2
+
+    asyncio.run(scenario())
+    assert resolver.stats()["hits"] == 1
+    assert resolver.stats()["misses"] == 2
+
+
+def test_ttl_is_capped(clock, monkeypatch):
+    monkeypatch.setattr(dns_module, "DNS_CACHE_MAX_TTL", 100.0)
+    lookup = StubLookup({"vpn.example.com": ("203.0.113.10", 86400)})
+    resolver = DnsResolver(lookup)
+
+    async def scenario():
+        await resolver.resolve("vpn.example.com")
+        clock.now += 101
+        await resolver.resolve("vpn.example.com")
+
+    asyncio.run(scenario())
+    assert len(lookup.calls) == 2
+
+
+def test_negative_caching(clock):
+    lookup = StubLookup()
+    resolver = DnsResolver(lookup)
+
+    async def scenario():
+        assert await resolver.resolve("missing.example.com") is None
+        clock.now += DNS_NEGATIVE_TTL - 1
+        assert await resolver.resolve("missing.example.com") is None
+        assert len(lookup.calls) == 1
+        clock.now += 2
+        lookup.records["missing.example.com"] = ("203.0.113.20", None)
+        assert await resolver.resolve("missing.example.com") == "203.0.113.20"
+
+    asyncio.run(scenario())
+    assert len(lookup.calls) == 2
+    assert resolver.stats()["failures"] == 1
+
+
+def test_lookup_error_is_negative_result(clock):
+    async def failing(host):
+        raise OSError("resolver unreachable")
+
+    resolver = DnsResolver(failing)
+    assert asyncio.run(resolver.resolve("vpn.example.com")) is None
+    assert resolver.stats()["negative_entries"] == 1
+
+
+def test_timeout():
+    lookup = StubLookup({"slow.example.com": ("203.0.113.30", None)}, delay=1.0)
+    resolver = DnsResolver(lookup, timeout=0.05)
+
+    async def scenario():
+        assert await resolver.resolve("slow.example.com") is None
+        # Таймаут кэшируется как отрицательный ответ, повторный запрос не ждёт снова
+        assert await resolver.resolve("slow.example.com") is None
+
+    asyncio.run(scenario())
+    assert len(lookup.calls) == 1
+    assert resolver.stats()["timeouts"] == 1
+
+
+def test_concurrent_callers_share_one_lookup():
+    lookup = StubLookup({"vpn.example.com": ("203.0.113.10", None)}, delay=0.05)
+    resolver = DnsResolver(lookup)
+
+    async def scenario():
+        return await asyncio.gather(*(resolver.resolve("vpn.example.com") for _ in range(50)))
+
+    assert asyncio.run(scenario()) == ["203.0.113.10"] * 50
+    assert len(lookup.calls) == 1
+
+
+def test_cancelled_waiter_does_not_cancel_others():
+    lookup = StubLookup({"vpn.example.com": ("203.0.113.10", None)}, delay=0.05)
+    resolver = DnsResolver(lookup)
+
+    async def scenario():
+        first = asyncio.create_task(resolver.resolve("vpn.example.com"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(resolver.resolve("vpn.example.com"))
+        await asyncio.sleep(0)
+        second.cancel()
+        assert await first == "203.0.113.10"
+        with pytest.raises(asyncio.CancelledError):
+            await second
+
+    asyncio.run(scenario())
+    assert len(lookup.calls) == 1
+
+
+def test_cancelled_owner_does_not_cancel_others():
+    lookup = StubLookup({"vpn.example.com": ("203.0.113.10", None)}, delay=0.05)
+    resolver = DnsResolver(lookup)
+
+    async def scenario():
+        owner = asyncio.create_task(resolver.resolve("vpn.example.com"))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(resolver.resolve("vpn.example.com")) for _ in range(3)]
+        await asyncio.sleep(0)
+        # Отменяется задача, которая начала разрешение
+        owner.cancel()
+        assert await asyncio.gather(*waiters) == ["203.0.113.10"] * 3
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+
+    asyncio.run(scenario())
+    assert len(lookup.calls) == 1
+    # Результат попал в кэш, хотя начавший разрешение уже отменён
+    assert asyncio.run(resolver.resolve("vpn.example.com")) == "203.0.113.10"
+    assert len(lookup.calls) == 1
+
+
+def test_resolve_many_deduplicates():
+    lookup = StubLookup({"a.example.com": ("203.0.113.1", None), "b.example.com": ("203.0.113.2", None)})
+    resolver = DnsResolver(lookup)
+    resolved = asyncio.run(resolver.resolve_many(["a.example.com", "b.example.com", "a.example.com"]))
+    assert resolved == {"a.example.com": "203.0.113.1", "b.example.com": "203.0.113.2"}
+    assert sorted(lookup.calls) == ["a.example.com", "b.example.com"]
+
+
+def test_encode_vpn_conf_uses_resolver():
+    resolver = DnsResolver(StubLookup({"vpn.example.com": ("203.0.113.10", None)}))
+    encoded = asyncio.run(encode_vpn_conf("[Peer]\nEndpoint = vpn.example.com:51820\n", resolver))
+    assert encoded.startswith("vpn://")
+
+
+def test_process_conf_data_does_not_resolve_itself():
+    conf = "[Peer]\nEndpoint = vpn.example.com:51820\n"
+    assert process_conf_data(conf, {"vpn.example.com": "203.0.113.10"}) == "[Peer]\nEndpoint = 203.0.113.10:51820\n"
+    with pytest.raises(ValueError):
+        process_conf_data(conf, {})
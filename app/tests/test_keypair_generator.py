@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from service.keypair_generator import KeypairGenerator
+from service.wg_keys import public_key_from_private
+
+
+async def max_loop_lag(work) -> tuple:
+    """Максимальная задержка тиков event loop, пока выполняется work, и длительность work"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - started - 0.001)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    result = await work()
+    elapsed = time.perf_counter() - started
+    done.set()
+    await task
+    return result, max(lags), elapsed
+
+
+def test_generate_many_returns_valid_keys():
+    generator = KeypairGenerator()
+
+    async def scenario():
+        keys = await generator.generate_many(120)
+        await generator.close()
+        return keys
+
+    keys = asyncio.run(scenario())
+    assert len(keys) == 120
+    assert len({public_key for _, public_key, _ in keys}) == 120
+    assert all(public_key_from_private(private_key) == public_key for private_key, public_key, _ in keys)
+    assert generator.stats()["offloaded"] == 120
+
+
+def test_large_batch_does_not_block_event_loop():
+    generator = KeypairGenerator()
+
+    async def scenario():
+        result = await max_loop_lag(lambda: generator.generate_many(3000))
+        await generator.close()
+        return result
+
+    keys, lag, elapsed = asyncio.run(scenario())
+    assert len(keys) == 3000
+    # При генерации прямо в loop задержка равна всей длительности пачки
+    assert lag < elapsed / 3
@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+from service.peer_install_batcher import PeerInstallBatcher
+
+
+class StubApply:
+    """Применение-заглушка: запоминает пачки и ждёт release, если он задан"""
+
+    def __init__(self, result: bool = True):
+        self.result = result
+        self.batches = []
+        self.release = None
+
+    async def __call__(self, server, peers):
+        self.batches.append((server, list(peers)))
+        if self.release is not None:
+            await self.release.wait()
+        return self.result
+
+
+class StubRollback:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, server, peers, installed):
+        self.calls.append(([peer["public_key"] for peer in peers], installed))
+
+
+def peer(key: str) -> dict:
+    return {"public_key": key, "preshared_key": None, "allowed_ips": "10.8.1.2/32"}
+
+
+def test_concurrent_installs_share_one_apply():
+    batcher = PeerInstallBatcher()
+    apply = StubApply()
+    server = SimpleNamespace(id=1)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.install(server, [peer(f"k{i}")], apply) for i in range(10)))
+
+    assert asyncio.run(scenario()) == [True] * 10
+    assert len(apply.batches) == 1
+    assert len(apply.batches[0][1]) == 10
+
+
+def test_batch_uses_latest_request_server_and_apply():
+    batcher = PeerInstallBatcher()
+    first_apply, second_apply = StubApply(), StubApply()
+    first, second = SimpleNamespace(id=1, name="old"), SimpleNamespace(id=1, name="new")
+
+    async def scenario():
+        await asyncio.gather(batcher.install(first, [peer("a")], first_apply), batcher.install(second, [peer("b")], second_apply))
+
+    asyncio.run(scenario())
+    assert first_apply.batches == []
+    assert second_apply.batches[0][0] is second
+
+
+def test_cancelled_before_apply_is_dropped_and_released():
+    batcher = PeerInstallBatcher()
+    apply, rollback = StubApply(), StubRollback()
+    server = SimpleNamespace(id=1)
+
+    async def scenario():
+        kept = asyncio.create_task(batcher.install(server, [peer("kept")], apply, rollback))
+        dropped = asyncio.create_task(batcher.install(server, [peer("dropped")], apply, rollback))
+        await asyncio.sleep(0)
+        dropped.cancel()
+        assert await kept is True
+        await batcher.close()
+
+    asyncio.run(scenario())
+    assert [key["public_key"] for key in apply.batches[0][1]] == ["kept"]
+    assert rollback.calls == [(["dropped"], False)]
+
+
+def test_cancelled_during_apply_is_rolled_back_after_install():
+    batcher = PeerInstallBatcher()
+    apply, rollback = StubApply(), StubRollback()
+    server = SimpleNamespace(id=1)
+
+    async def scenario():
+        apply.release = asyncio.Event()
+        task = asyncio.create_task(batcher.install(server, [peer("late")], apply, rollback))
+        while not apply.batches:
+            await asyncio.sleep(0.005)
+        task.cancel()
+        await asyncio.sleep(0)
+        # Применение ещё идёт - откатывать рано
+        assert rollback.calls == []
+        apply.release.set()
+        await asyncio.sleep(0.01)
+        await batcher.close()
+
+    asyncio.run(scenario())
+    assert rollback.calls == [(["late"], True)]
+    assert batcher.stats()["cancelled_requests"] == 1
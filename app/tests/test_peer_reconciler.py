@@ -0,0 +1,65 @@
+import json
+import subprocess
+
+import service.wg_hotapply as wg_hotapply
+from service.peer_reconciler import diff_peers
+from service.wg_hotapply import build_bot_peers_script, parse_bot_peers
+
+
+def desired_peer(address: str, preshared_key: str = "PSK=") -> dict:
+    return {"preshared_key": preshared_key, "address": address}
+
+
+def live_peer(public_key: str, allowed_ips: str) -> dict:
+    return {"public_key": public_key, "allowed_ips": allowed_ips}
+
+
+def test_diff_adds_missing_and_removes_unknown():
+    desired = {"A=": desired_peer("10.8.1.2/32"), "B=": desired_peer("10.8.1.3/32")}
+    diff = diff_peers(desired, [live_peer("A=", "10.8.1.2/32"), live_peer("EVE=", "10.8.1.9/32")])
+    assert [peer["public_key"] for peer in diff.to_add] == ["B="]
+    assert diff.to_remove == ["EVE="]
+    assert diff.in_sync == 1
+
+
+def test_diff_reinstalls_changed_allowed_ips():
+    diff = diff_peers({"A=": desired_peer("10.8.1.2/32")}, [live_peer("A=", "10.8.1.200/32")])
+    assert diff.changed == ["A="]
+    assert diff.to_remove == ["A="]
+    assert diff.to_add[0]["allowed_ips"] == "10.8.1.2/32"
+
+
+def test_diff_skips_unsettled_keys():
+    # Пир удаляется (адрес ещё выдан) или только что выдан и ещё не поставлен - не трогаем
+    desired = {"NEW=": desired_peer("10.8.1.4/32")}
+    diff = diff_peers(desired, [live_peer("GOING=", "10.8.1.5/32")], unsettled={"NEW=", "GOING="})
+    assert diff.clean
+    assert sorted(diff.unsettled) == ["GOING=", "NEW="]
+
+
+def test_diff_keeps_bot_peers():
+    diff = diff_peers({}, [live_peer("BOT=", "10.8.1.20/32"), live_peer("EVE=", "10.8.1.9/32")], bot_managed={"BOT="})
+    assert diff.bot_managed == ["BOT="]
+    assert diff.to_remove == ["EVE="]
+
+
+def test_bot_peers_script(tmp_path, monkeypatch):
+    conf = tmp_path / "wg0.conf"
+    conf.write_text(
+        "[Interface]\nPrivateKey = SERVER=\n# комментарий интерфейса\n\n"
+        "[Peer]\nPublicKey = OURS=\nAllowedIPs = 10.8.1.2/32\n\n"
+        "[Peer]\n# alice\nPublicKey = ALICE=\nAllowedIPs = 10.8.1.3/32\n"
+    )
+    table = tmp_path / "clientsTable"
+    table.write_text(json.dumps([{"clientId": "BOB=", "userData": {"clientName": "bob"}}], indent=4))
+    monkeypatch.setattr(wg_hotapply, "BOT_CLIENTS_TABLE", str(table))
+    output = subprocess.run(["sh", "-s"], input=build_bot_peers_script(str(conf)), capture_output=True, text=True, check=True).stdout
+    assert parse_bot_peers(output) == {"ALICE=", "BOB="}
+
+
+def test_bot_peers_script_without_clients_table(tmp_path, monkeypatch):
+    conf = tmp_path / "wg0.conf"
+    conf.write_text("[Interface]\nPrivateKey = SERVER=\n\n[Peer]\nPublicKey = OURS=\nAllowedIPs = 10.8.1.2/32\n")
+    monkeypatch.setattr(wg_hotapply, "BOT_CLIENTS_TABLE", str(tmp_path / "missing"))
+    output = subprocess.run(["sh", "-s"], input=build_bot_peers_script(str(conf)), capture_output=True, text=True, check=True).stdout
+    assert parse_bot_peers(output) == set()
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from service.server_service import ServerService
+
+
+class StubLoad:
+    def __init__(self, result="params", delay: float = 0.05, error: Exception = None):
+        self.result = result
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_single_flight_shares_one_load():
+    loading, load = {}, StubLoad()
+
+    async def scenario():
+        return await asyncio.gather(*(ServerService._single_flight(loading, 1, load) for _ in range(10)))
+
+    assert asyncio.run(scenario()) == ["params"] * 10
+    assert load.calls == 1
+    assert loading == {}
+
+
+def test_single_flight_cancelled_owner_does_not_cancel_others():
+    loading, load = {}, StubLoad()
+
+    async def scenario():
+        owner = asyncio.create_task(ServerService._single_flight(loading, 1, load))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(ServerService._single_flight(loading, 1, load)) for _ in range(3)]
+        await asyncio.sleep(0)
+        # Отменяется запрос, который начал загрузку
+        owner.cancel()
+        assert await asyncio.gather(*waiters) == ["params"] * 3
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+
+    asyncio.run(scenario())
+    assert load.calls == 1
+    assert loading == {}
+
+
+def test_single_flight_passes_exception_to_all():
+    loading, load = {}, StubLoad(error=RuntimeError("ssh down"))
+
+    async def scenario():
+        return await asyncio.gather(*(ServerService._single_flight(loading, 1, load) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert load.calls == 1
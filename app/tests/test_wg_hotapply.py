@@ -0,0 +1,52 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from service.wg_hotapply import build_add_peers_script, build_reconcile_script, build_remove_peers_script
+
+CONF = "[Interface]\nPrivateKey = SERVER=\nListenPort = 51820\n"
+
+
+def run_script(script: str, env: dict):
+    subprocess.run(["sh", "-s"], input=script, env=env, capture_output=True, text=True, check=True)
+
+
+def stub_env(tmp_path) -> dict:
+    # `wg set` ядра здесь не нужен - проверяется только wg0.conf
+    wg = tmp_path / "bin" / "wg"
+    wg.parent.mkdir()
+    wg.write_text("#!/bin/sh\nexit 0\n")
+    wg.chmod(0o755)
+    return {**os.environ, "PATH": f"{wg.parent}:{os.environ['PATH']}"}
+
+
+def peer(key: str, index: int) -> dict:
+    return {"public_key": key, "preshared_key": "PSK=", "allowed_ips": f"10.8.1.{index}/32"}
+
+
+def test_concurrent_adds_and_removes_keep_every_peer(tmp_path):
+    env = stub_env(tmp_path)
+    conf = tmp_path / "wg0.conf"
+    conf.write_text(CONF + "".join(f"\n[Peer]\nPublicKey = OLD{i}=\nAllowedIPs = 10.8.2.{i}/32\n" for i in range(40)))
+    scripts = []
+    for i in range(40):
+        scripts.append(build_add_peers_script(str(conf), [peer(f"NEW{i}=", i + 2)]))
+        scripts.append(build_remove_peers_script(str(conf), [f"OLD{i}="]))
+    scripts.append(build_reconcile_script(str(conf), [peer("FIX=", 200)], ["OLD0="]))
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda script: run_script(script, env), scripts))
+    text = conf.read_text()
+    assert text.startswith(CONF)
+    assert all(f"PublicKey = NEW{i}=" in text for i in range(40))
+    assert "OLD" not in text
+    assert text.count("[Peer]") == 41
+
+
+def test_add_is_idempotent(tmp_path):
+    env = stub_env(tmp_path)
+    conf = tmp_path / "wg0.conf"
+    conf.write_text(CONF)
+    script = build_add_peers_script(str(conf), [peer("A=", 2)])
+    run_script(script, env)
+    run_script(script, env)
+    assert conf.read_text().count("PublicKey = A=") == 1
@@ -0,0 +1,89 @@
+import base64
+
+import pytest
+
+from service.wg_keys import (
+    generate_keypair,
+    generate_preshared_key,
+    generate_private_key,
+    public_key_from_private,
+    verify_known_vectors,
+    x25519,
+)
+
+BASE_POINT = (9).to_bytes(32, "little")
+
+
+@pytest.mark.parametrize(
+    "scalar, u_point, expected",
+    [
+        # RFC 7748, раздел 5.2
+        (
+            "a546e36bf0527c9d3b16154b82465edd62144c0ac1fc5a18506a2244ba449ac4",
+            "e6db6867583030db3594c1a424b15f7c726624ec26b3353b10a903a6d0ab1c4c",
+            "c3da55379de9c6908e94ea4df28d084f32eccf03491c71f754b4075577a28552",
+        ),
+        (
+            "4b66e9d4d1b4673c5ad22691957d6af5c11b6421e0ea01d42ca4169e7918ba0d",
+            "e5210f12786811d3f4b7959d0538ae2c31dbe7106fc03c3efc4cd549c715a493",
+            "95cbde9476e8907d7aade45cb4b873f88b595a68799fa152e6f8f7647aac7957",
+        ),
+    ],
+)
+def test_rfc7748_vectors(scalar, u_point, expected):
+    assert x25519(bytes.fromhex(scalar), bytes.fromhex(u_point)).hex() == expected
+
+
+def test_rfc7748_diffie_hellman():
+    # RFC 7748, раздел 6.1
+    alice_private = bytes.fromhex("77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a")
+    bob_private = bytes.fromhex("5dab087e624a8a4b79e17f8b83800ee66f3bb1292618b6fd1c2f8b27ff88e0eb")
+    alice_public = x25519(alice_private, BASE_POINT)
+    bob_public = x25519(bob_private, BASE_POINT)
+    assert alice_public.hex() == "8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a"
+    assert bob_public.hex() == "de9edb7d7b7dc1b4d35b61c2ece435373f8343c85b78674dadfc7e146f882b4f"
+    shared = "4a5d9d5ba4ce2de1728e3bf480350f25e07e21c947d19e3376f09b3c1e161742"
+    assert x25519(alice_private, bob_public).hex() == shared
+    assert x25519(bob_private, alice_public).hex() == shared
+
+
+def test_rfc7748_iterated_1000():
+    # RFC 7748, раздел 5.2: k и u после 1000 итераций
+    k = u = BASE_POINT
+    for _ in range(1000):
+        k, u = x25519(k, u), k
+    assert k.hex() == "684cf59ba83309552800ef566f2f4d3c1c3887c49360e3875f2eb94d99532c51"
+
+
+def test_wg_pubkey_pair():
+    # Пара из примера wg(8): `wg genkey` -> PrivateKey, `wg pubkey` -> PublicKey
+    assert public_key_from_private("yAnz5TF+lXXJte14tji3zlMNq+hd2rYUIgJBgB3fBmk=") == "HIgo9xNzJMWLKASShiTqIybxZ0U3wGLiUeJ1PKf8ykw="
+
+
+def test_pubkey_ignores_trailing_newline():
+    # Ключ из `wg genkey` приходит с переводом строки
+    assert public_key_from_private("yAnz5TF+lXXJte14tji3zlMNq+hd2rYUIgJBgB3fBmk=\n") == "HIgo9xNzJMWLKASShiTqIybxZ0U3wGLiUeJ1PKf8ykw="
+
+
+def test_pubkey_rejects_wrong_length():
+    with pytest.raises(ValueError):
+        public_key_from_private(base64.b64encode(b"\x01" * 31).decode())
+
+
+def test_generated_private_key_is_clamped():
+    raw = base64.b64decode(generate_private_key())
+    assert len(raw) == 32
+    assert raw[0] & 7 == 0
+    assert raw[31] & 128 == 0
+    assert raw[31] & 64 == 64
+
+
+def test_generate_keypair():
+    private_key, public_key, preshared_key = generate_keypair()
+    assert public_key_from_private(private_key) == public_key
+    assert len(base64.b64decode(preshared_key)) == 32
+    assert len(base64.b64decode(generate_preshared_key())) == 32
+
+
+def test_verify_known_vectors():
+    verify_known_vectors()
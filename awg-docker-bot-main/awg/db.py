@@ -282,6 +282,18 @@ def execute_docker_command(command, server_id=None):
     else:
         return subprocess.check_output(command, shell=True).decode()
     
+def hot_apply_command(docker_container, wg_config_file):
+    # wg syncconf применяет только разницу между конфигом и интерфейсом,
+    # в отличие от wg-quick down/up не рвёт соединения остальных клиентов
+    interface = os.path.splitext(os.path.basename(wg_config_file))[0]
+    return (
+        f"docker exec -i {docker_container} sh -c "
+        # Временный файл свой у каждого вызова: параллельные применения не перезаписывают друг другу strip.
+        # Конфиг читается под той же блокировкой, под которой его правит сервис управления
+        f"'exec 9>>{wg_config_file}.lock && flock -w 30 9 && sync_conf=$(mktemp) && trap \"rm -f $sync_conf\" EXIT && "
+        f"wg-quick strip {wg_config_file} > $sync_conf && wg syncconf {interface} $sync_conf'"
+    )
+
 def get_amnezia_container():
     try:
         cmd = "docker ps --filter 'name=amnezia-awg' --format '{{.Names}}'"
@@ -895,7 +907,7 @@ AllowedIPs = {client_ip}
             sftp = ssh.client.open_sftp()
             sftp.put(server_conf_path, "/tmp/server.conf")
             ssh.execute_command(f"docker cp /tmp/server.conf {docker_container}:{wg_config_file}")
-            ssh.execute_command(f"docker exec -i {docker_container} sh -c 'wg-quick down {wg_config_file} && wg-quick up {wg_config_file}'")
+            ssh.execute_command(hot_apply_command(docker_container, wg_config_file))
             ssh.execute_command("rm /tmp/server.conf")
 
             output, error = ssh.execute_command(f"docker exec -i {docker_container} cat /opt/amnezia/awg/clientsTable")
@@ -1035,7 +1047,7 @@ def deactive_user_db(client_name, server_id=None):
                 f'mv /tmp/wg0.conf.new /tmp/wg0.conf',
                 f'docker cp /tmp/wg0.conf {docker_container}:{wg_config_file}',
                 f'rm -f /tmp/remove_peer.awk /tmp/wg0.conf',
-                f'docker exec -i {docker_container} sh -c "wg-quick down {wg_config_file} && wg-quick up {wg_config_file}"'
+                hot_apply_command(docker_container, wg_config_file)
             ]
 
             for cmd in commands:
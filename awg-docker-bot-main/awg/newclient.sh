@@ -26,6 +26,7 @@ CLIENT_NAME="$1"
 ENDPOINT="$2"
 WG_CONFIG_FILE="$3"
 DOCKER_CONTAINER="$4"
+WG_INTERFACE=$(basename "$WG_CONFIG_FILE" .conf)
 
 CONFIG_FILE="files/setting.ini"
 if [ ! -f "$CONFIG_FILE" ]; then
@@ -118,10 +119,12 @@ if [ "$IS_REMOTE" = "true" ]; then
     scp -P "$REMOTE_PORT" "$SERVER_CONF_PATH" "$REMOTE_USER@$REMOTE_HOST:/tmp/server.conf"
     remote_cmd "docker cp /tmp/server.conf $DOCKER_CONTAINER:$WG_CONFIG_FILE"
     remote_cmd "rm /tmp/server.conf"
-    docker_cmd "exec -i $DOCKER_CONTAINER sh -c \"wg-quick down $WG_CONFIG_FILE && wg-quick up $WG_CONFIG_FILE\""
+    # Свой временный файл на каждый запуск: параллельные добавления не перезаписывают друг другу strip.
+    # Блокировка - та же, под которой сервис управления правит wg0.conf (service/wg_hotapply.py)
+    docker_cmd "exec -i $DOCKER_CONTAINER sh -c 'exec 9>>$WG_CONFIG_FILE.lock && flock -w 30 9 && sync_conf=\$(mktemp) && trap \"rm -f \$sync_conf\" EXIT && wg-quick strip $WG_CONFIG_FILE > \$sync_conf && wg syncconf $WG_INTERFACE \$sync_conf'"
 else
     docker cp "$SERVER_CONF_PATH" $DOCKER_CONTAINER:$WG_CONFIG_FILE
-    docker exec -i $DOCKER_CONTAINER sh -c "wg-quick down $WG_CONFIG_FILE && wg-quick up $WG_CONFIG_FILE"
+    docker exec -i $DOCKER_CONTAINER sh -c "exec 9>>$WG_CONFIG_FILE.lock && flock -w 30 9 && sync_conf=\$(mktemp) && trap 'rm -f \"\$sync_conf\"' EXIT && wg-quick strip $WG_CONFIG_FILE > \"\$sync_conf\" && wg syncconf $WG_INTERFACE \"\$sync_conf\""
 fi
 
 cat << EOF > "$pwd/users/$CLIENT_NAME/$CLIENT_NAME.conf"
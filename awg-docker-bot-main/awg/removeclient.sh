@@ -11,6 +11,7 @@ CLIENT_NAME="$1"
 CLIENT_PUBLIC_KEY="$2"
 WG_CONFIG_FILE="$3"
 DOCKER_CONTAINER="$4"
+WG_INTERFACE=$(basename "$WG_CONFIG_FILE" .conf)
 
 pwd=$(pwd)
 mkdir -p "$pwd/files"
@@ -72,7 +73,9 @@ docker exec -i "$DOCKER_CONTAINER" wg-quick strip "$WG_CONFIG_FILE" > /dev/null
 
 docker cp "$SERVER_CONF_PATH" "$DOCKER_CONTAINER":"$WG_CONFIG_FILE"
 
-docker exec -i "$DOCKER_CONTAINER" sh -c "wg-quick down '$WG_CONFIG_FILE' && wg-quick up '$WG_CONFIG_FILE'"
+# Свой временный файл на каждый запуск: параллельные удаления не перезаписывают друг другу strip.
+# Под блокировкой wg0.conf, как и изменения из сервиса управления: не читаем файл посреди перезаписи
+docker exec -i "$DOCKER_CONTAINER" sh -c "exec 9>>'$WG_CONFIG_FILE.lock' && flock -w 30 9 && sync_conf=\$(mktemp) && trap 'rm -f \"\$sync_conf\"' EXIT && wg-quick strip '$WG_CONFIG_FILE' > \"\$sync_conf\" && wg syncconf '$WG_INTERFACE' \"\$sync_conf\""
 
 rm -f "users/$CLIENT_NAME/$CLIENT_NAME.conf"
 rmdir "users/$CLIENT_NAME" 2>/dev/null || true